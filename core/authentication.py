@@ -0,0 +1,25 @@
+import hmac
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+
+class MetricsTokenAuthentication(BaseAuthentication):
+    """
+    A metrics scraper sending "Authorization: Bearer <METRICS_TOKEN>", as Prometheus
+    does with its bearer token setting. It is not a user, so request.user stays
+    anonymous. Other requests are left to the authentication classes after it.
+    """
+
+    def authenticate(self, request):
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        parts = get_authorization_header(request).split()
+        if not token or len(parts) != 2 or parts[0].lower() != b'bearer':
+            return None
+        if not hmac.compare_digest(parts[1], token.encode()):
+            return None
+        return AnonymousUser(), token
+
+    def authenticate_header(self, request):
+        return 'Bearer'
@@ -0,0 +1,212 @@
+"""
+In-process metrics, exposed in the Prometheus text format at /core/metrics/.
+
+Counters and histograms live in the memory of each process. Under gunicorn every
+worker has its own, so set METRICS_MULTIPROC_DIR to a directory the workers
+share, emptied when the server starts: each process then also writes its samples
+to a file of its own there, at most once a second, and a scrape adds up the
+files of every process, including workers that have since exited.
+"""
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Upper bounds of the histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Most often a process writes its samples to METRICS_MULTIPROC_DIR
+FLUSH_SECONDS = 1
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, help, labelnames):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {', '.join(self.labelnames)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(self.name, self._labels(labels), [amount])
+
+    def samples(self, values):
+        for labels, (value,) in values.items():
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, registry, name, help, labelnames, buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        # A count per bucket, not cumulative, then the sum and the count
+        counts = [0] * len(self.buckets)
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(counts):
+            counts[index] = 1
+        self.registry.add(self.name, self._labels(labels), counts + [value, 1])
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds the block takes."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self, values):
+        for labels, totals in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, totals):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + (("le", _format_number(bound)),), cumulative
+            yield f"{self.name}_bucket", labels + (("le", "+Inf"),), totals[-1]
+            yield f"{self.name}_sum", labels, totals[-2]
+            yield f"{self.name}_count", labels, totals[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.values = {}
+        self.lock = threading.Lock()
+        self.file = None
+        self.last_flush = 0.0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def counter(self, name, help, labelnames=()):
+        return Counter(self, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return Histogram(self, name, help, labelnames, buckets)
+
+    def add(self, name, labels, amounts):
+        with self.lock:
+            totals = self.values.setdefault(name, {}).get(labels)
+            if totals is None:
+                self.values[name][labels] = list(amounts)
+            else:
+                for index, amount in enumerate(amounts):
+                    totals[index] += amount
+        if _multiproc_dir() and time.monotonic() - self.last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        """Write the samples of this process to its file in METRICS_MULTIPROC_DIR."""
+        directory = _multiproc_dir()
+        if not directory:
+            return
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if self.file is None:
+                self.file = os.path.join(directory, f"metrics-{os.getpid()}-{time.time_ns()}.json")
+            data = {name: [[list(labels), totals] for labels, totals in values.items()]
+                    for name, values in self.values.items()}
+            temporary = f"{self.file}.tmp"
+            with open(temporary, "w") as output:
+                json.dump(data, output)
+            os.replace(temporary, self.file)
+
+    def collect(self):
+        """Samples of every process: {metric name: {labels: totals}}."""
+        directory = _multiproc_dir()
+        if not directory:
+            with self.lock:
+                return {name: {labels: list(totals) for labels, totals in values.items()}
+                        for name, values in self.values.items()}
+
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            try:
+                with open(path) as source:
+                    data = json.load(source)
+            except (OSError, ValueError):
+                continue  # a process that exited halfway through writing
+            for name, values in data.items():
+                for labels, totals in values:
+                    current = merged.setdefault(name, {}).get(tuple(labels))
+                    if current is None:
+                        merged[name][tuple(labels)] = totals
+                    else:
+                        merged[name][tuple(labels)] = [a + b for a, b in zip(current, totals)]
+        return merged
+
+    def exposition(self):
+        """Every metric in the Prometheus text exposition format."""
+        collected = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            values = {
+                tuple(zip(metric.labelnames, labels)): totals
+                for labels, totals in collected.get(name, {}).items()
+            }
+            for sample, labels, value in metric.samples(values):
+                rendered = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+                lines.append(f"{sample}{{{rendered}}} {_format_number(value)}" if rendered else f"{sample} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self.lock:
+            self.values = {}
+
+
+def _multiproc_dir():
+    return getattr(settings, "METRICS_MULTIPROC_DIR", None)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+atexit.register(registry.flush)
+
+REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "Time taken to answer requests.", ["view", "method", "status"],
+)
+DB_QUERIES = registry.counter(
+    "db_queries_total", "SQL queries run while answering requests.", ["view", "method"],
+)
+REPORT_BUILD_DURATION = registry.histogram(
+    "report_build_duration_seconds", "Time taken to build a report on a cache miss.", ["report", "format"],
+)
+DIESEL_BALANCE_TAIL_DAYS = registry.histogram(
+    "diesel_stock_balance_tail_days",
+    "Days of diesel receipts and issues summed on top of the latest snapshot to work out a stock balance.",
+    buckets=(0, 1, 2, 7, 30, 90, 365),
+)
+DIESEL_BALANCE_WITHOUT_SNAPSHOT = registry.counter(
+    "diesel_stock_balance_without_snapshot_total",
+    "Stock balances worked out from the whole ledger, as no snapshot was taken before the day asked for.",
+)
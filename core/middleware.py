@@ -0,0 +1,228 @@
+"""
+Request profiling and metrics that are safe to leave on in production.
+
+For a sampled share of requests (REQUEST_PROFILE_SAMPLE_RATE, 0 to 1) the
+middleware records the number and total time of SQL queries, the time spent in
+the view and rendering the response, and the response size. It sends them back
+in a Server-Timing header, which browser dev tools display, and logs them as one
+JSON line on the "core.profiling" logger. With a rate of 0 the middleware
+removes itself when the server starts, so it costs nothing.
+
+Serializers run inside the view (a DRF view builds serializer.data before
+returning), so their time counts as view time; render is the time taken to turn
+the returned data into the response body.
+
+A streaming response, such as the CSV trip report, runs most of its queries
+while its body is sent, after the middleware has returned it. Its queries are
+measured until the body is done and the request is logged then; it gets no
+Server-Timing header, the headers having gone out before those queries ran.
+
+MetricsMiddleware records the latency and query count of every request in the
+core.metrics registry, and SlowQueryMiddleware keeps the statements slower than
+SLOW_QUERY_THRESHOLD_MS in core.slow_queries.log.
+"""
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import slow_queries
+from .metrics import DB_QUERIES, REQUEST_DURATION
+
+logger = logging.getLogger("core.profiling")
+
+
+class QueryTimer:
+    """Database execute wrapper counting the queries run through it and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.view_finished = None
+        self.rendered = None
+        self.queries = QueryTimer()
+
+    def finish_view(self, response):
+        self.view_finished = time.perf_counter()
+        return response
+
+    def finish_render(self, response):
+        self.rendered = time.perf_counter()
+        return response
+
+
+def _milliseconds(start, end):
+    return round((end - start) * 1000, 2) if start is not None and end is not None else None
+
+
+def _measured_response(get_response, request, wrapper, finish):
+    """
+    The response to request, with wrapper around every query run to produce it.
+    finish(response) is called once those queries have run: when the response is
+    returned, or when the body of a streaming response has been sent.
+    """
+    wrapped = list(connections.all())
+    for connection in wrapped:
+        connection.execute_wrappers.append(wrapper)
+
+    def release():
+        # Removed by identity: the bodies of nested middleware may be closed in any order
+        for connection in wrapped:
+            connection.execute_wrappers.remove(wrapper)
+
+    try:
+        response = get_response(request)
+    except BaseException:
+        release()
+        raise
+    if not response.streaming or response.is_async:
+        release()
+        finish(response)
+        return response
+
+    def done():
+        release()
+        finish(response)
+
+    # Closed with the response, so a body never or only partly sent is finished as well
+    response.streaming_content = _ClosingContent(response.streaming_content, done)
+    return response
+
+
+class _ClosingContent:
+    """The chunks of a streaming body, calling done once when they run out or are closed."""
+
+    def __init__(self, chunks, done):
+        self.chunks = iter(chunks)
+        self.done = done
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.chunks)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        done, self.done = self.done, None
+        if done is not None:
+            done()
+
+
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "REQUEST_PROFILE_SAMPLE_RATE", 0)
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = request._profile = RequestProfile()
+
+        def get_response(request):
+            response = self.get_response(request)
+            if profile.view_started is not None and profile.view_finished is None:
+                # Not a template response, so nothing was left to render after the view
+                profile.finish_view(response)
+            return response
+
+        return _measured_response(
+            get_response, request, profile.queries, lambda response: self.finish(request, response, profile)
+        )
+
+    def finish(self, request, response, profile):
+        finished = time.perf_counter()
+        timings = {
+            "db": _milliseconds(0, profile.queries.seconds),
+            "view": _milliseconds(profile.view_started, profile.view_finished),
+            "render": _milliseconds(profile.view_finished, profile.rendered),
+            "total": _milliseconds(profile.started, finished),
+        }
+        if not response.streaming:
+            response["Server-Timing"] = ", ".join(
+                f'db;desc="{profile.queries.count} queries";dur={duration}' if name == "db" else f"{name};dur={duration}"
+                for name, duration in timings.items() if duration is not None
+            )
+
+        match = request.resolver_match
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "queries": profile.queries.count,
+            **{f"{name}_ms": duration for name, duration in timings.items()},
+            "response_bytes": None if response.streaming else len(response.content),
+        }))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, "_profile", None)
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        profile = getattr(request, "_profile", None)
+        if profile is not None:
+            profile.finish_view(response)
+            response.add_post_render_callback(profile.finish_render)
+        return response
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        queries = QueryTimer()
+        started = time.perf_counter()
+        return _measured_response(
+            self.get_response, request, queries, lambda response: self.finish(request, response, queries, started)
+        )
+
+    def finish(self, request, response, queries, started):
+        elapsed = time.perf_counter() - started
+
+        # Labelled by route rather than path, so ids in URLs do not multiply the series
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        REQUEST_DURATION.observe(elapsed, view=view, method=request.method, status=response.status_code)
+        DB_QUERIES.inc(queries.count, view=view, method=request.method)
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold_ms = getattr(settings, "SLOW_QUERY_THRESHOLD_MS", 0)
+        if self.threshold_ms <= 0:
+            raise MiddlewareNotUsed
+        slow_queries.log.resize(getattr(settings, "SLOW_QUERY_BUFFER_SIZE", 100))
+
+    def __call__(self, request):
+        recorder = slow_queries.SlowQueryRecorder(slow_queries.log, self.threshold_ms, request)
+        return _measured_response(self.get_response, request, recorder, lambda response: None)
@@ -0,0 +1,17 @@
+from rest_framework.permissions import BasePermission
+
+from .authentication import MetricsTokenAuthentication
+
+
+class IsMetricsScraperOrSuperuser(BasePermission):
+    """Requests carrying the metrics token (see MetricsTokenAuthentication), or from superusers."""
+
+    def has_permission(self, request, view):
+        if isinstance(request.successful_authenticator, MetricsTokenAuthentication):
+            return True
+        return bool(request.user and request.user.is_superuser)
+
+
+class IsSuperuser(BasePermission):
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_superuser)
@@ -0,0 +1,154 @@
+"""
+Capture of slow SQL statements, browsed by superusers at /core/slow-queries/.
+
+core.middleware.SlowQueryMiddleware wraps every database connection for the
+length of a request. A statement that takes longer than SLOW_QUERY_THRESHOLD_MS
+is kept with its parameters, the view answering the request, the project code
+that ran it and, for reads, the plan the database chose for it, so a slow
+monthly report can be traced to the one per-asset query responsible.
+
+The latest SLOW_QUERY_BUFFER_SIZE statements are kept in the memory of each
+process, older ones dropping out. Under gunicorn every worker keeps its own, so
+the endpoint shows those caught by whichever worker answers it.
+"""
+import os
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+# Parameters kept of a statement, and the characters kept of each
+MAX_PARAMS = 50
+MAX_PARAM_LENGTH = 200
+
+# Frames of project code kept of the stack that ran a statement, innermost last
+STACK_DEPTH = 8
+
+# Frames in these files only pass statements along
+_RECORDING_FILES = {
+    os.path.abspath(__file__),
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "middleware.py"),
+}
+
+
+class SlowQueryLog:
+    """The latest slow statements, shared by the threads of a process."""
+
+    def __init__(self, capacity=100):
+        self.entries = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return self.entries.maxlen
+
+    def resize(self, capacity):
+        with self.lock:
+            if capacity != self.entries.maxlen:
+                self.entries = deque(self.entries, maxlen=capacity)
+
+    def add(self, entry):
+        with self.lock:
+            self.entries.append(entry)
+
+    def latest(self):
+        """The kept statements, newest first."""
+        with self.lock:
+            return list(reversed(self.entries))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SlowQueryRecorder:
+    """Database execute wrapper adding the statements of a request over the threshold to a log."""
+
+    def __init__(self, log, threshold_ms, request):
+        self.log = log
+        self.threshold = threshold_ms / 1000
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = time.perf_counter() - started
+        if elapsed >= self.threshold:
+            self.record(sql, params, many, context["connection"], elapsed)
+        return result
+
+    def record(self, sql, params, many, connection, elapsed):
+        stack = _project_stack()
+        # Resolved after the middleware wrapped the connections, so looked up now
+        match = self.request.resolver_match
+        self.log.add({
+            "recorded_at": timezone.now().isoformat(),
+            "duration_ms": round(elapsed * 1000, 2),
+            "database": connection.alias,
+            "sql": sql,
+            "params": None if many else _format_params(params),
+            "many": many,
+            "method": self.request.method,
+            "path": self.request.path,
+            "view": match.view_name if match else None,
+            "origin": stack[-1] if stack else None,
+            "stack": stack,
+            "plan": None if many else explain(connection, sql, params),
+        })
+
+
+def explain(connection, sql, params):
+    """
+    The plan of a read, or None for a statement that changes data: EXPLAIN does
+    not run the statement, but some databases still refuse it for writes.
+    """
+    if not sql.lstrip().upper().startswith(("SELECT", "WITH")) or connection.needs_rollback:
+        return None
+
+    # Run past the wrappers, so the EXPLAIN is neither recorded nor counted as a query of the request
+    wrappers, connection.execute_wrappers = connection.execute_wrappers, []
+    try:
+        # Inside a transaction, a savepoint keeps a failed EXPLAIN from breaking it
+        with transaction.atomic(using=connection.alias) if connection.in_atomic_block else nullcontext():
+            with connection.cursor() as cursor:
+                cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params)
+                rows = cursor.fetchall()
+    except DatabaseError as error:
+        return f"EXPLAIN failed: {error}"
+    finally:
+        connection.execute_wrappers = wrappers
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+def _format_params(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        items = list(params.items())[:MAX_PARAMS]
+        return {key: _truncate(repr(value)) for key, value in items}
+    return [_truncate(repr(value)) for value in list(params)[:MAX_PARAMS]]
+
+
+def _truncate(text):
+    return text if len(text) <= MAX_PARAM_LENGTH else f"{text[:MAX_PARAM_LENGTH]}..."
+
+
+def _project_stack():
+    """The frames of project code, not Django or other libraries, that led to the statement."""
+    base = str(settings.BASE_DIR)
+    frames = []
+    for frame in traceback.extract_stack():
+        filename = os.path.abspath(frame.filename)
+        if (not filename.startswith(base) or "site-packages" in filename
+                or filename in _RECORDING_FILES):
+            continue
+        frames.append(f"{os.path.relpath(filename, base)}:{frame.lineno} in {frame.name}")
+    return frames[-STACK_DEPTH:]
+
+
+log = SlowQueryLog()
@@ -1,3 +1,204 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from . import slow_queries
+from .metrics import Registry, registry
+
+from pnm.testing import QueryBudgetTestCase, seed_fleet
+
+
+class CoreQueryBudgetTests(QueryBudgetTestCase):
+    # delete-user/, create-superuser/ and apply-migrations/ change the database and are left out
+    routes = [
+        ("/core/users/", 2),
+        ("/core/users/?search=manager", 2),
+        ("/core/check-db/", 1),
+    ]
+
+
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_superuser(username="admin", password="pass"))
+
+    @override_settings(REQUEST_PROFILE_SAMPLE_RATE=1)
+    def test_profiled_request_reports_its_timings(self):
+        with self.assertLogs("core.profiling", "INFO") as logs:
+            response = self.client.get("/core/users/")
+
+        timings = dict(part.split(";", 1) for part in response["Server-Timing"].split(", "))
+        self.assertEqual(set(timings), {"db", "view", "render", "total"})
+        self.assertIn('desc="2 queries"', timings["db"])
+
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["view"], line["status"], line["queries"]), ("user-list", 200, 2))
+        self.assertEqual(line["response_bytes"], len(response.content))
+        self.assertGreaterEqual(line["total_ms"], line["view_ms"] + line["render_ms"])
+
+    def test_off_by_default(self):
+        response = self.client.get("/core/users/")
+        self.assertNotIn("Server-Timing", response)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.client = APIClient()
+
+    def test_requests_are_scraped(self):
+        self.client.force_authenticate(get_user_model().objects.create_superuser(username="admin", password="pass"))
+        self.client.get("/core/users/")
+
+        response = self.client.get("/core/metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="user-list",method="GET",status="200"} 1\n', body)
+        self.assertIn('db_queries_total{view="user-list",method="GET"} 2\n', body)
+
+    @override_settings(METRICS_TOKEN="scrape-secret")
+    def test_only_the_metrics_token_and_superusers(self):
+        # A request from the same host, as through a reverse proxy, is not enough
+        self.assertEqual(self.client.get("/core/metrics/", REMOTE_ADDR="127.0.0.1").status_code, 401)
+        self.assertEqual(self.client.get("/core/metrics/", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        self.assertEqual(self.client.get("/core/metrics/", HTTP_AUTHORIZATION="Bearer scrape-secret").status_code, 200)
+
+        user = get_user_model().objects.create_user(username="ravi", password="pass", role="manager")
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get("/core/metrics/").status_code, 403)
+
+    def test_samples_of_every_process_are_added_up(self):
+        metrics = Registry()
+        jobs = metrics.counter("jobs_total", "Jobs run.", ["kind"])
+        duration = metrics.histogram("job_duration_seconds", "Job time.", buckets=(0.1, 0.5))
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROC_DIR=directory):
+            with open(os.path.join(directory, "metrics-1-1.json"), "w") as other_process:
+                json.dump({"jobs_total": [[["report"], [2]]], "job_duration_seconds": [[[], [0, 1, 0.25, 1]]]}, other_process)
+            jobs.inc(kind="report")
+            duration.observe(0.05)
+            duration.observe(2)
+
+            body = metrics.exposition()
+
+        self.assertIn('jobs_total{kind="report"} 3\n', body)
+        self.assertIn('job_duration_seconds_bucket{le="0.1"} 1\n', body)
+        self.assertIn('job_duration_seconds_bucket{le="0.5"} 2\n', body)
+        self.assertIn('job_duration_seconds_bucket{le="+Inf"} 3\n', body)
+        self.assertIn("job_duration_seconds_sum 2.3\n", body)
+        self.assertIn("job_duration_seconds_count 3\n", body)
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=0.000001, SLOW_QUERY_BUFFER_SIZE=1000)
+class SlowQueryTests(TestCase):
+    def setUp(self):
+        slow_queries.log.clear()
+        self.client = APIClient()
+        self.superuser = get_user_model().objects.create_superuser(username="admin", password="pass")
+        seed_fleet(2)
+
+    def tearDown(self):
+        slow_queries.log.resize(100)
+
+    def test_report_queries_are_kept_with_their_origin_and_plan(self):
+        self.client.force_authenticate(self.superuser)
+        self.assertEqual(self.client.get("/pnm/tipper-report/", {"month": "2025-06"}).status_code, 200)
+
+        response = self.client.get("/core/slow-queries/", {"view": "tipper-report"})
+
+        self.assertEqual(response.status_code, 200)
+        entries = response.json()["results"]
+        self.assertTrue(entries)
+        self.assertEqual(response.json()["count"], len(entries))
+        for entry in entries:
+            self.assertEqual(entry["path"], "/pnm/tipper-report/")
+            self.assertIsInstance(entry["params"], list)
+        selects = [entry for entry in entries if entry["sql"].startswith("SELECT")]
+        self.assertTrue(any(entry["origin"].startswith("pnm/") for entry in selects))
+        self.assertTrue(all(entry["plan"] and not entry["plan"].startswith("EXPLAIN failed") for entry in selects))
+
+    def test_explain_is_not_recorded_itself(self):
+        self.client.force_authenticate(self.superuser)
+        self.client.get("/core/users/")
+
+        entries = slow_queries.log.latest()
+        self.assertEqual(len(entries), 2)
+        self.assertFalse(any("EXPLAIN" in entry["sql"] for entry in entries))
+
+    @override_settings(SLOW_QUERY_BUFFER_SIZE=3)
+    def test_only_the_latest_are_kept(self):
+        self.client.force_authenticate(self.superuser)
+        self.client.get("/pnm/tipper-report/", {"month": "2025-06"})
+        self.client.get("/core/users/")
+
+        entries = slow_queries.log.latest()
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(entries[0]["view"], "user-list")
+
+    def test_superusers_only(self):
+        user = get_user_model().objects.create_user(username="ravi", password="pass", role="manager")
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get("/core/slow-queries/").status_code, 403)
+        self.assertEqual(self.client.delete("/core/slow-queries/").status_code, 403)
+
+        self.client.force_authenticate(self.superuser)
+        self.client.get("/core/users/")
+        self.assertEqual(self.client.delete("/core/slow-queries/").status_code, 204)
+        self.assertEqual(slow_queries.log.latest(), [])
+
+
+@override_settings(REQUEST_PROFILE_SAMPLE_RATE=1, SLOW_QUERY_THRESHOLD_MS=0.000001, SLOW_QUERY_BUFFER_SIZE=1000)
+class StreamingResponseTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        slow_queries.log.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_superuser(username="admin", password="pass"))
+        seed_fleet(2)
+
+    def tearDown(self):
+        slow_queries.log.resize(100)
+
+    def test_queries_run_while_the_body_is_sent_are_measured(self):
+        with self.assertLogs("core.profiling", "INFO") as logs, CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/pnm/trip-report/", {"month": "2025-06", "format": "csv"})
+            returned = len(queries)
+            body = b"".join(response.streaming_content)
+        # Leaving out the plans the slow query log asked for, which are not measured
+        report_queries = len([query for query in queries if query["sql"].startswith("SELECT")])
+
+        self.assertIn(b"Quarry", body)
+        # The rows of the report are read while the body is sent
+        self.assertEqual(returned, 0)
+        self.assertGreater(report_queries, 0)
+        self.assertNotIn("Server-Timing", response)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["view"], line["queries"]), ("trip-report", report_queries))
+        self.assertGreaterEqual(line["total_ms"], line["view_ms"])
+
+        self.assertIn(f'db_queries_total{{view="trip-report",method="GET"}} {report_queries}\n', registry.exposition())
+        self.assertEqual(
+            len([entry for entry in slow_queries.log.latest() if entry["view"] == "trip-report"]), report_queries
+        )
+
+    def test_a_body_never_sent_is_finished_when_closed(self):
+        with self.assertLogs("core.profiling", "INFO") as logs:
+            response = self.client.get("/pnm/trip-report/", {"month": "2025-06", "format": "csv"})
+            # As the server does for a client gone before the body, without closing the test connection
+            request_finished.disconnect(close_old_connections)
+            try:
+                response.close()
+            finally:
+                request_finished.connect(close_old_connections)
+
+        self.assertEqual(json.loads(logs.records[0].getMessage())["view"], "trip-report")
+        self.assertEqual(connection.execute_wrappers, [])
@@ -7,4 +7,6 @@ urlpatterns = [
     path('create-superuser/', views.CreateSuperuserView.as_view()),
     path('check-db/', views.check_db_view),
     path('apply-migrations/', views.ApplyMigrationsView.as_view()),
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
+    path('slow-queries/', views.SlowQueryListView.as_view(), name='slow-queries'),
 ]
\ No newline at end of file
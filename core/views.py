@@ -9,13 +9,19 @@ from core.serializers import UserSerializer
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from .models import User 
 from .serializers import UserSerializer
 from .filters import UserFilter
+from . import slow_queries
+from .metrics import registry
+from .authentication import MetricsTokenAuthentication
+from .permissions import IsMetricsScraperOrSuperuser, IsSuperuser
 from django.http import HttpResponse
 from django.core.management import call_command
 from django.views import View
+from django.conf import settings
 
 class DeleteUserView(APIView):
     permission_classes = [IsAuthenticated]
@@ -38,7 +44,7 @@ class DeleteUserView(APIView):
 User = get_user_model()
 
 class UserListView(generics.ListAPIView):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('manager', 'mechanic')
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
     pagination_class = DefaultPagination
@@ -77,4 +83,38 @@ class ApplyMigrationsView(View):
             call_command('migrate')
             return JsonResponse({'message': 'Migrations applied successfully ✅'})
         except Exception as e:
-            return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+            return JsonResponse({'error': str(e)}, status=500)
+
+
+class MetricsView(APIView):
+    """Every metric of core.metrics in the Prometheus text format, for a scraper."""
+    # The metrics token first, as the JWT authentication rejects any other bearer token
+    authentication_classes = [MetricsTokenAuthentication, *api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    permission_classes = [IsMetricsScraperOrSuperuser]
+
+    def get(self, request):
+        return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class SlowQueryListView(APIView):
+    """
+    The slow SQL statements this process kept, newest first, optionally only
+    those of one view (?view=<url name>). DELETE empties the log.
+    """
+    permission_classes = [IsSuperuser]
+
+    def get(self, request):
+        entries = slow_queries.log.latest()
+        view = request.query_params.get('view')
+        if view:
+            entries = [entry for entry in entries if entry['view'] == view]
+        return Response({
+            'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+            'capacity': slow_queries.log.capacity,
+            'count': len(entries),
+            'results': entries,
+        })
+
+    def delete(self, request):
+        slow_queries.log.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
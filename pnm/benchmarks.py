@@ -0,0 +1,266 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Benchmarks never touch the configured database: they run against a freshly
+migrated throwaway copy of it, created and destroyed the way the test runner does.
+generate_fleet fills a database with a synthetic fleet to measure them against.
+"""
+import random
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils.timezone import localdate, make_aware
+
+from .diesel_ledger import record_writes, stock_balance, take_snapshot
+from .models import (
+    ASSET_TYPE_CHOICES, BREAKDOWN_STATUS_CHOICES, Asset, AssetManager, Breakdown, DieselEntry, DieselStock, Manager,
+    Mechanic, MonthlyRent, Operator, TripDetails,
+)
+from .report_cache import bump_global_version
+from .rollups import rebuild_daily_rollups, rebuild_monthly_rollups
+
+# Prefix of the asset ids of generated assets
+BENCHMARK_ASSET_PREFIX = "BENCH-"
+
+FLEET_MATERIALS = ["Sand", "Metal", "Murum", "Soil", "Boulder"]
+FLEET_SITES = ["Pune", "Nashik", "Satara", "Kolhapur"]
+
+
+@contextmanager
+def scratch_database(verbosity=0):
+    """Run the block against an empty, migrated copy of the default database."""
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def benchmark_asset(index, asset_type="Tipper"):
+    """An unsaved Asset with every required field filled in."""
+    return Asset(
+        asset_id=f"{BENCHMARK_ASSET_PREFIX}{index}",
+        registration_no=f"BENCH-{index:06d}",
+        name=f"{asset_type} {index}",
+        make="Tata",
+        type=asset_type,
+        owner="VDIPL",
+        category="vehicle",
+        purchase_value=1000000,
+        purchase_date=date(2024, 1, 1),
+        chasis_no=f"CH-{index}",
+        emi_amount=Decimal("1000"),
+        emi_provider="Bank",
+        insurance_amount=Decimal("500"),
+        insurance_provider="Insurer",
+        puc_amount=Decimal("100"),
+        puc_start_date=date(2024, 1, 1),
+        puc_end_date=date(2026, 1, 1),
+        ot_road_tax=False,
+        fitness_amount=Decimal("200"),
+        road_tax_amount=Decimal("300"),
+        permit_amount=Decimal("400"),
+        permit_start_date=date(2024, 1, 1),
+        permit_end_date=date(2026, 1, 1),
+        rate_per_month=Decimal("50000"),
+        rate_per_hr=Decimal("1200"),
+        rate_per_shift=Decimal("8000"),
+        rate_per_night=Decimal("0"),
+        charges=Decimal("0"),
+    )
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let the auto_now/auto_now_add fields keep the values given to them in the block."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class _BatchWriter:
+    """Collects unsaved rows and inserts them batch_size at a time with bulk_create."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, instance):
+        rows = self.pending.setdefault(type(instance), [])
+        rows.append(instance)
+        if len(rows) >= self.batch_size:
+            self.flush(type(instance))
+
+    def flush(self, model=None):
+        for model in [model] if model else list(self.pending):
+            rows = self.pending.pop(model, [])
+            model.objects.bulk_create(rows, batch_size=self.batch_size)
+            self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(rows)
+
+
+def _people(model, role, count, password, rng):
+    """count users of role, each with its model (Manager or Mechanic) profile."""
+    User = get_user_model()
+    users = User.objects.bulk_create([
+        User(username=f"fleet-{role}-{index}", password=password, role=role, first_name=role.title(), last_name=str(index))
+        for index in range(count)
+    ])
+    if not all(user.pk for user in users):
+        # Databases that cannot return ids from a bulk insert
+        users = list(User.objects.filter(username__startswith=f"fleet-{role}-").order_by("id"))
+    model.objects.bulk_create([
+        model(name=f"{role.title()} {index}", phone=f"9{index:09d}", salary=rng.randrange(20000, 60000, 1000),
+              grade=rng.choice("ABC"), sub_grade=str(rng.randint(1, 3)), user=user)
+        for index, user in enumerate(users)
+    ])
+    return list(model.objects.filter(user__in=users).order_by("id"))
+
+
+def generate_fleet(assets, months, end_month, trips_per_day=4, seed=0, batch_size=5000):
+    """
+    Insert a synthetic fleet: assets of every type in turn with their managers,
+    mechanics, operators and assignment history, and the trips, diesel entries,
+    diesel receipts and breakdowns of months months up to end_month (a date on the
+    first of a month). The same arguments always produce the same rows.
+
+    Rows are written with bulk_create, so no signals are sent: the rollups are
+    rebuilt, the stock balance snapshotted and the report cache cleared once at
+    the end, and each receipt's stock balance is worked out as rows are generated,
+    from the balance the ledger already holds the day before the first month.
+    Returns the number of rows inserted per model.
+    """
+    rng = random.Random(seed)
+    asset_types = [choice for choice, _ in ASSET_TYPE_CHOICES]
+    first_day = end_month
+    for _ in range(months - 1):
+        first_day = (first_day - timedelta(days=1)).replace(day=1)
+    last_day = (end_month + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+
+    def stamp(day, earliest=6, latest=20):
+        return make_aware(datetime.combine(day, time(rng.randint(earliest, latest), rng.randrange(60))))
+
+    writer = _BatchWriter(batch_size)
+    with transaction.atomic(), explicit_timestamps(
+        TripDetails._meta.get_field("date"), DieselEntry._meta.get_field("date"),
+        DieselEntry._meta.get_field("created_at"), Breakdown._meta.get_field("date"),
+        DieselStock._meta.get_field("date"), AssetManager._meta.get_field("date_assigned"),
+    ):
+        password = make_password("fleet")
+        managers = _people(Manager, "manager", max(1, assets // 10), password, rng)
+        mechanics = _people(Mechanic, "mechanic", max(1, assets // 25), password, rng)
+
+        Asset.objects.bulk_create(
+            [benchmark_asset(index, asset_types[index % len(asset_types)]) for index in range(assets)],
+            batch_size=batch_size,
+        )
+        fleet = list(Asset.objects.filter(asset_id__startswith=BENCHMARK_ASSET_PREFIX).order_by("id"))
+        operators = Operator.objects.bulk_create([
+            Operator(name=f"Operator {index}", role="Driver", type=asset.type, salary=rng.randrange(15000, 30000, 1000),
+                     grade="C", sub_grade="1", phone=f"8{index:09d}")
+            for index, asset in enumerate(fleet)
+        ], batch_size=batch_size)
+        if not all(operator.pk for operator in operators):
+            operators = list(Operator.objects.order_by("-id")[:assets])[::-1]
+        writer.counts.update(
+            User=len(managers) + len(mechanics), Manager=len(managers), Mechanic=len(mechanics),
+            Asset=len(fleet), Operator=len(operators),
+        )
+
+        # Each asset starts with a manager and moves to another every few months
+        current_manager = {}
+        reassign_on = {}
+        for asset in fleet:
+            current_manager[asset.pk] = rng.choice(managers)
+            reassign_on[asset.pk] = first_day + timedelta(days=rng.randint(60, 180))
+            writer.add(AssetManager(asset=asset, manager=current_manager[asset.pk], site=rng.choice(FLEET_SITES),
+                                    date_assigned=stamp(first_day - timedelta(days=1))))
+            writer.add(MonthlyRent(asset=asset, manager=current_manager[asset.pk], rate_per_month=asset.rate_per_month,
+                                   rate_per_hr=asset.rate_per_hr, rate_per_shift=asset.rate_per_shift,
+                                   rate_per_night=asset.rate_per_night, charges=asset.charges))
+
+        stock = stock_balance(first_day - timedelta(days=1))
+        stock_changes = {}
+        challan_no = DieselStock.objects.order_by("-challan_no").values_list("challan_no", flat=True).first() or 0
+        day = first_day
+        while day <= last_day:
+            issued = Decimal("0")
+            for asset, operator in zip(fleet, operators):
+                if day >= reassign_on[asset.pk]:
+                    current_manager[asset.pk] = rng.choice(managers)
+                    reassign_on[asset.pk] = day + timedelta(days=rng.randint(60, 180))
+                    writer.add(AssetManager(asset=asset, manager=current_manager[asset.pk],
+                                            site=rng.choice(FLEET_SITES), date_assigned=stamp(day, 0, 5)))
+                manager = current_manager[asset.pk]
+
+                for _ in range(rng.randint(0, 2 * trips_per_day)):
+                    trip = TripDetails(
+                        asset=asset, date=stamp(day), from_location=rng.choice(FLEET_SITES),
+                        to_location=rng.choice(FLEET_SITES), deal_type=rng.choice(["Sale", "Purchase", "Shifting"]),
+                        rate=Decimal(rng.randrange(100, 1000, 10)), manager=manager,
+                        receiver=rng.choice(managers), operator=operator,
+                    )
+                    if asset.type == "Tipper":
+                        trip.material = rng.choice(FLEET_MATERIALS)
+                        trip.distance = Decimal(rng.randint(5, 80))
+                        trip.net_weight = Decimal(rng.randint(8, 30))
+                    else:
+                        trip.hours = rng.randint(1, 10)
+                        trip.shift = rng.randint(1, 2)
+                    writer.add(trip)
+
+                if rng.random() < 0.5:
+                    quantity = Decimal(rng.randint(20, 120))
+                    issued += quantity
+                    entered = stamp(day)
+                    writer.add(DieselEntry(
+                        asset=asset, date=entered, created_at=entered, quantity=quantity, rate=Decimal(rng.randint(88, 96)),
+                        previous_reading=Decimal("0"), reading=Decimal("0"), site=rng.choice(FLEET_SITES),
+                        manager=manager,
+                    ))
+
+                if rng.random() < 0.01:
+                    status = rng.choice(BREAKDOWN_STATUS_CHOICES)[0]
+                    writer.add(Breakdown(
+                        asset=asset, date=stamp(day), site=rng.choice(FLEET_SITES), issue="Generated breakdown",
+                        action_taken="Repaired" if status != "Pending" else None,
+                        estimated_delivery_date=day + timedelta(days=rng.randint(1, 10)),
+                        delivered_at_date=day + timedelta(days=rng.randint(1, 10)) if status == "Completed" else None,
+                        status=status, cost=rng.randint(500, 50000), manpower_cost=rng.randint(200, 5000),
+                        material_used=rng.choice(["Hose", "Filter", "Tyre", "Bearing"]), manager=manager,
+                        mechanic=rng.choice(mechanics),
+                    ))
+
+            # A receipt whenever the day's issues would run the stock low
+            if stock - issued < issued * 3:
+                quantity = (issued * 7).quantize(Decimal("1")) or Decimal("1000")
+                challan_no += 1
+                rate = Decimal(rng.randint(88, 96))
+                stock += quantity
+                stock_changes[day] = quantity
+                writer.add(DieselStock(challan_no=challan_no, date=day, quantity=quantity, rate=rate,
+                                       amount=quantity * rate, party_name="Generated Depot", stock=stock))
+            stock -= issued
+            stock_changes[day] = stock_changes.get(day, Decimal("0")) - issued
+            day += timedelta(days=1)
+
+        writer.flush()
+        rebuild_monthly_rollups()
+        rebuild_daily_rollups()
+        # Snapshots of the generated days left by earlier rows no longer hold
+        record_writes(after=stock_changes.items())
+        snapshot_day = min(last_day, localdate() - timedelta(days=1))
+        if snapshot_day >= first_day:
+            take_snapshot(snapshot_day)
+        transaction.on_commit(bump_global_version)
+    return writer.counts
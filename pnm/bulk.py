@@ -0,0 +1,117 @@
+"""
+Validation of many rows at once for the bulk write endpoints.
+
+A ModelSerializer validates each related primary key with its own query, so a
+list of N rows costs N queries per foreign key before anything is written.
+BulkListSerializer looks up every key a batch refers to with one in_bulk() per
+foreign key first, and CachedPrimaryKeyRelatedField answers from that lookup.
+"""
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from rest_framework import serializers
+
+from .signals import handle_bulk_create
+
+# Most rows one bulk request may carry
+BULK_MAX_ROWS = 1000
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField that resolves keys from the batch lookup when there is one."""
+    bulk_instances = None
+
+    def to_internal_value(self, data):
+        if self.bulk_instances is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in self.bulk_instances:
+            self.fail('does_not_exist', pk_value=data)
+        return self.bulk_instances[pk]
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """ListSerializer that fetches the related rows of the whole batch before validating it."""
+
+    # What validation made of each row, in order, with None for an invalid row
+    valid_rows = ()
+
+    def to_internal_value(self, data):
+        self.valid_rows = []
+        with self.related_lookups(data):
+            return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        try:
+            validated = super().run_child_validation(data)
+        except serializers.ValidationError:
+            self.valid_rows.append(None)
+            raise
+        self.valid_rows.append(validated)
+        return validated
+
+    def save_valid_rows(self, **kwargs):
+        """
+        Save the rows that passed validation when others did not, as save() saves a
+        fully valid list, without validating them again. Returns the new instances in
+        the order of their rows.
+        """
+        rows = [{**attrs, **kwargs} for attrs in self.valid_rows if attrs is not None]
+        return self.create(rows) if rows else []
+
+    def create(self, validated_data):
+        """
+        Insert every row with one bulk_create, then do once for the whole batch what
+        the signals of each saved row would have done.
+        """
+        model = self.child.Meta.model
+        instances = [model(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            model.objects.bulk_create(instances)
+            handle_bulk_create(model, instances)
+        return instances
+
+    @contextmanager
+    def related_lookups(self, data):
+        related_fields = [
+            field for field in self.child.fields.values()
+            if isinstance(field, CachedPrimaryKeyRelatedField) and not field.read_only
+        ]
+        if isinstance(data, list):
+            for field in related_fields:
+                field.bulk_instances = self._fetch_related(field, data)
+        try:
+            yield
+        finally:
+            for field in related_fields:
+                field.bulk_instances = None
+
+    @staticmethod
+    def _fetch_related(field, rows):
+        pk_field = field.get_queryset().model._meta.pk
+        pks = set()
+        for row in rows:
+            value = row.get(field.field_name) if isinstance(row, dict) else None
+            if value is None:
+                continue
+            try:
+                pks.add(pk_field.to_python(value))
+            except DjangoValidationError:
+                pass  # reported by the field itself
+        return field.get_queryset().in_bulk(pks)
+
+
+def row_errors(errors):
+    """
+    The errors of a failed BulkListSerializer as [{"index": ..., "errors": ...}] for
+    each invalid row, or unchanged when they are about the list itself.
+    """
+    if isinstance(errors, list):
+        errors = dict(enumerate(errors))
+    elif not all(isinstance(index, int) for index in errors):
+        return errors
+    return [{"index": index, "errors": detail} for index, detail in sorted(errors.items()) if detail]
@@ -0,0 +1,111 @@
+"""
+Diesel stock balance from the ledger of receipts (DieselStock) and issues (DieselEntry).
+
+Receipts are dated by their date and issues by their created_at, neither of which
+an edit changes, so editing a slip only moves the balance when its quantity changes.
+
+Writes only ever insert, update or delete their own row. The balance on a day is
+the latest DieselStockSnapshot taken on or before it plus the receipts and minus
+the issues of the days after the snapshot, so answering it reads at most the rows
+written since the last snapshot. A write dated on or before a snapshot makes that
+snapshot wrong, so it is dropped and the tail grows back until the next one.
+
+Before the ledger, every issue was also taken off the quantity and stock of the
+latest receipt, so the rows written then count each of their issues twice. The
+opening snapshot, seeded by migration 0008 from the stock the receipts kept,
+stands in for them: it is never dropped, and a write to a row dated on or before
+it moves its balance by the change the write makes instead.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.timezone import localtime, make_aware, now
+
+from core.metrics import DIESEL_BALANCE_TAIL_DAYS, DIESEL_BALANCE_WITHOUT_SNAPSHOT
+
+from .models import DieselEntry, DieselLedgerHead, DieselStock, DieselStockSnapshot
+
+
+def _total(queryset, field):
+    return queryset.aggregate(
+        total=Coalesce(Sum(field), Value(Decimal("0")), output_field=DecimalField())
+    )["total"]
+
+
+def _day_start(day):
+    return make_aware(datetime.combine(day, time.min))
+
+
+def stock_balance(day=None):
+    """Diesel in stock at the end of day (a date), or right now when day is None."""
+    balance, _ = balance_details(day)
+    return balance
+
+
+def balance_details(day=None):
+    """Diesel in stock at the end of day, or now, and the snapshot it was worked out from."""
+    if day is None:
+        day = localtime(now()).date()
+
+    snapshot = DieselStockSnapshot.objects.filter(date__lte=day).order_by("-date").first()
+    balance = snapshot.balance if snapshot else Decimal("0")
+
+    receipts = DieselStock.objects.filter(date__lte=day)
+    issues = DieselEntry.objects.filter(created_at__lt=_day_start(day + timedelta(days=1)))
+    if snapshot:
+        receipts = receipts.filter(date__gt=snapshot.date)
+        issues = issues.filter(created_at__gte=_day_start(snapshot.date + timedelta(days=1)))
+        DIESEL_BALANCE_TAIL_DAYS.observe((day - snapshot.date).days)
+    else:
+        DIESEL_BALANCE_WITHOUT_SNAPSHOT.inc()
+
+    return balance + _total(receipts, "quantity") - _total(issues, "quantity"), snapshot
+
+
+def lock_receipts():
+    """
+    Lock the ledger head until the current transaction ends. New receipts hold it
+    while they read the balance, so the stock recorded on each counts the receipts
+    entered before it even when several are entered at once.
+    """
+    DieselLedgerHead.objects.get_or_create(pk=1)
+    DieselLedgerHead.objects.select_for_update().filter(pk=1).exists()
+
+
+def take_snapshot(day):
+    """Record the balance at the end of day (a date that has ended)."""
+    balance = stock_balance(day)
+    snapshot, _ = DieselStockSnapshot.objects.update_or_create(date=day, defaults={"balance": balance})
+    return snapshot
+
+
+def record_writes(before=(), after=()):
+    """
+    Bring the snapshots up to date with writes to receipts or issues. before and
+    after hold the (day, change to the balance) of the rows written, as they were
+    and as they are now: a deleted row is only in before, a new one only in after.
+    """
+    changes = {}
+    for day, change in before:
+        changes[day] = changes.get(day, Decimal("0")) - change
+    for day, change in after:
+        changes[day] = changes.get(day, Decimal("0")) + change
+    # An edit that leaves the quantity and the day alone changes nothing
+    changes = {day: change for day, change in changes.items() if change}
+    if not changes:
+        return
+
+    first_day = min(changes)
+    DieselStockSnapshot.objects.filter(date__gte=first_day, opening=False).delete()
+
+    # The opening snapshot cannot be taken again, so it moves by the change to the days it
+    # covers: the total up to the latest changed day on or before it, the first to match
+    moved, total = [], Decimal("0")
+    for day in sorted(changes):
+        total += changes[day]
+        moved.append(When(date__gte=day, then=Value(total)))
+    DieselStockSnapshot.objects.filter(date__gte=first_day, opening=True).update(
+        balance=F("balance") + Case(*reversed(moved), default=Value(Decimal("0")))
+    )
@@ -0,0 +1,126 @@
+import csv
+import io
+import tempfile
+from itertools import chain, islice
+
+import openpyxl
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from .renderers import CSVRenderer, NDJSONRenderer, ndjson_line
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Leading rows held in memory to size the columns of a streamed spreadsheet
+WIDTH_SAMPLE_ROWS = 1000
+
+
+def report_workbook(report, rows):
+    """Workbook listing the rows of a MonthlyReport, one column per report column."""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = report.title
+
+    headers = [header for header, _ in report.columns]
+    sheet.append(headers)
+    if report.bold_header:
+        for cell in sheet[1]:
+            cell.font = Font(bold=True)
+
+    # Column widths are tracked while appending instead of rescanning the sheet
+    widths = [len(header) for header in headers]
+    for row in rows:
+        if not report.include_in_export(row):
+            continue
+        values = [getattr(row, attr) for _, attr in report.columns]
+        sheet.append(values)
+        for index, value in enumerate(values):
+            if value is not None:
+                widths[index] = max(widths[index], len(str(value)))
+
+    for index, width in enumerate(widths, 1):
+        sheet.column_dimensions[get_column_letter(index)].width = width + 2
+
+    return workbook
+
+
+def workbook_bytes(workbook):
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def xlsx_response(content, filename):
+    """Send content, the bytes of a saved workbook, as a spreadsheet attachment."""
+    response = HttpResponse(content, content_type=XLSX_CONTENT_TYPE)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def xlsx_file(title, headers, rows):
+    """
+    Write a single-sheet spreadsheet of rows (an iterable of cell lists) to a
+    temporary file, returned rewound.
+
+    The sheet is written in openpyxl's write-only mode, which spools each row to
+    disk as it is appended, so memory stays flat however many rows there are.
+    A write-only sheet needs its column widths before the first row, so they are
+    sized from the header and the first WIDTH_SAMPLE_ROWS rows.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+
+    rows = iter(rows)
+    sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+
+    widths = [len(header) for header in headers]
+    for row in sample:
+        for index, value in enumerate(row[:len(widths)]):
+            if value:
+                widths[index] = max(widths[index], len(str(value)))
+    for index, width in enumerate(widths, 1):
+        sheet.column_dimensions[get_column_letter(index)].width = width + 2
+
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(sheet, value=header)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    sheet.append(header_cells)
+
+    for row in chain(sample, rows):
+        sheet.append(row)
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def xlsx_file_response(output, filename):
+    """Send the spreadsheet in the file object output in chunks."""
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each formatted line back."""
+
+    def write(self, value):
+        return value
+
+
+def streaming_csv_response(headers, rows, filename):
+    """Stream rows (an iterable of value lists) as CSV, one line per row as it is produced."""
+    writer = csv.writer(_Echo())
+    content = chain([writer.writerow(headers)], (writer.writerow(row) for row in rows))
+    response = StreamingHttpResponse(content, content_type=f"{CSVRenderer.media_type}; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def streaming_ndjson_response(records):
+    """Stream records (an iterable of JSON-serializable dicts) as newline-delimited JSON."""
+    content = (ndjson_line(record) for record in records)
+    return StreamingHttpResponse(content, content_type=f"{NDJSONRenderer.media_type}; charset=utf-8")
@@ -0,0 +1,71 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from pnm.benchmarks import benchmark_asset, scratch_database
+from pnm.diesel_ledger import stock_balance
+from pnm.models import DieselEntry, DieselStock
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure diesel entry write throughput with several concurrent writers, "
+        "on a throwaway copy of the database, and check the stock balance adds up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--entries", type=int, default=200, help="Diesel entries to post in total.")
+        parser.add_argument("--threads", type=int, default=8, help="Concurrent writers.")
+
+    def handle(self, *args, **options):
+        entries, threads = options["entries"], options["threads"]
+        if entries < 1 or threads < 1:
+            raise CommandError("--entries and --threads must be positive.")
+
+        with scratch_database():
+            asset = benchmark_asset(1)
+            asset.save()
+            DieselStock.objects.create(
+                challan_no=1, quantity=Decimal(entries), rate=Decimal("90"), party_name="Benchmark"
+            )
+
+            errors = []
+
+            def post_entries(count):
+                try:
+                    for _ in range(count):
+                        DieselEntry.objects.create(
+                            asset=asset, quantity=Decimal("1"), rate=Decimal("90"),
+                            previous_reading=Decimal("0"), reading=Decimal("0"), site="Benchmark",
+                        )
+                except Exception as exc:
+                    errors.append(exc)
+                finally:
+                    connection.close()
+
+            shares = [entries // threads + (index < entries % threads) for index in range(threads)]
+            workers = [threading.Thread(target=post_entries, args=(share,)) for share in shares]
+
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+
+            if errors:
+                raise CommandError(f"{len(errors)} writers failed, the first with: {errors[0]!r}")
+
+            balance = stock_balance()
+            posted = DieselEntry.objects.count()
+
+        self.stdout.write(
+            f"{posted} entries from {threads} threads in {elapsed:.2f}s "
+            f"({posted / elapsed:.0f} entries/s); stock left {balance} (expected 0)"
+        )
+        if posted != entries or balance != 0:
+            raise CommandError("Stock drifted: concurrent entries were lost.")
+        self.stdout.write(self.style.SUCCESS("No entry was lost."))
@@ -0,0 +1,159 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils.timezone import now
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from pnm.benchmarks import generate_fleet, scratch_database
+from pnm.models import Breakdown, DieselEntry, TripDetails
+from pnm.report_cache import report_cache
+from pnm.reports import month_range
+from pnm.serializers import BreakdownReportSerializer, DieselReportSerializer, ViewTripDetailsSerializer
+
+REPORT_PATHS = [
+    "/pnm/tipper-report/",
+    "/pnm/tipper-report-excel/",
+    "/pnm/excavator-report/",
+    "/pnm/excavator-report-excel/",
+    "/pnm/other-report/",
+    "/pnm/other-report-excel/",
+    "/pnm/complete-report/",
+    "/pnm/complete-report-excel/",
+    "/pnm/trip-report/",
+    "/pnm/trip-report-excel/",
+]
+
+# The list serializers and the rows the report endpoints hand them, for one month
+SERIALIZER_QUERYSETS = [
+    (ViewTripDetailsSerializer, lambda: TripDetails.objects.select_related('asset')),
+    (BreakdownReportSerializer, lambda: Breakdown.objects.select_related('asset', 'manager', 'mechanic')),
+    (DieselReportSerializer, lambda: DieselEntry.objects.select_related('asset', 'manager')),
+]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the monthly report endpoints, their spreadsheet exports and the report list "
+        "serializers on generated fleets of several sizes, on a throwaway copy of the "
+        "database, and write wall time, query count and peak memory to a JSON file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="25,100", help="Comma separated fleet sizes (assets).")
+        parser.add_argument("--months", type=int, default=3, help="Months of activity per fleet.")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per benchmark.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the generated fleets.")
+        parser.add_argument("--output", default="benchmark_reports.json", help="File to write the results to.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(size) for size in options["sizes"].split(",")})
+        except ValueError:
+            raise CommandError("--sizes must be comma separated numbers.")
+        if not sizes or sizes[0] < 1 or options["months"] < 1 or options["repeat"] < 1:
+            raise CommandError("--sizes, --months and --repeat must be positive.")
+
+        month = date(2025, 6, 1)
+        results = {
+            "commit": git_commit(),
+            "created_at": now().isoformat(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "month": f"{month:%Y-%m}",
+            "repeat": options["repeat"],
+            "fleets": [],
+        }
+        for size in sizes:
+            self.stdout.write(f"Fleet of {size} assets")
+            with scratch_database():
+                rows = generate_fleet(size, options["months"], month, seed=options["seed"])
+                benchmarks = self.run_benchmarks(month, options["repeat"])
+            results["fleets"].append({"assets": size, "rows": rows, "benchmarks": benchmarks})
+
+        with open(options["output"], "w") as output:
+            json.dump(results, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def run_benchmarks(self, month, repeat):
+        user = get_user_model().objects.create_superuser(username="benchmark", password="benchmark")
+        factory = APIRequestFactory()
+        start_datetime, end_datetime = month_range(f"{month:%Y-%m}")
+
+        def report(path):
+            def run():
+                # Every run builds the report rather than reading it from the cache
+                report_cache().clear()
+                request = factory.get(path, {"month": f"{month:%Y-%m}"})
+                force_authenticate(request, user)
+                response = resolve(path).func(request)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                elif hasattr(response, "render"):
+                    response.render()
+                return response
+            return run
+
+        def serialize(serializer_class, queryset):
+            def run():
+                rows = queryset().filter(date__range=(start_datetime, end_datetime))
+                return serializer_class(rows, many=True).data
+            return run
+
+        cases = [(path.strip("/").split("/")[-1], report(path)) for path in REPORT_PATHS]
+        cases += [
+            (serializer_class.__name__, serialize(serializer_class, queryset))
+            for serializer_class, queryset in SERIALIZER_QUERYSETS
+        ]
+
+        benchmarks = []
+        for name, run in cases:
+            benchmark = self.measure(run, repeat)
+            benchmarks.append({"name": name, **benchmark})
+            self.stdout.write(
+                f"  {name:<28} {benchmark['median_seconds'] * 1000:9.1f} ms {benchmark['queries']:>5} queries "
+                f"{benchmark['peak_memory_bytes'] / 2 ** 20:8.1f} MiB"
+            )
+        return benchmarks
+
+    def measure(self, run, repeat):
+        times = []
+        with CaptureQueriesContext(connection) as queries:
+            run()
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - started)
+
+        # Measured on a run of its own, as tracing allocations slows it down
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "median_seconds": statistics.median(times),
+            "min_seconds": min(times),
+            "queries": len(queries),
+            "peak_memory_bytes": peak,
+        }
@@ -0,0 +1,47 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import localdate
+
+from pnm.benchmarks import BENCHMARK_ASSET_PREFIX, generate_fleet
+from pnm.models import Asset
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the configured database with a synthetic fleet, with its trips, diesel "
+        "entries, receipts and breakdowns, for load and scale testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--assets", type=int, default=200, help="Assets to create, of every type in turn.")
+        parser.add_argument("--months", type=int, default=12, help="Months of activity to generate.")
+        parser.add_argument("--end", help="Last month to generate (YYYY-MM); defaults to last month.")
+        parser.add_argument("--trips-per-day", type=int, default=4, help="Average trips per asset per day.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; the same arguments give the same rows.")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Rows per INSERT.")
+
+    def handle(self, *args, **options):
+        if min(options["assets"], options["months"], options["batch_size"]) < 1 or options["trips_per_day"] < 0:
+            raise CommandError("--assets, --months and --batch-size must be positive.")
+        if options["end"]:
+            try:
+                end_month = datetime.strptime(options["end"], "%Y-%m").date()
+            except ValueError:
+                raise CommandError("Invalid month format. Use YYYY-MM.")
+        else:
+            end_month = (localdate().replace(day=1) - timedelta(days=1)).replace(day=1)
+        if Asset.objects.filter(asset_id__startswith=BENCHMARK_ASSET_PREFIX).exists():
+            raise CommandError("This database already holds a generated fleet.")
+
+        started = time.perf_counter()
+        counts = generate_fleet(
+            options["assets"], options["months"], end_month, trips_per_day=options["trips_per_day"],
+            seed=options["seed"], batch_size=options["batch_size"],
+        )
+        elapsed = time.perf_counter() - started
+
+        for model, count in counts.items():
+            self.stdout.write(f"{model:<15} {count:>10}")
+        self.stdout.write(self.style.SUCCESS(f"Generated {sum(counts.values())} rows in {elapsed:.1f}s."))
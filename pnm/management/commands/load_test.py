@@ -0,0 +1,217 @@
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.timezone import localdate
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from pnm.models import AssetManager, Breakdown, Manager
+
+LOCAL_HOSTS = {"", "localhost", "127.0.0.1", "::1"}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class SiteManager:
+    """One simulated manager: posts and reads what a manager on site would, as fast as the server answers."""
+
+    def __init__(self, base_url, manager, assets, breakdowns, months, rng):
+        self.base_url = base_url
+        self.token = str(RefreshToken.for_user(manager.user).access_token)
+        self.manager_id = manager.pk
+        self.assets = assets
+        self.breakdowns = breakdowns
+        self.months = months
+        self.rng = rng
+
+    def actions(self):
+        """(weight, endpoint label, method, path, body) of every kind of request the manager sends."""
+        asset = self.rng.choice(self.assets)
+        month = self.rng.choice(self.months)
+        actions = [
+            (30, "POST trip-details", "POST", "/pnm/trip-details/", {
+                "asset": asset, "manager": self.manager_id, "from_location": "Quarry", "to_location": "Site",
+                "material": "Sand", "rate": self.rng.randrange(100, 1000, 10), "distance": self.rng.randint(5, 80),
+                "net_weight": self.rng.randint(8, 30), "deal_type": "Sale",
+            }),
+            (20, "POST diesel-entry", "POST", "/pnm/diesel-entry/", {
+                "asset": asset, "manager": self.manager_id, "quantity": self.rng.randint(20, 120), "rate": 92,
+                "previous_reading": 0, "reading": 0, "site": "Site",
+            }),
+            (10, "GET receivable-trips", "GET", "/pnm/receivable-trips/", None),
+            (10, "GET diesel-entry", "GET", "/pnm/diesel-entry/", None),
+            (5, "GET diesel-stock/balance", "GET", "/pnm/diesel-stock/balance/", None),
+            (5, "GET tipper-report", "GET", f"/pnm/tipper-report/?month={month}", None),
+            (3, "GET complete-report", "GET", f"/pnm/complete-report/?month={month}", None),
+            (3, "GET trip-report", "GET", f"/pnm/trip-report/?month={month}", None),
+            (2, "GET complete-report-excel", "GET", f"/pnm/complete-report-excel/?month={month}", None),
+            (2, "GET trip-report-excel", "GET", f"/pnm/trip-report-excel/?month={month}", None),
+        ]
+        if self.breakdowns:
+            actions.append((10, "PATCH breakdown", "PATCH", f"/pnm/breakdown/{self.rng.choice(self.breakdowns)}/", {
+                "status": "Partially Completed", "action_taken": "Parts ordered",
+            }))
+        return actions
+
+    def request(self):
+        actions = self.actions()
+        _, label, method, path, body = self.rng.choices(actions, weights=[action[0] for action in actions])[0]
+        request = urllib.request.Request(
+            self.base_url + path, method=method,
+            data=json.dumps(body).encode() if body is not None else None,
+            headers={"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"},
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                ok = True
+        except (urllib.error.URLError, OSError):
+            ok = False
+        return label, time.perf_counter() - started, ok
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the project with gunicorn against the configured local database and send it "
+        "a mix of trip posts, diesel entries, breakdown updates and report downloads from "
+        "many simulated managers at once, then print latency percentiles per endpoint. "
+        "Writes rows: run it on a database filled by generate_fleet, never production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--managers", type=int, default=20, help="Simulated managers sending requests at once.")
+        parser.add_argument("--duration", type=int, default=60, help="Seconds to send requests for.")
+        parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes.")
+        parser.add_argument("--threads", type=int, default=4, help="Threads per gunicorn worker.")
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the request mix.")
+        parser.add_argument("--output", help="Also write the results to this JSON file.")
+
+    def handle(self, *args, **options):
+        if min(options["managers"], options["duration"], options["workers"], options["threads"]) < 1:
+            raise CommandError("--managers, --duration, --workers and --threads must be positive.")
+        if connection.vendor != "sqlite" and connection.settings_dict["HOST"] not in LOCAL_HOSTS:
+            raise CommandError("The load test writes rows, so it only runs against a local database.")
+
+        port = free_port()
+        rng = random.Random(options["seed"])
+        site_managers = self.site_managers(f"http://127.0.0.1:{port}", options["managers"], rng)
+
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn", f"{settings.WSGI_APPLICATION.rsplit('.', 1)[0]}:application",
+                "--bind", f"127.0.0.1:{port}", "--workers", str(options["workers"]),
+                "--threads", str(options["threads"]), "--log-level", "warning",
+            ],
+            env={**os.environ, "ALLOWED_HOSTS": "127.0.0.1", "DEBUG": "False"},
+        )
+        try:
+            self.wait_for(server, port)
+            results = self.run(site_managers, options["duration"])
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+        summary = self.summarize(results, options["duration"])
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({**summary, "managers": options["managers"], "workers": options["workers"],
+                           "threads": options["threads"], "database": connection.vendor}, output, indent=2)
+
+    def site_managers(self, base_url, count, rng):
+        # The assets each manager has now: the last assignment of every asset
+        current = dict(AssetManager.objects.order_by("date_assigned", "id").values_list("asset_id", "manager_id"))
+        assets_of = defaultdict(list)
+        for asset_id, manager_id in current.items():
+            assets_of[manager_id].append(asset_id)
+        managers = list(Manager.objects.filter(pk__in=assets_of).select_related("user").order_by("id"))
+        if not managers:
+            raise CommandError("No manager has assets. Fill the database with generate_fleet first.")
+
+        breakdowns = list(
+            Breakdown.objects.filter(status__in=["Pending", "Partially Completed"]).values_list("id", flat=True)[:1000]
+        )
+        this_month = localdate().replace(day=1)
+        months = [f"{this_month:%Y-%m}", f"{(this_month - timedelta(days=1)):%Y-%m}"]
+        return [
+            SiteManager(base_url, manager, assets_of[manager.pk], breakdowns, months, random.Random(rng.random()))
+            for manager in (managers[index % len(managers)] for index in range(count))
+        ]
+
+    def wait_for(self, server, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("gunicorn exited before it started serving.")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError("gunicorn did not start serving in time.")
+
+    def run(self, site_managers, duration):
+        results = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def send(site_manager):
+            samples = []
+            while time.monotonic() < deadline:
+                samples.append(site_manager.request())
+            with lock:
+                results.extend(samples)
+
+        threads = [threading.Thread(target=send, args=(site_manager,)) for site_manager in site_managers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def summarize(self, results, duration):
+        by_endpoint = defaultdict(list)
+        errors = defaultdict(int)
+        for label, seconds, ok in results:
+            by_endpoint[label].append(seconds)
+            errors[label] += not ok
+
+        endpoints = {}
+        self.stdout.write(f"{'endpoint':<28} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for label, samples in sorted(by_endpoint.items()):
+            # cut_points[p - 1] is the p-th percentile
+            cut_points = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+            endpoints[label] = {
+                "requests": len(samples),
+                "errors": errors[label],
+                "p50_ms": cut_points[49] * 1000,
+                "p95_ms": cut_points[94] * 1000,
+                "p99_ms": cut_points[98] * 1000,
+            }
+            row = endpoints[label]
+            self.stdout.write(
+                f"{label:<28} {row['requests']:>8} {row['errors']:>6} "
+                f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+            )
+
+        total_errors = sum(errors.values())
+        style = self.style.SUCCESS if not total_errors else self.style.ERROR
+        self.stdout.write(style(f"{len(results)} requests in {duration}s ({len(results) / duration:.1f}/s), {total_errors} errors"))
+        return {"duration": duration, "requests": len(results), "errors": total_errors, "endpoints": endpoints}
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pnm.rollups import rebuild_daily_rollups, rebuild_monthly_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-asset monthly and daily rollups from trips, diesel entries and breakdowns."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="Only rebuild this month (YYYY-MM).")
+
+    def handle(self, *args, **options):
+        month = None
+        if options["month"]:
+            try:
+                month = datetime.strptime(options["month"], "%Y-%m").date()
+            except ValueError:
+                raise CommandError("Invalid month format. Use YYYY-MM.")
+
+        monthly = rebuild_monthly_rollups(month)
+        daily = rebuild_daily_rollups(month)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {monthly} monthly and {daily} daily material rollups."))
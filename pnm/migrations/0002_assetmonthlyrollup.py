@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pnm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('trip_count', models.IntegerField(default=0)),
+                ('distance', models.DecimalField(decimal_places=2, max_digits=14, null=True)),
+                ('hours', models.DecimalField(decimal_places=2, max_digits=14, null=True)),
+                ('shifts', models.DecimalField(decimal_places=2, max_digits=14, null=True)),
+                ('net_weight', models.DecimalField(decimal_places=2, max_digits=14, null=True)),
+                ('revenue_by_weight', models.DecimalField(decimal_places=4, max_digits=16, null=True)),
+                ('revenue_by_hours', models.DecimalField(decimal_places=4, max_digits=16, null=True)),
+                ('revenue_by_shift', models.DecimalField(decimal_places=4, max_digits=16, null=True)),
+                ('diesel_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('diesel_amount', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('maintenance_cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to='pnm.asset')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'asset'), name='unique_asset_monthly_rollup')],
+            },
+        ),
+    ]
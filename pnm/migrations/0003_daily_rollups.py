@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pnm', '0002_assetmonthlyrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetDailyDieselRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('amount', models.DecimalField(decimal_places=4, default=0, max_digits=16)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_diesel_rollups', to='pnm.asset')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'asset'), name='unique_asset_daily_diesel_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AssetDailyMaterialRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('material', models.CharField(max_length=255, null=True)),
+                ('trip_count', models.IntegerField(default=0)),
+                ('distance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('net_weight', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('first_trip_id', models.BigIntegerField()),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_material_rollups', to='pnm.asset')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'asset'], name='daily_material_day_asset_idx')],
+            },
+        ),
+    ]
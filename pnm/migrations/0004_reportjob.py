@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pnm', '0003_daily_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_type', models.CharField(choices=[('tipper', 'Tipper'), ('excavator', 'Excavator'), ('other', 'Other Assets'), ('complete', 'Complete'), ('trip', 'Trip')], max_length=20)),
+                ('month', models.DateField()),
+                ('format', models.CharField(choices=[('json', 'JSON'), ('xlsx', 'XLSX')], max_length=10)),
+                ('asset_type', models.CharField(blank=True, choices=[('Tipper', 'Tipper'), ('Excavator', 'Excavator'), ('Paver', 'Paver'), ('Dozer', 'Dozer'), ('B-Tempo', 'B-Tempo'), ('Bus', 'Bus'), ('Camper', 'Camper'), ('Farana', 'Farana'), ('Grader', 'Grader'), ('Loader', 'Loader'), ('Backhoe Loader', 'Backhoe Loader'), ('Roller', 'Roller'), ('Service Van', 'Service Van'), ('Trailor', 'Trailor'), ('Transit Mixer', 'Transit Mixer'), ('Water Tanker', 'Water Tanker'), ('Wagon Drill', 'Wagon Drill'), ('Bitumen Bowser', 'Bitumen Bowser'), ('Diesel Tanker', 'Diesel Tanker'), ('Personal Vehicle', 'Personal Vehicle'), ('Two Wheeler', 'Two Wheeler'), ('Pick Up', 'Pick Up'), ('Crane', 'Crane')], max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('file', models.FileField(blank=True, null=True, upload_to='reports/')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
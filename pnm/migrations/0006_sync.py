@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pnm', '0005_dieselstocksnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='breakdown',
+            index=models.Index(fields=['date', 'id'], name='breakdown_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dieselentry',
+            index=models.Index(fields=['date', 'id'], name='diesel_entry_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripdetails',
+            index=models.Index(fields=['date', 'id'], name='trip_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['model', 'deleted_at', 'id'], name='sync_tombstone_idx'),
+        ),
+    ]
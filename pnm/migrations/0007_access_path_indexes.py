@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pnm', '0006_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assetmanager',
+            index=models.Index(fields=['asset', 'date_assigned'], name='assignment_asset_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='breakdown',
+            index=models.Index(fields=['asset', 'date'], name='breakdown_asset_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='breakdown',
+            index=models.Index(fields=['status'], name='breakdown_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dieselentry',
+            index=models.Index(fields=['asset', 'date'], name='diesel_entry_asset_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dieselentry',
+            index=models.Index(fields=['manager', '-date'], name='diesel_entry_manager_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_unread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripdetails',
+            index=models.Index(fields=['asset', 'date'], name='trip_asset_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripdetails',
+            index=models.Index(fields=['manager', '-date'], name='trip_manager_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tripdetails',
+            index=models.Index(fields=['receiver', '-date'], name='trip_receiver_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='assetmanager',
+            name='asset',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='asset_assignments', to='pnm.asset'),
+        ),
+        migrations.AlterField(
+            model_name='breakdown',
+            name='asset',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='breakdown_occurred', to='pnm.asset'),
+        ),
+        migrations.AlterField(
+            model_name='dieselentry',
+            name='asset',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='pnm.asset'),
+        ),
+        migrations.AlterField(
+            model_name='dieselentry',
+            name='manager',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='pnm.manager'),
+        ),
+        migrations.AlterField(
+            model_name='dieselstock',
+            name='date',
+            field=models.DateField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='recipient',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='tripdetails',
+            name='asset',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='trips', to='pnm.asset'),
+        ),
+        migrations.AlterField(
+            model_name='tripdetails',
+            name='manager',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='pnm.manager'),
+        ),
+        migrations.AlterField(
+            model_name='tripdetails',
+            name='receiver',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='trip_receiver', to='pnm.manager'),
+        ),
+    ]
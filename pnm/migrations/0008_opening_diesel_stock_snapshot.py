@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:40
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.utils.timezone import localdate, make_aware
+
+
+def seed_opening_snapshot(apps, schema_editor):
+    """
+    Carry the stock kept by the receipts over into the ledger. Until now every
+    issue was also taken off the quantity and stock of the latest receipt, whose
+    stock is therefore the balance right now, while the ledger would take each
+    issue off a second time.
+
+    The snapshot is dated yesterday, so that the writes of today and later, the
+    only ones to come, fall after it. Today's rows are taken back out of the
+    balance, as the ledger adds them on top of the snapshot.
+    """
+    DieselStock = apps.get_model('pnm', 'DieselStock')
+    DieselEntry = apps.get_model('pnm', 'DieselEntry')
+    DieselStockSnapshot = apps.get_model('pnm', 'DieselStockSnapshot')
+
+    # Worked out from rows that count their issues twice
+    DieselStockSnapshot.objects.all().delete()
+
+    latest = DieselStock.objects.order_by('-id').first()
+    if latest is None and not DieselEntry.objects.exists():
+        return
+
+    day = localdate() - timedelta(days=1)
+    receipts_after = DieselStock.objects.filter(date__gt=day).aggregate(total=Sum('quantity'))['total']
+    issues_after = DieselEntry.objects.filter(
+        date__gte=make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    ).aggregate(total=Sum('quantity'))['total']
+
+    balance = (latest.stock if latest else Decimal('0')) - (receipts_after or 0) + (issues_after or 0)
+    DieselStockSnapshot.objects.create(date=day, balance=balance, opening=True)
+
+
+def drop_opening_snapshot(apps, schema_editor):
+    apps.get_model('pnm', 'DieselStockSnapshot').objects.filter(opening=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pnm', '0007_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dieselstocksnapshot',
+            name='opening',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(seed_opening_snapshot, drop_opening_snapshot),
+    ]
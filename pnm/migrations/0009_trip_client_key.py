@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pnm', '0008_opening_diesel_stock_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tripdetails',
+            name='client_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='tripdetails',
+            constraint=models.UniqueConstraint(fields=('manager', 'client_key'), name='unique_trip_client_key'),
+        ),
+    ]
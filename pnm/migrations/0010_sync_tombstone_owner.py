@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pnm', '0009_trip_client_key'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='synctombstone',
+            name='sync_tombstone_idx',
+        ),
+        migrations.AddField(
+            model_name='synctombstone',
+            name='owner',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='pnm.manager'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['model', 'owner', 'deleted_at', 'id'], name='sync_tombstone_owner_idx'),
+        ),
+    ]
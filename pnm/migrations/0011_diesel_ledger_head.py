@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pnm', '0010_sync_tombstone_owner'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DieselLedgerHead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+    ]
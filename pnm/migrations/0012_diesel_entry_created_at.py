@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:20
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def date_existing_entries(apps, schema_editor):
+    # The best record of when an existing slip was entered is when it was last written
+    apps.get_model('pnm', 'DieselEntry').objects.update(created_at=F('date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pnm', '0011_diesel_ledger_head'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dieselentry',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(date_existing_entries, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='dieselentry',
+            index=models.Index(fields=['created_at'], name='diesel_entry_created_idx'),
+        ),
+    ]
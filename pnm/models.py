@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import RegexValidator
 from django.conf import settings
 from django.contrib import admin
@@ -51,6 +51,26 @@ NOTIFICATION_TYPE_CHOICES = [
     ('general', 'General'),
 ]
 
+REPORT_TYPE_CHOICES = [
+    ('tipper', 'Tipper'),
+    ('excavator', 'Excavator'),
+    ('other', 'Other Assets'),
+    ('complete', 'Complete'),
+    ('trip', 'Trip'),
+]
+
+REPORT_FORMAT_CHOICES = [
+    ('json', 'JSON'),
+    ('xlsx', 'XLSX'),
+]
+
+REPORT_JOB_STATUS_CHOICES = [
+    ('pending', 'Pending'),
+    ('running', 'Running'),
+    ('completed', 'Completed'),
+    ('failed', 'Failed'),
+]
+
 ASSET_CATEGORY = [
     ('vehicle','vehicle'),
     ('machinery','machinery')
@@ -155,14 +175,19 @@ class Mechanic(models.Model):
 
 # AssetManager Model
 class AssetManager(models.Model):
-    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='asset_assignments')
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='asset_assignments', db_index=False)
     manager = models.ForeignKey(Manager, on_delete=models.CASCADE)
     site = models.CharField(max_length=255)
     date_assigned = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['asset', 'date_assigned'], name='assignment_asset_date_idx'),
+        ]
+
 # Trip Details Model
 class TripDetails(models.Model):
-    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='trips')  
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='trips', db_index=False)  
     date = models.DateTimeField(auto_now=True)
     from_location = models.CharField(max_length=255)
     to_location = models.CharField(max_length=255, null=True)
@@ -172,77 +197,56 @@ class TripDetails(models.Model):
     net_weight = models.DecimalField(max_digits=10, decimal_places=2,null=True)
     deal_type = models.CharField(max_length=50, choices=DEAL_TYPE_CHOICES)
     hours = models.IntegerField(null=True)
-    manager = models.ForeignKey(Manager, on_delete=models.CASCADE, null=True)
-    receiver = models.ForeignKey(Manager,on_delete=models.CASCADE,null=True,related_name='trip_receiver')
+    manager = models.ForeignKey(Manager, on_delete=models.CASCADE, null=True, db_index=False)
+    receiver = models.ForeignKey(Manager,on_delete=models.CASCADE,null=True,related_name='trip_receiver', db_index=False)
     shift = models.IntegerField(null=True)
     start_time = models.TimeField(null=True)
     end_time = models.TimeField(null=True)
     operator = models.ForeignKey('Operator', on_delete=models.CASCADE, null=True)
+    # Chosen by the device that recorded a trip sent in a batch, so a batch sent again is not saved twice
+    client_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['manager', 'client_key'], name='unique_trip_client_key'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'id'], name='trip_sync_idx'),
+            models.Index(fields=['asset', 'date'], name='trip_asset_date_idx'),
+            models.Index(fields=['manager', '-date'], name='trip_manager_date_idx'),
+            models.Index(fields=['receiver', '-date'], name='trip_receiver_date_idx'),
+        ]
 
     def __str__(self):
         return f"Trip on {self.date} - {self.asset.name}"
 
 # Diesel Entry Model
 class DieselEntry(models.Model):
-    asset = models.ForeignKey(Asset, on_delete=models.CASCADE)  
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, db_index=False)  
     date = models.DateTimeField(auto_now=True)
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
     rate = models.DecimalField(max_digits=10, decimal_places=2)
     previous_reading = models.DecimalField(max_digits=10, decimal_places=2)
     reading = models.DecimalField(max_digits=10, decimal_places=2)  
     site = models.CharField(max_length=255)
-    manager = models.ForeignKey(Manager, on_delete=models.CASCADE, null=True)
+    manager = models.ForeignKey(Manager, on_delete=models.CASCADE, null=True, db_index=False)
+    # When the slip was entered, which dates it in the stock ledger: date moves on every edit
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='diesel_entry_created_idx'),
+            models.Index(fields=['date', 'id'], name='diesel_entry_sync_idx'),
+            models.Index(fields=['asset', 'date'], name='diesel_entry_asset_date_idx'),
+            models.Index(fields=['manager', '-date'], name='diesel_entry_manager_date_idx'),
+        ]
 
     def __str__(self):
         return f"Diesel Entry on {self.date} - {self.asset.name}"
     
-    def save(self, *args, **kwargs):
-        if not self.pk:  # Only on create
-            latest_stock_entry = DieselStock.objects.order_by('-id').first()
-            if latest_stock_entry:
-                # Reduce the quantity from latest_stock
-                latest_stock_entry.quantity -= self.quantity
-                latest_stock_entry.amount = latest_stock_entry.quantity * latest_stock_entry.rate
-                # Recalculate its stock based on previous
-                prev_stock_entry = DieselStock.objects.filter(id__lt=latest_stock_entry.id).order_by('-id').first()
-                latest_stock_entry.stock = (prev_stock_entry.stock if prev_stock_entry else 0) + latest_stock_entry.quantity
-                latest_stock_entry.save()
-
-                # Recalculate all subsequent stock entries
-                following = DieselStock.objects.filter(id__gt=latest_stock_entry.id).order_by('id')
-                running_stock = latest_stock_entry.stock
-                for entry in following:
-                    running_stock += entry.quantity
-                    entry.stock = running_stock
-                    entry.save()
-
-        super().save(*args, **kwargs)
-    def delete(self, *args, **kwargs):
-        # Restore quantity back to the latest DieselStock entry
-        latest_stock_entry = DieselStock.objects.order_by('-id').first()
-        if latest_stock_entry:
-            # Add quantity back
-            latest_stock_entry.quantity += self.quantity
-            latest_stock_entry.amount = latest_stock_entry.quantity * latest_stock_entry.rate
-
-            # Recalculate stock based on previous entry
-            prev_stock_entry = DieselStock.objects.filter(id__lt=latest_stock_entry.id).order_by('-id').first()
-            latest_stock_entry.stock = (prev_stock_entry.stock if prev_stock_entry else 0) + latest_stock_entry.quantity
-            latest_stock_entry.save()
-
-            # Update all following stock entries
-            following = DieselStock.objects.filter(id__gt=latest_stock_entry.id).order_by('id')
-            running_stock = latest_stock_entry.stock
-            for entry in following:
-                running_stock += entry.quantity
-                entry.stock = running_stock
-                entry.save()
-
-        super().delete(*args, **kwargs)
-
 # Breakdown Model
 class Breakdown(models.Model):
-    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='breakdown_occurred')  
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='breakdown_occurred', db_index=False)  
     date = models.DateTimeField(auto_now=True)
     site = models.CharField(max_length=255)
     issue = models.TextField()
@@ -255,18 +259,29 @@ class Breakdown(models.Model):
     material_used = models.CharField(max_length=255,null=True)
     manager = models.ForeignKey(Manager, on_delete=models.CASCADE, null=True)
     mechanic = models.ForeignKey(Mechanic, on_delete=models.CASCADE, null=True)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='breakdown_sync_idx'),
+            models.Index(fields=['asset', 'date'], name='breakdown_asset_date_idx'),
+            models.Index(fields=['status'], name='breakdown_status_idx'),
+        ]
 
     def __str__(self):
         return f"Breakdown on {self.date} - {self.asset.name}"
 
 class Notification(models.Model):
-    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
     message = models.TextField()
     notification_type = models.CharField(max_length=50, choices=NOTIFICATION_TYPE_CHOICES, default='general')  
     created_at = models.DateTimeField(auto_now_add=True)  
     is_read = models.BooleanField(default=False)  
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notification_unread_idx'),
+        ]
+
     def __str__(self):
         return f"Notification for {self.recipient.username} - {self.notification_type}"
 
@@ -276,45 +291,47 @@ class Notification(models.Model):
         self.save()
 
 class DieselStock(models.Model):
-
+    """
+    A diesel receipt. Receipts and DieselEntry issues together form the stock
+    ledger; the balance is worked out from them (see pnm.diesel_ledger) instead of
+    being rewritten on every write.
+    """
     challan_no = models.IntegerField(unique=True)
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(auto_now_add=True, db_index=True)
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
     rate = models.DecimalField(max_digits=10, decimal_places=2)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     party_name = models.CharField(max_length=255)
-    stock = models.DecimalField(max_digits=10, decimal_places=2)
+    stock = models.DecimalField(max_digits=10, decimal_places=2)  # balance right after this receipt was entered
 
     def save(self, *args, **kwargs):
-        self.amount = self.quantity * self.rate
+        from .diesel_ledger import lock_receipts, stock_balance
 
+        self.amount = self.quantity * self.rate
         if self.pk:
-            # Editing existing entry
-            old = DieselStock.objects.get(pk=self.pk)
+            return super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Receipts entered at the same time take turns, so each counts the ones before it
+            lock_receipts()
+            self.stock = stock_balance() + self.quantity
+            super().save(*args, **kwargs)
 
-            # Get previous stock from the entry just before this one
-            prev_stock_entry = DieselStock.objects.filter(id__lt=self.pk).order_by('-id').first()
-            prev_stock = prev_stock_entry.stock if prev_stock_entry else 0
 
-            # Update current stock
-            self.stock = prev_stock + self.quantity
+class DieselLedgerHead(models.Model):
+    """The one row new receipts lock while they work out their stock (see DieselStock.save)."""
 
-            # Save current record first
-            super().save(*args, **kwargs)
 
-            # Now update all following entries
-            entries = DieselStock.objects.filter(id__gt=self.pk).order_by('id')
-            running_stock = self.stock
-            for entry in entries:
-                running_stock += entry.quantity
-                entry.stock = running_stock
-                entry.save()
-        else:
-            # New entry
-            last_entry = DieselStock.objects.order_by('-id').first()
-            prev_stock = last_entry.stock if last_entry else 0
-            self.stock = prev_stock + self.quantity
-            super().save(*args, **kwargs)
+class DieselStockSnapshot(models.Model):
+    """
+    Diesel stock balance at the end of a local calendar day, taken by a background
+    job. The opening snapshot instead carries over the stock kept before the
+    ledger, which the rows before it do not add up to (see pnm.diesel_ledger).
+    """
+    date = models.DateField(unique=True)
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    opening = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
 
 class Operator(models.Model):
     name = models.CharField(max_length=244)
@@ -337,3 +354,98 @@ class MonthlyRent(models.Model):
     rate_per_shift = models.DecimalField(max_digits=10, decimal_places=2)
     rate_per_night = models.DecimalField(max_digits=10, decimal_places=2)
     charges= models.DecimalField(max_digits=10, decimal_places=2)
+
+
+class AssetMonthlyRollup(models.Model):
+    """
+    Per-asset monthly totals of trips, diesel and breakdowns, kept up to date as
+    those rows are written so the monthly reports read one row per asset.
+
+    The trip sums are NULL when no trip of the month recorded that value, which
+    is how the reports tell which unit an asset runs in.
+    """
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='monthly_rollups')
+    month = models.DateField()  # first day of the month, in local time
+    trip_count = models.IntegerField(default=0)
+    distance = models.DecimalField(max_digits=14, decimal_places=2, null=True)
+    hours = models.DecimalField(max_digits=14, decimal_places=2, null=True)
+    shifts = models.DecimalField(max_digits=14, decimal_places=2, null=True)
+    net_weight = models.DecimalField(max_digits=14, decimal_places=2, null=True)
+    revenue_by_weight = models.DecimalField(max_digits=16, decimal_places=4, null=True)
+    revenue_by_hours = models.DecimalField(max_digits=16, decimal_places=4, null=True)
+    revenue_by_shift = models.DecimalField(max_digits=16, decimal_places=4, null=True)
+    diesel_quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    diesel_amount = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+    maintenance_cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'asset'], name='unique_asset_monthly_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.asset_id} - {self.month:%Y-%m}"
+
+
+class AssetDailyMaterialRollup(models.Model):
+    """
+    Per-asset trip totals for one material on one local calendar day, kept up to
+    date as trips are written. Backs the diesel apportionment of the Tipper report.
+    """
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='daily_material_rollups')
+    day = models.DateField()  # calendar day in local time
+    material = models.CharField(max_length=255, null=True)
+    trip_count = models.IntegerField(default=0)
+    distance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_weight = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    rate = models.DecimalField(max_digits=10, decimal_places=2)  # rate of the first trip of the day
+    first_trip_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'asset'], name='daily_material_day_asset_idx'),
+        ]
+
+
+class AssetDailyDieselRollup(models.Model):
+    """Per-asset diesel litres and cost on one local calendar day."""
+    asset = models.ForeignKey(Asset, on_delete=models.CASCADE, related_name='daily_diesel_rollups')
+    day = models.DateField()  # calendar day in local time
+    quantity = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=4, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'asset'], name='unique_asset_daily_diesel_rollup'),
+        ]
+
+
+class ReportJob(models.Model):
+    """A report generated in the background, stored as a file once it is ready."""
+    report_type = models.CharField(max_length=20, choices=REPORT_TYPE_CHOICES)
+    month = models.DateField()  # first day of the month
+    format = models.CharField(max_length=10, choices=REPORT_FORMAT_CHOICES)
+    asset_type = models.CharField(max_length=50, choices=ASSET_TYPE_CHOICES, blank=True)  # trip report only
+    status = models.CharField(max_length=20, choices=REPORT_JOB_STATUS_CHOICES, default='pending')
+    file = models.FileField(upload_to='reports/', null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+
+class SyncTombstone(models.Model):
+    """
+    A deleted trip, diesel entry or breakdown, kept for clients syncing changes. A
+    row handed to another manager leaves one for the manager who had it as well.
+    """
+    model = models.CharField(max_length=100)  # app_label.model_name of the deleted row
+    object_id = models.BigIntegerField()
+    # The manager whose sync listed the row, null for rows every client syncs
+    owner = models.ForeignKey(Manager, on_delete=models.CASCADE, null=True, db_index=False)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'owner', 'deleted_at', 'id'], name='sync_tombstone_owner_idx'),
+        ]
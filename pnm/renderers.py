@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Formats the report endpoints stream row by row instead of rendering a Response
+STREAMING_FORMATS = ('csv', 'ndjson')
+
+
+class CSVRenderer(BaseRenderer):
+    """
+    Selected with ?format=csv.
+
+    Report rows are streamed by the view; this renders the other responses,
+    such as validation errors, as a header line followed by the values.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        records = data if isinstance(data, list) else [data]
+        output = io.StringIO()
+        writer = csv.writer(output)
+        if records and isinstance(records[0], dict):
+            writer.writerow(records[0].keys())
+            for record in records:
+                writer.writerow(record.values())
+        return output.getvalue().encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Selected with ?format=ndjson; one JSON document per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        records = data if isinstance(data, list) else [data]
+        return ''.join(ndjson_line(record) for record in records).encode(self.charset)
+
+
+def ndjson_line(record):
+    return json.dumps(record, cls=JSONEncoder, ensure_ascii=False) + '\n'
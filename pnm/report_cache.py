@@ -0,0 +1,122 @@
+"""
+Cache of rendered monthly reports.
+
+Every cached report is keyed on the report, its month, its format and parameters,
+and two data-version counters: one per month, bumped when a trip, diesel entry or
+breakdown of that month is written, and a global one, bumped when an asset or an
+assignment changes, since those show up in the reports of every month. A write
+therefore never invalidates anything; it moves readers on to keys nothing has been
+cached under yet, and the stale entries age out of the cache on their own.
+
+A month that has ended only changes through edits, which bump its version, so its
+reports are cached without a timeout. Reports of the current month expire after
+OPEN_MONTH_TIMEOUT as a backstop for writes that bypass the signals, such as
+queryset updates.
+"""
+import os
+import time
+
+from django.core.cache import caches
+from django.utils.timezone import now
+
+from core.metrics import REPORT_BUILD_DURATION
+
+from .reports import month_range
+
+REPORT_CACHE = "reports"
+
+# Seconds a report of the month in progress stays cached
+OPEN_MONTH_TIMEOUT = 15 * 60
+
+# Larger files are streamed to the client without being cached
+REPORT_CACHE_MAX_BYTES = 10 * 1024 * 1024
+
+GLOBAL_VERSION_KEY = "report-version"
+
+
+def report_cache():
+    return caches[REPORT_CACHE]
+
+
+def _month_version_key(month):
+    return f"report-version:{month:%Y-%m}"
+
+
+def _bump(key):
+    cache = report_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        _initial_version(key)
+
+
+def _initial_version(key):
+    # A counter evicted from the cache must not restart at a value it has held
+    # before, or reports cached under that value would be served again.
+    cache = report_cache()
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def bump_month_versions(months):
+    """Move the reports of months (first-of-month dates) on to fresh cache keys."""
+    for month in set(months):
+        _bump(_month_version_key(month))
+
+
+def bump_global_version():
+    """Move the reports of every month on to fresh cache keys."""
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def report_cache_key(report, month, format, **params):
+    """Cache key of the report named report for month (a first-of-month date)."""
+    month_key = _month_version_key(month)
+    versions = report_cache().get_many([GLOBAL_VERSION_KEY, month_key])
+    global_version = versions.get(GLOBAL_VERSION_KEY) or _initial_version(GLOBAL_VERSION_KEY)
+    month_version = versions.get(month_key) or _initial_version(month_key)
+
+    key = f"report:{report}:{month:%Y-%m}:{format}"
+    for name, value in sorted(params.items()):
+        key += f":{name}={value}"
+    return f"{key}:{global_version}.{month_version}"
+
+
+def report_timeout(month):
+    """Cache timeout of a report of month, None (no expiry) once the month has ended."""
+    _, end_datetime = month_range(f"{month:%Y-%m}")
+    return None if end_datetime < now() else OPEN_MONTH_TIMEOUT
+
+
+def get_report(key):
+    return report_cache().get(key)
+
+
+def set_report(key, month, content):
+    report_cache().set(key, content, timeout=report_timeout(month))
+
+
+def set_report_file(key, month, output):
+    """Cache the contents of the file object output unless they are over REPORT_CACHE_MAX_BYTES."""
+    output.seek(0, os.SEEK_END)
+    size = output.tell()
+    output.seek(0)
+    if size <= REPORT_CACHE_MAX_BYTES:
+        set_report(key, month, output.read())
+        output.seek(0)
+
+
+def cached_report(report, month, format, build, **params):
+    """
+    The cached content of a report, calling build() to produce and cache it on a miss.
+
+    The versions are read before the report is built, so a write made while it is
+    being built leaves it under a key that is already out of date.
+    """
+    key = report_cache_key(report, month, format, **params)
+    content = get_report(key)
+    if content is None:
+        with REPORT_BUILD_DURATION.time(report=report, format=format):
+            content = build()
+        set_report(key, month, content)
+    return content
@@ -0,0 +1,121 @@
+"""
+Rendered report outputs, shared by the report endpoints and the background report jobs.
+
+Every output goes through the report cache, so whichever of them renders a month
+first leaves it for the others.
+"""
+import io
+from datetime import datetime, time, timedelta
+
+from django.utils.timezone import make_aware
+from rest_framework.renderers import JSONRenderer
+
+from core.metrics import REPORT_BUILD_DURATION
+
+from .exports import report_workbook, workbook_bytes, xlsx_file
+from .report_cache import cached_report, get_report, report_cache_key, set_report_file
+from .reports import (
+    COMPLETE_REPORT, EXCAVATOR_REPORT, MONTHLY_REPORTS, OTHER_REPORT, TIPPER_REPORT, TRIP_REPORT,
+    TRIP_REPORT_CHUNK_SIZE, in_date_order, month_of_range, month_range, trip_report_headers, trip_report_queryset,
+    trip_report_row, trip_report_values,
+)
+from .serializers import (
+    CompleteMonthlyReportSerializer, ExcavatorMonthlyReportSerializer, OtherMonthlyReportSerializer,
+    TipperMonthlyReportSerializer,
+)
+
+JSON = "json"
+XLSX = "xlsx"
+REPORT_FORMATS = [JSON, XLSX]
+
+REPORT_SERIALIZERS = {
+    TIPPER_REPORT.name: TipperMonthlyReportSerializer,
+    EXCAVATOR_REPORT.name: ExcavatorMonthlyReportSerializer,
+    OTHER_REPORT.name: OtherMonthlyReportSerializer,
+    COMPLETE_REPORT.name: CompleteMonthlyReportSerializer,
+}
+
+REPORT_NAMES = [*MONTHLY_REPORTS, TRIP_REPORT]
+
+
+def trip_month_range(month):
+    """
+    Start of a "YYYY-MM" month and of the month after it, the range the trip report covers.
+
+    Raises ValueError when month is not in that format.
+    """
+    start_datetime, end_datetime = month_range(month)
+    next_month = end_datetime.date() + timedelta(days=1)
+    return start_datetime, make_aware(datetime.combine(next_month, time.min))
+
+
+def monthly_report_content(report, start_datetime, end_datetime, format):
+    """
+    Rows of the MonthlyReport report for the month starting at start_datetime: a list
+    of serialized rows for JSON, the bytes of the workbook for XLSX.
+    """
+    def build():
+        rows = report.build(start_datetime, end_datetime)
+        if format == XLSX:
+            return workbook_bytes(report_workbook(report, rows))
+        return list(REPORT_SERIALIZERS[report.name](rows, many=True).data)
+
+    return cached_report(report.name, month_of_range(start_datetime), format, build)
+
+
+def trip_report_content(start_datetime, end_datetime, asset_type=None):
+    """Rows of the trip report for the month starting at start_datetime."""
+    return cached_report(
+        TRIP_REPORT, month_of_range(start_datetime), JSON,
+        lambda: [trip_report_row(trip) for trip in trip_report_queryset(start_datetime, end_datetime, asset_type)],
+        asset_type=asset_type or "",
+    )
+
+
+def trip_report_xlsx(start_datetime, end_datetime, asset_type=None):
+    """
+    File object holding the trip report spreadsheet for the month starting at
+    start_datetime. A spreadsheet built on a cache miss is written to a temporary
+    file, so a large month never has to be held in memory.
+    """
+    month = month_of_range(start_datetime)
+    cache_key = report_cache_key(TRIP_REPORT, month, XLSX, asset_type=asset_type or "")
+    content = get_report(cache_key)
+    if content is not None:
+        return io.BytesIO(content)
+
+    queryset = trip_report_queryset(start_datetime, end_datetime, asset_type)
+    rows = (trip_report_values(trip) for trip in in_date_order(queryset, TRIP_REPORT_CHUNK_SIZE))
+    with REPORT_BUILD_DURATION.time(report=TRIP_REPORT, format=XLSX):
+        output = xlsx_file("Trip Report", trip_report_headers(asset_type), rows)
+    set_report_file(cache_key, month, output)
+    return output
+
+
+def report_filename(report_name, month, format, asset_type=None):
+    """Download name of a report for a "YYYY-MM" month."""
+    if report_name == TRIP_REPORT:
+        type_str = asset_type.lower().replace(" ", "_") if asset_type else "all"
+        return f"trip_report_{type_str}_{month}.{format}"
+    return f"{MONTHLY_REPORTS[report_name].filename}_{month}.{format}"
+
+
+def report_file(report_name, month, format, asset_type=None):
+    """
+    File object holding the report named report_name for a "YYYY-MM" month in format.
+    asset_type only applies to the trip report.
+
+    Raises ValueError when month is not in that format.
+    """
+    if report_name == TRIP_REPORT:
+        start_datetime, end_datetime = trip_month_range(month)
+        if format == XLSX:
+            return trip_report_xlsx(start_datetime, end_datetime, asset_type)
+        content = trip_report_content(start_datetime, end_datetime, asset_type)
+    else:
+        start_datetime, end_datetime = month_range(month)
+        content = monthly_report_content(MONTHLY_REPORTS[report_name], start_datetime, end_datetime, format)
+
+    if format == JSON:
+        content = JSONRenderer().render(content)
+    return io.BytesIO(content)
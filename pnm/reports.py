@@ -0,0 +1,655 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Callable, Optional
+
+from django.db.models import DecimalField, F, FilteredRelation, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils.timezone import localtime, make_aware
+
+from .models import (
+    Asset, AssetDailyDieselRollup, AssetDailyMaterialRollup, AssetManager, AssetMonthlyRollup, TripDetails
+)
+
+# Asset types grouped by the columns their trips are reported with
+TIPPER_TYPES = ["Tipper", "Trailor"]
+EXCAVATOR_TYPES = ["Excavator", "Paver", "Dozer", "Loader", "Grader", "Roller", "Backhoe Loader", "Farana"]
+TRANSPORTER_TYPES = ["B-Tempo", "Bus", "Camper", "Service Van", "Transit Mixer", "Water Tanker"]
+
+# Trips fetched per round trip to the database when a trip report is streamed
+TRIP_REPORT_CHUNK_SIZE = 2000
+
+# Diesel entries fetched per round trip to the database when the diesel report is streamed
+DIESEL_REPORT_CHUNK_SIZE = 2000
+
+# Name of the trip report in the report cache
+TRIP_REPORT = "trip"
+
+
+def round_decimal(value):
+    return round(value, 2)
+
+
+def month_range(month):
+    """
+    First and last instant of a "YYYY-MM" month in the current timezone.
+
+    Raises ValueError when month is not in that format.
+    """
+    start_date = datetime.strptime(month + "-01", "%Y-%m-%d").date()
+    next_month = (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+    end_date = next_month - timedelta(days=1)
+    start_datetime = make_aware(datetime.combine(start_date, time.min))
+    end_datetime = make_aware(datetime.combine(end_date, time.max))
+    return start_datetime, end_datetime
+
+
+@dataclass
+class TipperReportRow:
+    asset_name: str
+    manager: str
+    material: Optional[str]
+    material_quantity: Decimal
+    rate: Decimal
+    diesel_consumed: Decimal
+    diesel_cost: Decimal
+    distance: Decimal
+    amount: Decimal
+    final_amount: Decimal
+    status: str
+
+
+@dataclass
+class ExcavatorReportRow:
+    asset_name: str
+    manager: str
+    working_hours: Decimal
+    monthly_charge: Decimal
+    shift_charge: Decimal
+    no_of_shifts: Decimal
+    amount: Decimal
+    diesel_quantity: Decimal
+    diesel_amount: Decimal
+    final_amount: Decimal
+
+
+@dataclass
+class OtherReportRow:
+    asset_name: str
+    manager: str
+    monthly_charge: Decimal
+    shift_charge: Decimal
+    no_of_shifts: Decimal
+    amount: Decimal
+    diesel_quantity: Decimal
+    diesel_amount: Decimal
+    final_amount: Decimal
+
+
+@dataclass
+class CompleteReportRow:
+    asset: str
+    total_running: str
+    fixed_revenue: Decimal
+    revenue_transport: Decimal
+    diesel_quantity: Decimal
+    diesel_amount: Decimal
+    maintenance: Decimal
+    insurance: Decimal
+    tax: Decimal
+    fitness: Decimal
+    permit: Decimal
+    emi: Decimal
+    status: str
+
+
+def latest_manager_name(end_datetime, asset_ref="pk"):
+    """Name of the manager the asset was last assigned to on or before end_datetime."""
+    latest_assign = (
+        AssetManager.objects.filter(asset=OuterRef(asset_ref), date_assigned__lte=end_datetime)
+        .order_by("-date_assigned")
+        .values("manager__name")[:1]
+    )
+    return Coalesce(Subquery(latest_assign), Value("Unassigned"))
+
+
+def _decimal_sum(expression):
+    return Coalesce(Sum(expression), Value(Decimal("0")), output_field=DecimalField())
+
+
+def _zero_if_null(expression):
+    return Coalesce(expression, Value(Decimal("0")), output_field=DecimalField())
+
+
+def month_of_range(start_datetime):
+    """The AssetMonthlyRollup.month of the month starting at start_datetime."""
+    return localtime(start_datetime).date().replace(day=1)
+
+
+def _rollups_with_trips(assets, start_datetime, end_datetime):
+    """Monthly rollups of the assets that had at least one trip in the month."""
+    return (
+        AssetMonthlyRollup.objects.filter(
+            asset__in=assets, month=month_of_range(start_datetime), trip_count__gt=0
+        )
+        .select_related("asset")
+        .annotate(manager_name=latest_manager_name(end_datetime, asset_ref="asset_id"))
+        .order_by("asset_id")
+    )
+
+
+def build_tipper_report(start_datetime, end_datetime):
+    """
+    Rows for the Tipper monthly report.
+
+    Trips and diesel entries for every tipper are read from the daily rollups kept
+    per (asset, local day, material), so the number of queries does not depend on the
+    fleet size or the number of trips. Diesel for a day is split between the materials
+    hauled that day in proportion to the distance covered for each of them.
+    """
+    days = (localtime(start_datetime).date(), localtime(end_datetime).date())
+
+    tipper_assets = (
+        Asset.objects.filter(type__iexact="Tipper")
+        .annotate(manager_name=latest_manager_name(end_datetime))
+        .only("id", "name", "registration_no")
+    )
+
+    trip_groups = (
+        AssetDailyMaterialRollup.objects.filter(asset__type__iexact="Tipper", day__range=days)
+        .values("asset_id", "day", "material", "distance", "rate", material_quantity=F("net_weight"))
+        .order_by("asset_id", "day", "first_trip_id")
+    )
+
+    diesel_groups = (
+        AssetDailyDieselRollup.objects.filter(asset__type__iexact="Tipper", day__range=days)
+        .values("asset_id", "day", litres=F("quantity"), cost=F("amount"))
+    )
+    diesel_by_day = {(group["asset_id"], group["day"]): group for group in diesel_groups}
+
+    # The rate of a material is the one on the first trip of the last day it was hauled;
+    # groups come in day order, so later days overwrite earlier ones.
+    rates = {}
+    # asset → day → material → grouped trips
+    trips_by_asset = defaultdict(lambda: defaultdict(dict))
+    for group in trip_groups:
+        trips_by_asset[group["asset_id"]][group["day"]][group["material"]] = group
+        rates[(group["asset_id"], group["material"])] = group["rate"]
+
+    report_rows = []
+
+    for asset in tipper_assets:
+        material_summary = defaultdict(lambda: {
+            "material_quantity": Decimal("0"),
+            "diesel_consumed": Decimal("0"),
+            "diesel_cost": Decimal("0"),
+            "distance": Decimal("0"),
+        })
+
+        for day, material_dict in trips_by_asset.get(asset.id, {}).items():
+            total_distance_day = sum(group["distance"] for group in material_dict.values())
+
+            diesel = diesel_by_day.get((asset.id, day))
+            diesel_liters = diesel["litres"] if diesel else Decimal("0")
+            diesel_cost = diesel["cost"] if diesel else Decimal("0")
+
+            only_one_material = len(material_dict) == 1
+
+            for material, group in material_dict.items():
+                dist = group["distance"]
+
+                if only_one_material:
+                    mat_diesel = diesel_liters
+                    mat_diesel_cost = diesel_cost
+                elif total_distance_day > 0:
+                    proportion = dist / total_distance_day
+                    mat_diesel = diesel_liters * proportion
+                    mat_diesel_cost = diesel_cost * proportion
+                else:
+                    mat_diesel = Decimal("0")
+                    mat_diesel_cost = Decimal("0")
+
+                summary = material_summary[material]
+                summary["material_quantity"] += group["material_quantity"]
+                summary["diesel_consumed"] += mat_diesel
+                summary["diesel_cost"] += mat_diesel_cost
+                summary["distance"] += dist
+
+        for material, data in material_summary.items():
+            rate = rates.get((asset.id, material)) or Decimal("0")
+            amount = data["material_quantity"] * rate
+            final_amount = amount + data["diesel_cost"]
+
+            report_rows.append(TipperReportRow(
+                asset_name=f"{asset.name} - {asset.registration_no}",
+                manager=asset.manager_name,
+                material=material,
+                material_quantity=data["material_quantity"],
+                rate=rate,
+                diesel_consumed=round_decimal(data["diesel_consumed"]),
+                diesel_cost=round_decimal(data["diesel_cost"]),
+                distance=data["distance"],
+                amount=round_decimal(amount),
+                final_amount=round_decimal(final_amount),
+                status="Active",
+            ))
+
+    return report_rows
+
+
+def build_excavator_report(start_datetime, end_datetime):
+    """Rows for the Excavator monthly report, from the AssetMonthlyRollup rows of the month."""
+    rollups = _rollups_with_trips(
+        Asset.objects.filter(type__iexact="Excavator"), start_datetime, end_datetime
+    )
+    report_rows = []
+
+    for rollup in rollups:
+        asset = rollup.asset
+        total_hours = rollup.hours or Decimal("0")
+        total_shifts = rollup.shifts or Decimal("0")
+        monthly_charge = asset.rate_per_month or Decimal("0")
+        shift_charge = asset.rate_per_shift or Decimal("0")
+
+        amount = total_shifts * shift_charge
+        final_amount = amount + rollup.diesel_amount
+
+        report_rows.append(ExcavatorReportRow(
+            asset_name=f"{asset.name} - {asset.registration_no}",
+            manager=rollup.manager_name,
+            working_hours=round_decimal(total_hours),
+            monthly_charge=round_decimal(monthly_charge),
+            shift_charge=round_decimal(shift_charge),
+            no_of_shifts=round_decimal(total_shifts),
+            amount=round_decimal(amount),
+            diesel_quantity=round_decimal(rollup.diesel_quantity),
+            diesel_amount=round_decimal(rollup.diesel_amount),
+            final_amount=round_decimal(final_amount),
+        ))
+
+    return report_rows
+
+
+def build_other_report(start_datetime, end_datetime):
+    """Rows for the monthly report of every asset that is neither a Tipper nor an Excavator."""
+    rollups = _rollups_with_trips(
+        Asset.objects.exclude(type__iexact="Excavator").exclude(type__iexact="Tipper"),
+        start_datetime,
+        end_datetime,
+    )
+    report_rows = []
+
+    for rollup in rollups:
+        asset = rollup.asset
+        total_shifts = rollup.shifts or Decimal("0")
+        monthly_charge = asset.rate_per_month or Decimal("0")
+        shift_charge = asset.rate_per_shift or Decimal("0")
+
+        amount = total_shifts * shift_charge
+        final_amount = amount + rollup.diesel_amount
+
+        report_rows.append(OtherReportRow(
+            asset_name=f"{asset.name} - {asset.registration_no}",
+            manager=rollup.manager_name,
+            monthly_charge=round_decimal(monthly_charge),
+            shift_charge=round_decimal(shift_charge),
+            no_of_shifts=round_decimal(total_shifts),
+            amount=round_decimal(amount),
+            diesel_quantity=round_decimal(rollup.diesel_quantity),
+            diesel_amount=round_decimal(rollup.diesel_amount),
+            final_amount=round_decimal(final_amount),
+        ))
+
+    return report_rows
+
+
+def build_complete_report(start_datetime, end_datetime):
+    """
+    Rows for the complete monthly report of every asset.
+
+    Every asset is joined to its rollup of the month, if it has one; how the running
+    and the transport revenue are measured (distance, hours or shifts) is then
+    picked from which of the sums are not NULL.
+    """
+    assets = Asset.objects.annotate(
+        rollup=FilteredRelation(
+            "monthly_rollups", condition=Q(monthly_rollups__month=month_of_range(start_datetime))
+        ),
+        trip_count=F("rollup__trip_count"),
+        total_distance=F("rollup__distance"),
+        total_hours=F("rollup__hours"),
+        total_shifts=F("rollup__shifts"),
+        revenue_by_weight=F("rollup__revenue_by_weight"),
+        revenue_by_hours=F("rollup__revenue_by_hours"),
+        revenue_by_shift=F("rollup__revenue_by_shift"),
+        diesel_qty=_zero_if_null(F("rollup__diesel_quantity")),
+        diesel_amt=_zero_if_null(F("rollup__diesel_amount")),
+        maintenance_cost=_zero_if_null(F("rollup__maintenance_cost")),
+    ).order_by("id")
+
+    report = []
+
+    for asset in assets:
+        # Total running
+        if asset.total_distance is not None:
+            running_str = f"{round_decimal(asset.total_distance)} kms"
+        elif asset.total_hours is not None:
+            running_str = f"{round_decimal(asset.total_hours)} hrs"
+        elif asset.total_shifts is not None:
+            running_str = f"{round_decimal(asset.total_shifts)} shifts"
+        else:
+            running_str = "0"
+
+        # Transport revenue
+        if asset.revenue_by_weight is not None:
+            transport_revenue = asset.revenue_by_weight
+        elif asset.total_hours is not None:
+            transport_revenue = asset.revenue_by_hours
+        else:
+            transport_revenue = asset.revenue_by_shift or Decimal("0")
+
+        report.append(CompleteReportRow(
+            asset=f"{asset.name} - {asset.registration_no}",
+            total_running=running_str,
+            fixed_revenue=round_decimal(asset.rate_per_month or Decimal("0")),
+            revenue_transport=round_decimal(transport_revenue),
+            diesel_quantity=round_decimal(asset.diesel_qty),
+            diesel_amount=round_decimal(asset.diesel_amt),
+            maintenance=round_decimal(asset.maintenance_cost),
+            insurance=round_decimal(asset.insurance_amount),
+            tax=round_decimal(asset.road_tax_amount),
+            fitness=round_decimal(asset.fitness_amount),
+            permit=round_decimal(asset.permit_amount),
+            emi=round_decimal(asset.emi_amount),
+            status="Active" if asset.trip_count else "Idle",
+        ))
+
+    return report
+
+
+@dataclass(frozen=True)
+class MonthlyReport:
+    """A monthly report: how its rows are built and how they are laid out in a spreadsheet."""
+    name: str
+    title: str
+    build: Callable
+    columns: tuple  # (header, row attribute) pairs
+    filename: str
+    bold_header: bool = False
+    include_in_export: Callable = lambda row: True
+
+
+TIPPER_REPORT = MonthlyReport(
+    name="tipper",
+    title="Tipper Monthly Report",
+    build=build_tipper_report,
+    columns=(
+        ("Asset Name", "asset_name"),
+        ("Manager", "manager"),
+        ("Material", "material"),
+        ("Material Quantity", "material_quantity"),
+        ("Rate", "rate"),
+        ("Diesel Consumed", "diesel_consumed"),
+        ("Diesel Cost", "diesel_cost"),
+        ("Distance", "distance"),
+        ("Amount", "amount"),
+        ("Final Amount", "final_amount"),
+        ("Status", "status"),
+    ),
+    filename="tipper_report",
+)
+
+EXCAVATOR_REPORT = MonthlyReport(
+    name="excavator",
+    title="Excavator Monthly Report",
+    build=build_excavator_report,
+    columns=(
+        ("Asset Name", "asset_name"),
+        ("Manager", "manager"),
+        ("Working Hours", "working_hours"),
+        ("Monthly Charge", "monthly_charge"),
+        ("Shift Charge", "shift_charge"),
+        ("No. of Shifts", "no_of_shifts"),
+        ("Amount", "amount"),
+        ("Diesel Quantity", "diesel_quantity"),
+        ("Diesel Amount", "diesel_amount"),
+        ("Final Amount", "final_amount"),
+    ),
+    filename="excavator_report",
+)
+
+OTHER_REPORT = MonthlyReport(
+    name="other",
+    title="Other Assets Monthly Report",
+    build=build_other_report,
+    columns=(
+        ("Asset Name", "asset_name"),
+        ("Manager", "manager"),
+        ("Monthly Charge", "monthly_charge"),
+        ("Shift Charge", "shift_charge"),
+        ("No. of Shifts", "no_of_shifts"),
+        ("Amount", "amount"),
+        ("Diesel Quantity", "diesel_quantity"),
+        ("Diesel Amount", "diesel_amount"),
+        ("Final Amount", "final_amount"),
+    ),
+    filename="other_assets_report",
+)
+
+COMPLETE_REPORT = MonthlyReport(
+    name="complete",
+    title="Asset Monthly Report",
+    build=build_complete_report,
+    columns=(
+        ("Asset", "asset"),
+        ("Total Running", "total_running"),
+        ("Fixed Revenue", "fixed_revenue"),
+        ("Revenue Transport", "revenue_transport"),
+        ("Diesel Quantity", "diesel_quantity"),
+        ("Diesel Amount", "diesel_amount"),
+        ("Maintenance", "maintenance"),
+        ("Insurance", "insurance"),
+        ("Tax", "tax"),
+        ("Fitness", "fitness"),
+        ("Permit", "permit"),
+        ("EMI", "emi"),
+        ("Status", "status"),
+    ),
+    filename="asset_monthly_report",
+    bold_header=True,
+    # The spreadsheet only lists the assets that ran during the month
+    include_in_export=lambda row: row.status == "Active",
+)
+
+MONTHLY_REPORTS = {
+    report.name: report
+    for report in (TIPPER_REPORT, EXCAVATOR_REPORT, OTHER_REPORT, COMPLETE_REPORT)
+}
+
+
+def trip_report_queryset(start_datetime, end_datetime, asset_type=None):
+    """Trips in [start_datetime, end_datetime) with everything the trip report prints."""
+    queryset = TripDetails.objects.filter(
+        date__gte=start_datetime,
+        date__lt=end_datetime
+    ).select_related('asset', 'manager', 'receiver', 'operator')
+
+    if asset_type:
+        queryset = queryset.filter(asset__type=asset_type)
+    return queryset
+
+
+def in_date_order(queryset, chunk_size, descending=False):
+    """
+    Rows of queryset in (date, id) order, fetched chunk_size at a time, each chunk
+    a query starting after the last row of the chunk before.
+
+    QuerySet.iterator() would fetch in chunks as well, but with mysqlclient Django
+    has no server-side cursor, so the whole result is still buffered on the client
+    first. This only ever holds one chunk, and every query is read off the
+    (date, id) index.
+    """
+    after = "lt" if descending else "gt"
+    queryset = queryset.order_by(*(("-date", "-id") if descending else ("date", "id")))
+    position = None
+    while True:
+        chunk = queryset
+        if position is not None:
+            stamp, pk = position
+            chunk = chunk.filter(**{f"date__{after}e": stamp}).filter(
+                Q(**{f"date__{after}": stamp}) | Q(**{f"id__{after}": pk})
+            )
+        rows = list(chunk[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        position = (rows[-1].date, rows[-1].pk)
+
+
+def trip_report_headers(asset_type):
+    headers = [
+        "Asset", "Deal Type", "Manager", "Receiver", "Operator", "Date", "Time"
+    ]
+
+    if asset_type in TIPPER_TYPES:
+        headers += ["From", "To", "Material", "Rate", "Distance", "Net Weight", "Amount"]
+    elif asset_type in EXCAVATOR_TYPES:
+        headers += ["From", "Rate", "Hours", "Start Time", "End Time", "Shift", "Amount"]
+    elif asset_type in TRANSPORTER_TYPES:
+        headers += ["From", "To", "Rate", "Shift", "Amount"]
+    else:
+        headers += ["From", "To", "Rate", "Amount"]
+    return headers
+
+
+def trip_report_row(trip):
+    """Trip report entry for one trip, with the fields of the trip's asset type."""
+    a_type = trip.asset.type
+    trip_time = localtime(trip.date)
+
+    base = {
+        "asset": f"{trip.asset.name} - {trip.asset.registration_no}",
+        "deal_type": trip.deal_type,
+        "manager": trip.manager.name if trip.manager else None,
+        "receiver": trip.receiver.name if trip.receiver else None,
+        "operator": trip.operator.name if trip.operator else None,
+        "date": trip_time.strftime("%d-%m-%Y"),
+        "time": trip_time.strftime("%I:%M %p"),
+    }
+
+    if a_type in TIPPER_TYPES:
+        amount = float(trip.rate or 0) * float(trip.net_weight or 0)
+        base.update({
+            "from_location": trip.from_location,
+            "to_location": trip.to_location,
+            "material": trip.material,
+            "rate": f"{trip.rate} per ton",
+            "distance": f"{trip.distance} kms" if trip.distance else None,
+            "net_weight": f"{trip.net_weight} ton" if trip.net_weight else None,
+            "amount": round(amount, 2),
+        })
+
+    elif a_type in EXCAVATOR_TYPES:
+        amount = float(trip.rate or 0) * float(trip.hours or 0)
+        base.update({
+            "from_location": trip.from_location,
+            "rate": trip.rate,
+            "hours": trip.hours,
+            "start_time": trip.start_time.strftime("%I:%M %p") if trip.start_time else None,
+            "end_time": trip.end_time.strftime("%I:%M %p") if trip.end_time else None,
+            "shift": trip.shift,
+            "amount": round(amount, 2),
+        })
+
+    elif a_type in TRANSPORTER_TYPES:
+        amount = float(trip.rate or 0) * float(trip.shift or 0)
+        base.update({
+            "from_location": trip.from_location,
+            "to_location": trip.to_location,
+            "rate": trip.rate,
+            "shift": trip.shift,
+            "amount": round(amount, 2),
+        })
+
+    return base
+
+
+def trip_report_values(trip):
+    """Spreadsheet cells for one trip, laid out for the trip's asset type."""
+    a_type = trip.asset.type
+    ist_date = localtime(trip.date)
+
+    base = [
+        f"{trip.asset.name} - {trip.asset.registration_no}",
+        trip.deal_type,
+        trip.manager.name if trip.manager else "",
+        trip.receiver.name if trip.receiver else "",
+        trip.operator.name if trip.operator else "",
+        ist_date.strftime("%d-%m-%Y"),
+        ist_date.strftime("%I:%M %p"),
+    ]
+
+    if a_type in TIPPER_TYPES:
+        amount = float(trip.rate or 0) * float(trip.net_weight or 0)
+        base += [
+            trip.from_location,
+            trip.to_location,
+            trip.material,
+            float(trip.rate) if trip.rate else None,
+            float(trip.distance) if trip.distance else None,
+            float(trip.net_weight) if trip.net_weight else None,
+            round(amount, 2)
+        ]
+
+    elif a_type in EXCAVATOR_TYPES:
+        amount = float(trip.rate or 0) * float(trip.hours or 0)
+        base += [
+            trip.from_location,
+            float(trip.rate) if trip.rate else None,
+            trip.hours,
+            trip.start_time.strftime("%I:%M %p") if trip.start_time else "",
+            trip.end_time.strftime("%I:%M %p") if trip.end_time else "",
+            trip.shift,
+            round(amount, 2)
+        ]
+
+    elif a_type in TRANSPORTER_TYPES:
+        amount = float(trip.rate or 0) * float(trip.shift or 0)
+        base += [
+            trip.from_location,
+            trip.to_location,
+            float(trip.rate) if trip.rate else None,
+            trip.shift,
+            round(amount, 2)
+        ]
+    else:
+        amount = float(trip.rate or 0)
+        base += [
+            trip.from_location,
+            trip.to_location,
+            float(trip.rate) if trip.rate else None,
+            round(amount, 2)
+        ]
+    return base
+
+
+DIESEL_REPORT_HEADERS = [
+    "ID", "Asset", "Date", "Site", "Previous Reading", "Reading", "Rate", "Quantity", "Amount", "Manager"
+]
+
+
+def diesel_report_values(entry):
+    """Flat diesel report cells for one entry; the asset and manager must be selected with it."""
+    return [
+        entry.id,
+        f"{entry.asset.name} - {entry.asset.registration_no}",
+        localtime(entry.date).strftime("%d-%m-%Y %I:%M %p"),
+        entry.site,
+        entry.previous_reading,
+        entry.reading,
+        entry.rate,
+        entry.quantity,
+        round(entry.rate * entry.quantity, 2),
+        entry.manager.name if entry.manager else "",
+    ]
@@ -0,0 +1,350 @@
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Min, Sum
+from django.utils.timezone import localtime, make_aware
+
+from .models import (
+    Asset, AssetDailyDieselRollup, AssetDailyMaterialRollup, AssetMonthlyRollup, Breakdown, DieselEntry, TripDetails
+)
+from .reports import month_range
+
+ROLLUP_BATCH_SIZE = 1000
+
+
+def month_of(value):
+    """First day of the local calendar month value (an aware datetime) falls in."""
+    return localtime(value).date().replace(day=1)
+
+
+def day_of(value):
+    """Local calendar day value (an aware datetime) falls in."""
+    return localtime(value).date()
+
+
+def day_range(day):
+    return make_aware(datetime.combine(day, time.min)), make_aware(datetime.combine(day, time.max))
+
+
+def refresh_rollups(model, keys):
+    """
+    Refresh every rollup fed by rows of model at the given (asset_id, date) keys,
+    where date is the datetime a row of model is, or was, recorded at.
+    """
+    keys = set(keys)
+    refresh_monthly_rollups((asset_id, month_of(when)) for asset_id, when in keys)
+
+    days = sorted({(asset_id, day_of(when)) for asset_id, when in keys})
+    if model is TripDetails:
+        for asset_id, day in days:
+            refresh_daily_material_rollup(asset_id, day)
+    elif model is DieselEntry:
+        for asset_id, day in days:
+            refresh_daily_diesel_rollup(asset_id, day)
+
+
+def _decimal_sum(expression):
+    return Sum(expression, output_field=DecimalField())
+
+
+def _trip_totals():
+    return {
+        "trip_count": Count("id"),
+        "total_distance": _decimal_sum("distance"),
+        "total_hours": _decimal_sum("hours"),
+        "total_shifts": _decimal_sum("shift"),
+        "total_net_weight": _decimal_sum("net_weight"),
+        "revenue_by_weight": _decimal_sum(F("rate") * F("net_weight")),
+        "revenue_by_hours": _decimal_sum(F("rate") * F("hours")),
+        "revenue_by_shift": _decimal_sum(F("rate") * F("shift")),
+    }
+
+
+def _diesel_totals():
+    return {
+        "total_quantity": _decimal_sum("quantity"),
+        "total_amount": _decimal_sum(F("quantity") * F("rate")),
+        "diesel_count": Count("id"),
+    }
+
+
+def _breakdown_totals():
+    return {
+        "total_maintenance": _decimal_sum(F("cost") + F("manpower_cost")),
+        "breakdown_count": Count("id"),
+    }
+
+
+def _rollup_fields(trips, diesel, breakdowns):
+    return {
+        "trip_count": trips["trip_count"],
+        "distance": trips["total_distance"],
+        "hours": trips["total_hours"],
+        "shifts": trips["total_shifts"],
+        "net_weight": trips["total_net_weight"],
+        "revenue_by_weight": trips["revenue_by_weight"],
+        "revenue_by_hours": trips["revenue_by_hours"],
+        "revenue_by_shift": trips["revenue_by_shift"],
+        "diesel_quantity": diesel["total_quantity"] or Decimal("0"),
+        "diesel_amount": diesel["total_amount"] or Decimal("0"),
+        "maintenance_cost": breakdowns["total_maintenance"] or Decimal("0"),
+    }
+
+
+def _locked_rollup(model, **key):
+    """
+    The rollup row at key, created if there is none yet, locked until the
+    transaction ends. Concurrent refreshes of the same key then take turns, each
+    summing the rows the one before it committed, instead of the last to write
+    storing totals that miss the rows of the other.
+    """
+    model.objects.get_or_create(**key)
+    return model.objects.select_for_update().get(**key)
+
+
+def _save_totals(rollup, fields):
+    for name, value in fields.items():
+        setattr(rollup, name, value)
+    rollup.save()
+
+
+def refresh_monthly_rollup(asset_id, month):
+    """
+    Recompute the rollup of one asset for one month from its trips, diesel entries
+    and breakdowns; the row is removed once the month has none of them left.
+    """
+    start_datetime, end_datetime = month_range(f"{month:%Y-%m}")
+    in_month = {"asset_id": asset_id, "date__range": (start_datetime, end_datetime)}
+
+    with transaction.atomic():
+        rollup = _locked_rollup(AssetMonthlyRollup, asset_id=asset_id, month=month)
+
+        trips = TripDetails.objects.filter(**in_month).aggregate(**_trip_totals())
+        diesel = DieselEntry.objects.filter(**in_month).aggregate(**_diesel_totals())
+        breakdowns = Breakdown.objects.filter(**in_month).aggregate(**_breakdown_totals())
+
+        if not (trips["trip_count"] or diesel["diesel_count"] or breakdowns["breakdown_count"]):
+            rollup.delete()
+            return
+
+        _save_totals(rollup, _rollup_fields(trips, diesel, breakdowns))
+
+
+def refresh_monthly_rollups(buckets):
+    """
+    Refresh every distinct (asset_id, month) bucket in buckets, in order, so that
+    concurrent refreshes lock the rows they share in the same order.
+    """
+    for asset_id, month in sorted(set(buckets)):
+        refresh_monthly_rollup(asset_id, month)
+
+
+def _material_totals():
+    return {
+        "trip_count": Count("id"),
+        "total_distance": _decimal_sum("distance"),
+        "total_net_weight": _decimal_sum("net_weight"),
+        "first_trip": Min("id"),
+    }
+
+
+def _daily_material_rollup(asset_id, day, group, rate):
+    return AssetDailyMaterialRollup(
+        asset_id=asset_id,
+        day=day,
+        material=group["material"],
+        trip_count=group["trip_count"],
+        distance=group["total_distance"] or Decimal("0"),
+        net_weight=group["total_net_weight"] or Decimal("0"),
+        rate=rate,
+        first_trip_id=group["first_trip"],
+    )
+
+
+def refresh_daily_material_rollup(asset_id, day):
+    """
+    Recompute the per-material trip totals of one asset on one local day.
+
+    A day has a row per material and maybe none yet, so there is no single rollup
+    row to lock; the asset row is locked instead, which keeps two refreshes of the
+    asset from both deleting the day's rows and both inserting theirs.
+    """
+    with transaction.atomic():
+        Asset.objects.select_for_update().filter(pk=asset_id).exists()
+
+        groups = list(
+            TripDetails.objects.filter(asset_id=asset_id, date__range=day_range(day))
+            .values("material")
+            .annotate(**_material_totals())
+            .order_by()
+        )
+        rates = dict(
+            TripDetails.objects.filter(id__in=[group["first_trip"] for group in groups]).values_list("id", "rate")
+        )
+
+        AssetDailyMaterialRollup.objects.filter(asset_id=asset_id, day=day).delete()
+        AssetDailyMaterialRollup.objects.bulk_create(
+            _daily_material_rollup(asset_id, day, group, rates[group["first_trip"]]) for group in groups
+        )
+
+
+def refresh_daily_diesel_rollup(asset_id, day):
+    """Recompute the diesel litres and cost of one asset on one local day."""
+    with transaction.atomic():
+        rollup = _locked_rollup(AssetDailyDieselRollup, asset_id=asset_id, day=day)
+        diesel = DieselEntry.objects.filter(asset_id=asset_id, date__range=day_range(day)).aggregate(**_diesel_totals())
+
+        if not diesel["diesel_count"]:
+            rollup.delete()
+            return
+
+        _save_totals(rollup, {"quantity": diesel["total_quantity"], "amount": diesel["total_amount"]})
+
+
+def _product(a, b):
+    return None if a is None or b is None else a * b
+
+
+def _accumulate(group, values):
+    """Add values into group as SQL SUM and COUNT would, skipping NULLs."""
+    for name, value in values.items():
+        if value is not None:
+            group[name] = value if group[name] is None else group[name] + value
+
+
+def _trip_values(trip):
+    return {
+        "trip_count": 1,
+        "total_distance": trip["distance"],
+        "total_hours": trip["hours"],
+        "total_shifts": trip["shift"],
+        "total_net_weight": trip["net_weight"],
+        "revenue_by_weight": _product(trip["rate"], trip["net_weight"]),
+        "revenue_by_hours": _product(trip["rate"], trip["hours"]),
+        "revenue_by_shift": _product(trip["rate"], trip["shift"]),
+    }
+
+
+def _diesel_values(entry):
+    return {"total_quantity": entry["quantity"], "total_amount": entry["quantity"] * entry["rate"], "diesel_count": 1}
+
+
+def _breakdown_values(breakdown):
+    cost = breakdown["cost"]
+    manpower_cost = breakdown["manpower_cost"]
+    return {
+        "total_maintenance": None if cost is None or manpower_cost is None else cost + manpower_cost,
+        "breakdown_count": 1,
+    }
+
+
+def _rows(queryset, *fields):
+    return queryset.values("asset_id", "date", *fields).iterator(chunk_size=ROLLUP_BATCH_SIZE)
+
+
+# The rebuilds below read the rows and bucket them by local day or month with
+# day_of and month_of, as the incremental refreshes do, rather than grouping on
+# TruncDate/TruncMonth: those convert to the local zone in the database, which on
+# MySQL without the time zone tables yields NULL for every row.
+
+def rebuild_daily_rollups(month=None):
+    """Rebuild the daily material and diesel rollups, optionally only those of month."""
+    trips = TripDetails.objects.all()
+    diesel = DieselEntry.objects.all()
+    material_rollups = AssetDailyMaterialRollup.objects.all()
+    diesel_rollups = AssetDailyDieselRollup.objects.all()
+
+    if month is not None:
+        start_datetime, end_datetime = month_range(f"{month:%Y-%m}")
+        trips = trips.filter(date__range=(start_datetime, end_datetime))
+        diesel = diesel.filter(date__range=(start_datetime, end_datetime))
+        material_rollups = material_rollups.filter(day__range=(start_datetime.date(), end_datetime.date()))
+        diesel_rollups = diesel_rollups.filter(day__range=(start_datetime.date(), end_datetime.date()))
+
+    # In id order, so the first trip seen of each group is the one whose rate the day shows
+    material_groups = {}
+    rates = {}
+    for trip in _rows(trips.order_by("id"), "id", "material", "distance", "net_weight", "rate"):
+        key = (trip["asset_id"], day_of(trip["date"]), trip["material"])
+        if key not in material_groups:
+            material_groups[key] = {
+                "material": trip["material"], "trip_count": 0, "total_distance": None, "total_net_weight": None,
+                "first_trip": trip["id"],
+            }
+            rates[key] = trip["rate"]
+        _accumulate(material_groups[key], {
+            "trip_count": 1, "total_distance": trip["distance"], "total_net_weight": trip["net_weight"],
+        })
+
+    diesel_groups = {}
+    for entry in _rows(diesel, "quantity", "rate"):
+        key = (entry["asset_id"], day_of(entry["date"]))
+        _accumulate(diesel_groups.setdefault(key, dict.fromkeys(_diesel_totals())), _diesel_values(entry))
+
+    with transaction.atomic():
+        material_rollups.delete()
+        diesel_rollups.delete()
+        AssetDailyMaterialRollup.objects.bulk_create(
+            (
+                _daily_material_rollup(asset_id, day, group, rates[asset_id, day, material])
+                for (asset_id, day, material), group in material_groups.items()
+            ),
+            batch_size=ROLLUP_BATCH_SIZE,
+        )
+        AssetDailyDieselRollup.objects.bulk_create(
+            (
+                AssetDailyDieselRollup(
+                    asset_id=asset_id, day=day, quantity=group["total_quantity"], amount=group["total_amount"],
+                )
+                for (asset_id, day), group in diesel_groups.items()
+            ),
+            batch_size=ROLLUP_BATCH_SIZE,
+        )
+    return len(material_groups)
+
+
+def rebuild_monthly_rollups(month=None):
+    """
+    Rebuild the rollup table from scratch, or only the rollups of month (a date on
+    the first of the month), with one pass over each source table.
+    """
+    trips = TripDetails.objects.all()
+    diesel = DieselEntry.objects.all()
+    breakdowns = Breakdown.objects.all()
+    rollups = AssetMonthlyRollup.objects.all()
+
+    if month is not None:
+        start_datetime, end_datetime = month_range(f"{month:%Y-%m}")
+        trips = trips.filter(date__range=(start_datetime, end_datetime))
+        diesel = diesel.filter(date__range=(start_datetime, end_datetime))
+        breakdowns = breakdowns.filter(date__range=(start_datetime, end_datetime))
+        rollups = rollups.filter(month=month)
+
+    empty = {
+        **{key: None for key in _trip_totals()},
+        **{key: None for key in _diesel_totals()},
+        **{key: None for key in _breakdown_totals()},
+        "trip_count": 0,
+    }
+    totals = {}
+
+    for rows, values in (
+        (_rows(trips, "distance", "hours", "shift", "net_weight", "rate"), _trip_values),
+        (_rows(diesel, "quantity", "rate"), _diesel_values),
+        (_rows(breakdowns, "cost", "manpower_cost"), _breakdown_values),
+    ):
+        for row in rows:
+            key = (row["asset_id"], month_of(row["date"]))
+            _accumulate(totals.setdefault(key, dict(empty)), values(row))
+
+    with transaction.atomic():
+        rollups.delete()
+        AssetMonthlyRollup.objects.bulk_create(
+            (
+                AssetMonthlyRollup(asset_id=asset_id, month=bucket_month, **_rollup_fields(group, group, group))
+                for (asset_id, bucket_month), group in totals.items()
+            ),
+            batch_size=ROLLUP_BATCH_SIZE,
+        )
+    return len(totals)
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import Asset, Manager, AssetManager, TripDetails,  DieselEntry, Breakdown, Mechanic, DieselStock, Operator,MonthlyRent
+from .models import Asset, Manager, AssetManager, TripDetails,  DieselEntry, Breakdown, Mechanic, DieselStock, Operator,MonthlyRent, ReportJob
+from django.urls import reverse
+from django.db import transaction
+from .bulk import BulkListSerializer, CachedPrimaryKeyRelatedField
 from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 from django.db.models import Sum
@@ -127,14 +130,56 @@ class ManagerWithAssetsSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'assets']
 
     def get_assets(self, obj):
-        asset_managers = AssetManager.objects.filter(manager=obj)
-        return AssetManagerAssetSerializer(asset_managers, many=True).data
+        return AssetManagerAssetSerializer(obj.assetmanager_set.all(), many=True).data
 
 class TripDetailsSerializer(serializers.ModelSerializer):
     class Meta:
         model = TripDetails
         fields = ['id','asset','date','from_location','to_location','material','rate','distance','net_weight','deal_type','hours','manager','receiver','shift','start_time','end_time','operator']
 
+class TripBatchListSerializer(BulkListSerializer):
+    """
+    Saves a batch of trips keyed by the client_key of each, so that a batch sent
+    again, say after the connection dropped before the answer came back, saves
+    none of its trips twice and gets the same ids back.
+    """
+
+    def create(self, validated_data):
+        manager = validated_data[0]['manager']
+        with transaction.atomic():
+            # Batches of one manager take turns, so one sent twice at once is still saved once
+            Manager.objects.select_for_update().filter(pk=manager.pk).exists()
+            trips = {
+                trip.client_key: trip for trip in
+                TripDetails.objects.filter(manager=manager, client_key__in={attrs['client_key'] for attrs in validated_data})
+            }
+            new = {}
+            for attrs in validated_data:
+                if attrs['client_key'] not in trips:
+                    new.setdefault(attrs['client_key'], attrs)
+            created = super().create(list(new.values()))
+
+            if any(trip.pk is None for trip in created):
+                # MySQL returns no ids from a bulk insert, the keys find them instead
+                ids = dict(
+                    TripDetails.objects.filter(manager=manager, client_key__in=new).values_list('client_key', 'pk')
+                )
+                for trip in created:
+                    trip.pk = ids[trip.client_key]
+        trips.update((trip.client_key, trip) for trip in created)
+        return [trips[attrs['client_key']] for attrs in validated_data]
+
+
+class BulkTripDetailsSerializer(TripDetailsSerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
+
+    class Meta(TripDetailsSerializer.Meta):
+        list_serializer_class = TripBatchListSerializer
+        fields = TripDetailsSerializer.Meta.fields + ['client_key']
+        extra_kwargs = {'client_key': {'required': True, 'allow_null': False, 'allow_blank': False}}
+        # The manager is the one sending the batch, and a client_key already saved is not an error
+        validators = []
+
 class ViewTripDetailsSerializer(serializers.ModelSerializer):
     asset = SimpleAssetSerializer()
     class Meta:
@@ -147,6 +192,12 @@ class DieselEntrySerializer(serializers.ModelSerializer):
         model = DieselEntry
         fields = ['id','asset','date','quantity','previous_reading','rate','reading','site','manager']
 
+class BulkDieselEntrySerializer(DieselEntrySerializer):
+    serializer_related_field = CachedPrimaryKeyRelatedField
+
+    class Meta(DieselEntrySerializer.Meta):
+        list_serializer_class = BulkListSerializer
+
 class BreakdownSerializer(serializers.ModelSerializer):
     class Meta:
         model = Breakdown
@@ -221,4 +272,40 @@ class OtherMonthlyReportSerializer(serializers.Serializer):
     amount = serializers.DecimalField(max_digits=12, decimal_places=2)
     diesel_quantity = serializers.DecimalField(max_digits=10, decimal_places=2)
     diesel_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
-    final_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
\ No newline at end of file
+    final_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+class CompleteMonthlyReportSerializer(serializers.Serializer):
+    asset = serializers.CharField()
+    total_running = serializers.CharField()
+    fixed_revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    revenue_transport = serializers.DecimalField(max_digits=12, decimal_places=2)
+    diesel_quantity = serializers.DecimalField(max_digits=10, decimal_places=2)
+    diesel_amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    maintenance = serializers.DecimalField(max_digits=12, decimal_places=2)
+    insurance = serializers.DecimalField(max_digits=10, decimal_places=2)
+    tax = serializers.DecimalField(max_digits=10, decimal_places=2)
+    fitness = serializers.DecimalField(max_digits=10, decimal_places=2)
+    permit = serializers.DecimalField(max_digits=10, decimal_places=2)
+    emi = serializers.DecimalField(max_digits=10, decimal_places=2)
+    status = serializers.CharField()
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    month = serializers.DateField(format='%Y-%m', input_formats=['%Y-%m'])
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = ['id','report_type','month','format','asset_type','status','error','download_url','created_at','finished_at']
+        read_only_fields = ['id','status','error','created_at','finished_at']
+
+    def get_download_url(self, job):
+        if job.status != 'completed':
+            return None
+        url = reverse('report-job-download', args=[job.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def validate(self, attrs):
+        # Only the trip report is filtered by asset type
+        if attrs.get('report_type') != 'trip':
+            attrs['asset_type'] = ''
+        return attrs
@@ -1,8 +1,35 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from .models import Asset,Notification
+from .models import (
+    Asset, AssetManager, Breakdown, DieselEntry, DieselStock, Manager, Notification, Operator, SyncTombstone, TripDetails
+)
+from .diesel_ledger import record_writes
+from .report_cache import bump_global_version, bump_month_versions
+from .rollups import day_of, month_of, refresh_rollups
 from django.contrib.auth import get_user_model
 
+ROLLUP_SOURCES = [TripDetails, DieselEntry, Breakdown]
+# Synced rows, each with the field naming the manager whose sync lists it (None for every client)
+SYNC_SOURCES = {TripDetails: 'receiver', DieselEntry: 'manager', Breakdown: None}
+# The field dating each row in the stock ledger
+LEDGER_DATES = {DieselStock: 'date', DieselEntry: 'created_at'}
+
+def _previous_fields(model):
+    fields = []
+    if model in ROLLUP_SOURCES:
+        fields += ['asset_id', 'date']
+    if model in LEDGER_DATES:
+        fields += [LEDGER_DATES[model], 'quantity']
+    if SYNC_SOURCES.get(model):
+        fields.append(f'{SYNC_SOURCES[model]}_id')
+    return list(dict.fromkeys(fields))
+
+# What the receivers below need of a row as it was before a save, read in one query
+PREVIOUS_FIELDS = {
+    model: _previous_fields(model) for model in [*ROLLUP_SOURCES, *LEDGER_DATES, *SYNC_SOURCES]
+}
+
 @receiver(post_save,sender=Asset)
 def asset_created(sender,instance,created,**kwargs):
     if created:
@@ -12,4 +39,122 @@ def asset_created(sender,instance,created,**kwargs):
         for superuser in superusers:
             recipent = superuser
             message = f'New Asset {instance.name} was added Sucessfully'
-            Notification.objects.create(recipient=recipent,message=message)
\ No newline at end of file
+            Notification.objects.create(recipient=recipent,message=message)
+
+def remember_previous_row(sender, instance, **kwargs):
+    instance._previous_row = None
+    if instance.pk:
+        instance._previous_row = sender.objects.filter(pk=instance.pk).values(*PREVIOUS_FIELDS[sender]).first()
+
+for model in PREVIOUS_FIELDS:
+    pre_save.connect(remember_previous_row, sender=model)
+
+def previous_row(instance):
+    """The fields of PREVIOUS_FIELDS of instance before it was saved, None for a new row."""
+    return getattr(instance, '_previous_row', None)
+
+def update_rollup_on_save(sender, instance, **kwargs):
+    # The asset or the (auto_now) date may change, so the day and month the row counted
+    # towards before this save have to be refreshed as well.
+    keys = [(instance.asset_id, instance.date)]
+    previous = previous_row(instance)
+    if previous:
+        keys.append((previous['asset_id'], previous['date']))
+    refresh_rollups(sender, keys)
+
+def update_rollup_on_delete(sender, instance, origin=None, **kwargs):
+    # Deleting the asset itself takes its rollups with it
+    if getattr(origin, 'model', type(origin)) is Asset:
+        return
+    refresh_rollups(sender, [(instance.asset_id, instance.date)])
+
+for model in ROLLUP_SOURCES:
+    post_save.connect(update_rollup_on_save, sender=model)
+    post_delete.connect(update_rollup_on_delete, sender=model)
+
+def invalidate_month_reports(sender, instance, origin=None, **kwargs):
+    # Deleting the asset itself invalidates every month through the global version
+    if getattr(origin, 'model', type(origin)) is Asset:
+        return
+    months = [month_of(instance.date)]
+    previous = previous_row(instance)
+    if previous:
+        months.append(month_of(previous['date']))
+    # Bumped once the write is committed, so a report built in between cannot be
+    # cached under the new version with the old data
+    transaction.on_commit(lambda: bump_month_versions(months))
+
+def invalidate_all_reports(sender, instance, **kwargs):
+    # Asset, manager and operator names and the assignments are shown in the reports of every month
+    transaction.on_commit(bump_global_version)
+
+for model in ROLLUP_SOURCES:
+    post_save.connect(invalidate_month_reports, sender=model)
+    post_delete.connect(invalidate_month_reports, sender=model)
+
+for model in [Asset, AssetManager, Manager, Operator]:
+    post_save.connect(invalidate_all_reports, sender=model)
+    post_delete.connect(invalidate_all_reports, sender=model)
+
+def ledger_row(sender, date, quantity):
+    # Issues are dated by when they were entered, receipts by a date
+    if sender is DieselEntry:
+        return day_of(date), -quantity
+    return date, quantity
+
+def update_stock_snapshots_on_save(sender, instance, **kwargs):
+    previous = previous_row(instance)
+    before = [ledger_row(sender, previous[LEDGER_DATES[sender]], previous['quantity'])] if previous else []
+    record_writes(before=before, after=[ledger_row(sender, getattr(instance, LEDGER_DATES[sender]), instance.quantity)])
+
+def update_stock_snapshots_on_delete(sender, instance, **kwargs):
+    record_writes(before=[ledger_row(sender, getattr(instance, LEDGER_DATES[sender]), instance.quantity)])
+
+for model in [DieselStock, DieselEntry]:
+    post_save.connect(update_stock_snapshots_on_save, sender=model)
+    post_delete.connect(update_stock_snapshots_on_delete, sender=model)
+
+def handle_bulk_create(sender, instances):
+    """
+    Do for rows of sender inserted with bulk_create, which sends no signals, what
+    the receivers above do for each saved row, once for the whole batch.
+    """
+    if not instances:
+        return
+    refresh_rollups(sender, [(instance.asset_id, instance.date) for instance in instances])
+
+    months = {month_of(instance.date) for instance in instances}
+    transaction.on_commit(lambda: bump_month_versions(months))
+
+    if sender is DieselEntry:
+        record_writes(after=[ledger_row(sender, instance.created_at, instance.quantity) for instance in instances])
+
+def sync_owner_id(sender, instance):
+    field = SYNC_SOURCES[sender]
+    return getattr(instance, f'{field}_id') if field else None
+
+def record_sync_tombstone(sender, instance, **kwargs):
+    SyncTombstone.objects.create(
+        model=sender._meta.label_lower, object_id=instance.pk, owner_id=sync_owner_id(sender, instance)
+    )
+
+def move_sync_owner(sender, instance, **kwargs):
+    # A row handed to another manager leaves the sync of the one who had it as if deleted
+    row = previous_row(instance)
+    if row is None:
+        return
+    previous = row[f'{SYNC_SOURCES[sender]}_id']
+    owner_id = sync_owner_id(sender, instance)
+    if previous == owner_id:
+        return
+    label = sender._meta.label_lower
+    if previous is not None:
+        SyncTombstone.objects.create(model=label, object_id=instance.pk, owner_id=previous)
+    if owner_id is not None:
+        # Handed back, the row is synced again and an earlier tombstone must not remove it
+        SyncTombstone.objects.filter(model=label, object_id=instance.pk, owner_id=owner_id).delete()
+
+for model, field in SYNC_SOURCES.items():
+    post_delete.connect(record_sync_tombstone, sender=model)
+    if field:
+        post_save.connect(move_sync_owner, sender=model)
@@ -0,0 +1,154 @@
+"""
+"Changes since" sync for mobile clients.
+
+Trips, diesel entries and breakdowns are stamped with the time they were last
+written (their auto_now `date`), so the rows changed since a client last synced
+are those after its cursor in (date, id) order, which an index on (date, id)
+answers directly. Deleted rows leave a SyncTombstone, read the same way by
+(deleted_at, id). Tombstones belong to the manager whose sync listed the row, so
+a client only learns of its own rows going away, including rows that went to
+another manager. A cursor is an opaque token holding the position in both.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.timezone import is_naive, now
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from .models import SyncTombstone
+
+SYNC_DEFAULT_LIMIT = 200
+SYNC_MAX_LIMIT = 1000
+
+# Rows written in the last SYNC_SETTLE_SECONDS are held back until the next sync:
+# a transaction still open now may yet commit a row stamped before them, which a
+# client already past them would never see. See the setting for how long that is.
+SYNC_SETTLE_SECONDS = settings.SYNC_SETTLE_SECONDS
+
+# Tombstones are kept this long; a client whose cursor is older has to start over
+SYNC_TOMBSTONE_RETENTION_DAYS = 90
+
+
+class CursorExpired(Exception):
+    pass
+
+
+def encode_cursor(rows_position, deleted_position):
+    positions = {
+        "rows": [rows_position[0].isoformat(), rows_position[1]] if rows_position else None,
+        "deleted": [deleted_position[0].isoformat(), deleted_position[1]] if deleted_position else None,
+    }
+    return base64.urlsafe_b64encode(json.dumps(positions).encode()).decode()
+
+
+def decode_cursor(token):
+    """
+    The (rows, deleted) positions held by a cursor, each a (timestamp, id) pair or None.
+
+    Raises ValueError when token is not a cursor.
+    """
+    if not token:
+        return None, None
+    try:
+        positions = json.loads(base64.urlsafe_b64decode(token.encode()))
+        cursor = tuple(
+            (datetime.fromisoformat(positions[key][0]), int(positions[key][1])) if positions[key] else None
+            for key in ("rows", "deleted")
+        )
+    except (TypeError, KeyError, IndexError, AttributeError, json.JSONDecodeError, UnicodeDecodeError) as exc:
+        raise ValueError("Invalid cursor.") from exc
+    # Cursors are only ever made from aware timestamps, which a naive one cannot be compared with
+    if any(position and is_naive(position[0]) for position in cursor):
+        raise ValueError("Invalid cursor.")
+    return cursor
+
+
+def _page(queryset, field, position, limit, until):
+    queryset = queryset.filter(**{f"{field}__lte": until})
+    if position is not None:
+        stamp, pk = position
+        queryset = queryset.filter(**{f"{field}__gte": stamp}).filter(
+            Q(**{f"{field}__gt": stamp}) | Q(id__gt=pk)
+        )
+    rows = list(queryset.order_by(field, "id")[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def sync_page(queryset, cursor, limit, owner=None):
+    """
+    Rows of queryset written and ids of its rows deleted after cursor, at most limit
+    of each, with the cursor to continue from and whether there is more to fetch.
+    Deleted ids are those of the tombstones of owner, a Manager, or None when
+    queryset is not limited to the rows of one.
+
+    Raises CursorExpired when the tombstones the cursor needs have been pruned.
+    """
+    rows_position, deleted_position = cursor
+    if deleted_position is None:
+        # A client starting over has none of the rows deleted so far
+        deleted_position = (now(), 0)
+    elif deleted_position[0] < now() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS):
+        raise CursorExpired
+
+    until = now() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    rows, more_rows = _page(queryset, "date", rows_position, limit, until)
+    tombstones, more_deleted = _page(
+        SyncTombstone.objects.filter(model=queryset.model._meta.label_lower, owner=owner),
+        "deleted_at", deleted_position, limit, until,
+    )
+
+    if rows:
+        rows_position = (rows[-1].date, rows[-1].pk)
+    if tombstones:
+        deleted_position = (tombstones[-1].deleted_at, tombstones[-1].pk)
+
+    return {
+        "rows": rows,
+        "deleted": [tombstone.object_id for tombstone in tombstones],
+        "cursor": encode_cursor(rows_position, deleted_position),
+        "has_more": more_rows or more_deleted,
+    }
+
+
+class SyncMixin:
+    """
+    Adds `sync/` to a viewset: GET with an optional ?cursor= (and ?limit=) returns
+    the rows of get_sync_queryset() written since the cursor, the ids of those
+    deleted since then, and the cursor to pass next time. Without a cursor every
+    row is returned, a page at a time.
+
+    A viewset whose sync queryset holds the rows of one manager returns that
+    manager from get_sync_owner(), so only its tombstones are read.
+    """
+
+    def get_sync_queryset(self):
+        raise NotImplementedError
+
+    def get_sync_owner(self):
+        return None
+
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        try:
+            cursor = decode_cursor(request.query_params.get('cursor'))
+            limit = int(request.query_params.get('limit', SYNC_DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"error": "Invalid cursor or limit."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, SYNC_MAX_LIMIT))
+
+        try:
+            page = sync_page(self.get_sync_queryset(), cursor, limit, owner=self.get_sync_owner())
+        except CursorExpired:
+            return Response({"error": "Cursor has expired, sync again without one."}, status=status.HTTP_410_GONE)
+
+        return Response({
+            "results": self.get_serializer(page["rows"], many=True).data,
+            "deleted": page["deleted"],
+            "cursor": page["cursor"],
+            "has_more": page["has_more"],
+        })
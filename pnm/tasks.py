@@ -0,0 +1,87 @@
+import logging
+from datetime import datetime, timedelta
+
+from celery import shared_task
+from django.core.files import File
+from django.utils.timezone import localtime, now
+
+from .diesel_ledger import take_snapshot
+from .models import ReportJob, SyncTombstone
+from .report_outputs import REPORT_FORMATS, REPORT_NAMES, report_file, report_filename
+from .sync import SYNC_TOMBSTONE_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Days a report job and its file are kept before prune_report_jobs removes them
+REPORT_JOB_RETENTION_DAYS = 7
+
+
+@shared_task
+def generate_report_job(job_id):
+    """Build the report a ReportJob asks for and store it on the job."""
+    job = ReportJob.objects.get(pk=job_id)
+    job.status = 'running'
+    job.save(update_fields=['status'])
+
+    month = f"{job.month:%Y-%m}"
+    try:
+        output = report_file(job.report_type, month, job.format, job.asset_type or None)
+        with output:
+            job.file.save(report_filename(job.report_type, month, job.format, job.asset_type), File(output), save=False)
+    except Exception:
+        # The exception may quote SQL or server paths, so it only goes to the log
+        logger.exception("Report job %s failed", job.pk)
+        job.status = 'failed'
+        job.error = "The report could not be generated."
+    else:
+        job.status = 'completed'
+
+    job.finished_at = now()
+    job.save()
+
+
+@shared_task
+def pregenerate_month_reports(month=None):
+    """
+    Render every report of a "YYYY-MM" month, by default the one that has just
+    ended, in every format, so the first requests for it are served from the cache.
+    """
+    if month is None:
+        month = f"{localtime(now()).date().replace(day=1) - timedelta(days=1):%Y-%m}"
+
+    for report_name in REPORT_NAMES:
+        for format in REPORT_FORMATS:
+            report_file(report_name, month, format).close()
+    logger.info("Pregenerated the reports of %s", month)
+
+
+@shared_task
+def snapshot_diesel_stock(day=None):
+    """Record the diesel stock balance at the end of a "YYYY-MM-DD" day, by default yesterday."""
+    if day is None:
+        day = localtime(now()).date() - timedelta(days=1)
+    else:
+        day = datetime.strptime(day, "%Y-%m-%d").date()
+
+    snapshot = take_snapshot(day)
+    logger.info("Diesel stock on %s: %s", snapshot.date, snapshot.balance)
+
+
+@shared_task
+def prune_sync_tombstones():
+    """Forget deletions older than clients are allowed to sync from."""
+    cutoff = now() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+    deleted, _ = SyncTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    logger.info("Pruned %s sync tombstones", deleted)
+
+
+@shared_task
+def prune_report_jobs():
+    """Remove report jobs, and the files they stored, older than REPORT_JOB_RETENTION_DAYS."""
+    cutoff = now() - timedelta(days=REPORT_JOB_RETENTION_DAYS)
+    jobs = ReportJob.objects.filter(created_at__lt=cutoff)
+    for job in jobs.iterator():
+        if job.file:
+            job.file.delete(save=False)
+    deleted, _ = jobs.delete()
+    logger.info("Pruned %s report jobs", deleted)
@@ -0,0 +1,217 @@
+"""
+Data builders for the tests of pnm and the apps built on it, and the query budget
+test case each app names its routes for. Kept out of tests.py so other apps can
+import them without the test runner collecting the pnm tests a second time.
+"""
+import logging
+import time
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import make_aware
+from rest_framework.test import APIClient
+
+from .models import (
+    ASSET_TYPE_CHOICES, Asset, AssetManager, Breakdown, DieselEntry, DieselStock, Manager, Mechanic, MonthlyRent,
+    Operator, ReportJob, TripDetails,
+)
+from .report_cache import bump_month_versions, report_cache
+from .rollups import month_of, refresh_rollups
+
+logger = logging.getLogger(__name__)
+
+
+def make_asset(index, asset_type="Tipper", **overrides):
+    fields = {
+        "asset_id": f"A-{index}",
+        "registration_no": f"MH-{index:04d}",
+        "name": f"{asset_type} {index}",
+        "make": "Tata",
+        "type": asset_type,
+        "owner": "VDIPL",
+        "category": "vehicle",
+        "purchase_value": 1000000,
+        "purchase_date": date(2024, 1, 1),
+        "chasis_no": f"CH-{index}",
+        "emi_amount": Decimal("1000"),
+        "emi_provider": "Bank",
+        "insurance_amount": Decimal("500"),
+        "insurance_provider": "Insurer",
+        "puc_amount": Decimal("100"),
+        "puc_start_date": date(2024, 1, 1),
+        "puc_end_date": date(2026, 1, 1),
+        "ot_road_tax": False,
+        "fitness_amount": Decimal("200"),
+        "road_tax_amount": Decimal("300"),
+        "permit_amount": Decimal("400"),
+        "permit_start_date": date(2024, 1, 1),
+        "permit_end_date": date(2026, 1, 1),
+        "rate_per_month": Decimal("50000"),
+        "rate_per_hr": Decimal("1200"),
+        "rate_per_shift": Decimal("8000"),
+        "rate_per_night": Decimal("0"),
+        "charges": Decimal("0"),
+    }
+    fields.update(overrides)
+    return Asset.objects.create(**fields)
+
+
+def make_manager(username):
+    user = get_user_model().objects.create_user(username=username, password="pass", role="manager")
+    return Manager.objects.create(name=username.title(), phone="9999999999", grade="A", sub_grade="1", user=user)
+
+
+def at(year, month, day, hour=12):
+    return make_aware(datetime(year, month, day, hour))
+
+
+def add_trip(asset, when, **fields):
+    fields.setdefault("from_location", "Quarry")
+    fields.setdefault("rate", Decimal("0"))
+    fields.setdefault("deal_type", "Shifting")
+    trip = TripDetails.objects.create(asset=asset, **fields)
+    backdate(trip, when)
+    return trip
+
+
+def add_diesel(asset, when, quantity, rate):
+    entry = DieselEntry.objects.create(
+        asset=asset, quantity=Decimal(quantity), rate=Decimal(rate),
+        previous_reading=Decimal("0"), reading=Decimal("0"), site="Site",
+    )
+    backdate(entry, when)
+    # Entered then as well, for the stock ledger
+    DieselEntry.objects.filter(pk=entry.pk).update(created_at=when)
+    entry.created_at = when
+    return entry
+
+
+def backdate(instance, when):
+    # date is auto_now, so it can only be back-dated through an update, which
+    # bypasses the signals that keep the rollups and the report cache current
+    type(instance).objects.filter(pk=instance.pk).update(date=when)
+    refresh_rollups(type(instance), [(instance.asset_id, instance.date), (instance.asset_id, when)])
+    bump_month_versions([month_of(instance.date), month_of(when)])
+    instance.date = when
+
+
+def seed_fleet(size, start=0):
+    """
+    size assets of every type in turn, from index start, with a manager for every
+    two, a mechanic for every four and June 2025 worth of trips, diesel, breakdowns
+    and rent. Returns the managers and mechanics created.
+    """
+    asset_types = [choice for choice, _ in ASSET_TYPE_CHOICES]
+    managers, mechanics = [], []
+    for index in range(start, start + size):
+        if index % 2 == 0:
+            managers.append(make_manager(f"manager{index}"))
+        if index % 4 == 0:
+            user = get_user_model().objects.create_user(username=f"mechanic{index}", password="pass", role="mechanic")
+            mechanics.append(Mechanic.objects.create(name=f"Mechanic {index}", phone="8888888888", grade="B", sub_grade="1", user=user))
+        manager, mechanic = managers[-1], mechanics[-1]
+
+        asset = make_asset(index, asset_types[index % len(asset_types)])
+        AssetManager.objects.create(asset=asset, manager=manager, site="Site")
+        MonthlyRent.objects.create(
+            asset=asset, manager=manager, rate_per_month=Decimal("50000"), rate_per_hr=Decimal("1200"),
+            rate_per_shift=Decimal("8000"), rate_per_night=Decimal("0"), charges=Decimal("0"),
+        )
+        operator = Operator.objects.create(name=f"Operator {index}", role="Driver", type="Tipper", salary=20000, grade="C", sub_grade="1")
+        for day in (2, 3):
+            add_trip(asset, at(2025, 6, day), material="Sand", rate=Decimal("100"), distance=Decimal("30"),
+                     net_weight=Decimal("10"), hours=5, shift=1, manager=manager, receiver=managers[0], operator=operator)
+            entry = add_diesel(asset, at(2025, 6, day), "20", "90")
+            DieselEntry.objects.filter(pk=entry.pk).update(manager=manager)
+        breakdown = Breakdown.objects.create(
+            asset=asset, site="Site", issue="Leak", cost=100, manpower_cost=50, manager=manager, mechanic=mechanic,
+        )
+        backdate(breakdown, at(2025, 6, 4))
+        DieselStock.objects.create(challan_no=index, quantity=Decimal("100"), rate=Decimal("90"), party_name="Depot")
+    return managers, mechanics
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Requests every route in `routes` as a superuser, a manager and a mechanic, on a
+    fleet of SMALL_FLEET and then LARGE_FLEET assets, and fails when a route runs
+    more queries than its budget or more on the larger fleet than on the smaller.
+
+    routes are (path, budget) pairs; a path may name the first seeded rows, as
+    "{asset}", "{trip}", "{diesel}", "{breakdown}", "{manager}", "{mechanic}",
+    "{user}" or "{job}". The query count and time of every request are logged to
+    pnm.testing at INFO.
+    """
+    SMALL_FLEET = 4
+    LARGE_FLEET = 16
+    routes = []
+
+    @classmethod
+    def setUpClass(cls):
+        # Only the subclasses that name routes have budgets to check
+        if not cls.routes:
+            raise unittest.SkipTest("no routes")
+        super().setUpClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        managers, mechanics = seed_fleet(self.SMALL_FLEET)
+        self.users = {
+            "superuser": get_user_model().objects.create_superuser(username="admin", password="pass"),
+            "manager": managers[0].user,
+            "mechanic": mechanics[0].user,
+        }
+        job = ReportJob.objects.create(report_type="tipper", month=date(2025, 6, 1), format="json", created_by=self.users["superuser"])
+        self.ids = {
+            "asset": Asset.objects.earliest("id").pk,
+            "trip": TripDetails.objects.earliest("id").pk,
+            "diesel": DieselEntry.objects.earliest("id").pk,
+            "breakdown": Breakdown.objects.earliest("id").pk,
+            "manager": managers[0].pk,
+            "mechanic": mechanics[0].pk,
+            "user": managers[-1].user.pk,
+            "job": job.pk,
+        }
+
+    def measure(self, user, path):
+        report_cache().clear()
+        # A fresh user each time, so nothing it has cached carries over between requests
+        self.client.force_authenticate(get_user_model().objects.get(pk=user.pk))
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.get(path)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return len(queries), elapsed, response.status_code
+
+    def measure_routes(self):
+        return {
+            (role, path): self.measure(user, path.format(**self.ids))
+            for path, _ in self.routes
+            for role, user in self.users.items()
+        }
+
+    def test_query_budgets(self):
+        small = self.measure_routes()
+        seed_fleet(self.LARGE_FLEET - self.SMALL_FLEET, start=self.SMALL_FLEET)
+        large = self.measure_routes()
+
+        for (role, path), (queries, elapsed, status_code) in large.items():
+            logger.info(
+                "%s as %s: %s, %d -> %d queries, %.1f ms",
+                path, role, status_code, small[role, path][0], queries, elapsed * 1000,
+            )
+
+        for path, budget in self.routes:
+            for role in self.users:
+                with self.subTest(path=path, role=role):
+                    queries, _, status_code = large[role, path]
+                    self.assertLess(status_code, 500)
+                    self.assertLessEqual(queries, budget)
+                    self.assertLessEqual(queries, small[role, path][0], "query count grows with the fleet")
@@ -1,3 +1,1232 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate, now
+from rest_framework.test import APIClient
+
+from .models import (
+    ASSET_TYPE_CHOICES, Asset, AssetDailyDieselRollup, AssetDailyMaterialRollup, AssetManager, AssetMonthlyRollup,
+    Breakdown, DieselEntry, DieselStock, DieselStockSnapshot, Notification, ReportJob, TripDetails,
+)
+from .report_cache import OPEN_MONTH_TIMEOUT, report_cache, report_cache_key, report_timeout
+from .rollups import month_of, rebuild_daily_rollups, rebuild_monthly_rollups
+from .benchmarks import generate_fleet
+from .management.commands.benchmark_reports import REPORT_PATHS, SERIALIZER_QUERYSETS
+from .management.commands.load_test import Command as LoadTestCommand
+from .diesel_ledger import stock_balance, take_snapshot
+from .sync import SYNC_TOMBSTONE_RETENTION_DAYS, encode_cursor
+from .tasks import REPORT_JOB_RETENTION_DAYS, pregenerate_month_reports, prune_report_jobs, snapshot_diesel_stock
+from .testing import QueryBudgetTestCase, add_diesel, add_trip, at, backdate, make_asset, make_manager
+
+
+def zone_conversion_unavailable():
+    """Have the database convert datetimes to the local zone as MySQL without time zone tables does: to NULL."""
+    return mock.patch.multiple(
+        connection.ops,
+        datetime_cast_date_sql=mock.Mock(return_value=("NULL", ())),
+        datetime_trunc_sql=mock.Mock(return_value=("NULL", ())),
+    )
+
+
+class ReportTestCase(TestCase):
+    def setUp(self):
+        report_cache().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(username="admin", password="pass")
+        )
+
+
+class TipperMonthlyReportTests(ReportTestCase):
+    def test_diesel_is_split_by_distance_per_material(self):
+        tipper = make_asset(1)
+        assignment = AssetManager.objects.create(asset=tipper, manager=make_manager("ravi"), site="Site")
+        AssetManager.objects.filter(pk=assignment.pk).update(date_assigned=at(2025, 5, 1))
+
+        add_trip(tipper, at(2025, 6, 2), material="Sand", rate=Decimal("100"),
+                 distance=Decimal("30"), net_weight=Decimal("10"))
+        add_trip(tipper, at(2025, 6, 2, 14), material="Metal", rate=Decimal("200"),
+                 distance=Decimal("10"), net_weight=Decimal("5"))
+        add_trip(tipper, at(2025, 6, 3), material="Sand", rate=Decimal("120"),
+                 distance=Decimal("20"), net_weight=Decimal("10"))
+        add_diesel(tipper, at(2025, 6, 2), "40", "90")
+        add_diesel(tipper, at(2025, 6, 3), "10", "90")
+        # Outside the month
+        add_trip(tipper, at(2025, 7, 1), material="Sand", rate=Decimal("100"),
+                 distance=Decimal("30"), net_weight=Decimal("10"))
+
+        response = self.client.get("/pnm/tipper-report/", {"month": "2025-06"})
+
+        self.assertEqual(response.status_code, 200)
+        rows = {row["material"]: row for row in response.data}
+        self.assertEqual(set(rows), {"Sand", "Metal"})
+
+        sand = rows["Sand"]
+        self.assertEqual(sand["manager"], "Ravi")
+        self.assertEqual(sand["material_quantity"], Decimal("20.00"))
+        self.assertEqual(sand["rate"], Decimal("120.00"))
+        self.assertEqual(sand["distance"], Decimal("50.00"))
+        self.assertEqual(sand["diesel_consumed"], Decimal("40.00"))
+        self.assertEqual(sand["diesel_cost"], Decimal("3600.00"))
+        self.assertEqual(sand["amount"], Decimal("2400.00"))
+        self.assertEqual(sand["final_amount"], Decimal("6000.00"))
+
+        metal = rows["Metal"]
+        self.assertEqual(metal["diesel_consumed"], Decimal("10.00"))
+        self.assertEqual(metal["diesel_cost"], Decimal("900.00"))
+        self.assertEqual(metal["final_amount"], Decimal("1900.00"))
+
+    def test_days_are_local_calendar_days(self):
+        tipper = make_asset(1)
+        # 02:00 IST on the 3rd is still the 2nd in UTC
+        add_trip(tipper, at(2025, 6, 3, 2), material="Sand", rate=Decimal("100"),
+                 distance=Decimal("30"), net_weight=Decimal("10"))
+        add_diesel(tipper, at(2025, 6, 3, 18), "40", "90")
+
+        response = self.client.get("/pnm/tipper-report/", {"month": "2025-06"})
+
+        self.assertEqual(response.data[0]["diesel_consumed"], Decimal("40.00"))
+        self.assertEqual(AssetDailyMaterialRollup.objects.get(asset=tipper).day, date(2025, 6, 3))
+
+    def test_query_count_does_not_grow_with_fleet(self):
+        for index in range(5):
+            tipper = make_asset(index)
+            add_trip(tipper, at(2025, 6, 2), material="Sand", rate=Decimal("100"),
+                     distance=Decimal("30"), net_weight=Decimal("10"))
+            add_diesel(tipper, at(2025, 6, 2), "40", "90")
+
+        # Session/auth lookups are not made with force_authenticate
+        with self.assertNumQueries(3):
+            response = self.client.get("/pnm/tipper-report/", {"month": "2025-06"})
+        self.assertEqual(len(response.data), 5)
+
+
+class ExcavatorAndOtherMonthlyReportTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(4):
+            excavator = make_asset(index, "Excavator")
+            add_trip(excavator, at(2025, 6, 2), hours=5, shift=1)
+            add_trip(excavator, at(2025, 6, 3), hours=3, shift=2)
+            add_diesel(excavator, at(2025, 6, 2), "20", "90")
+
+            roller = make_asset(100 + index, "Roller")
+            add_trip(roller, at(2025, 6, 2), shift=2)
+            add_diesel(roller, at(2025, 6, 2), "10", "90")
+
+        # Assets without trips in the month are left out of both reports
+        make_asset(200, "Excavator")
+        make_asset(201, "Roller")
+
+    def test_excavator_report_totals(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/pnm/excavator-report/", {"month": "2025-06"})
+
+        self.assertEqual(len(response.data), 4)
+        row = response.data[0]
+        self.assertEqual(row["manager"], "Unassigned")
+        self.assertEqual(row["working_hours"], Decimal("8.00"))
+        self.assertEqual(row["no_of_shifts"], Decimal("3.00"))
+        self.assertEqual(row["amount"], Decimal("24000.00"))
+        self.assertEqual(row["diesel_quantity"], Decimal("20.00"))
+        self.assertEqual(row["diesel_amount"], Decimal("1800.00"))
+        self.assertEqual(row["final_amount"], Decimal("25800.00"))
+
+    def test_excavator_export_reuses_report_rows(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/pnm/excavator-report-excel/", {"month": "2025-06"})
+
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="excavator_report_2025-06.xlsx"')
+        sheet = openpyxl.load_workbook(io.BytesIO(response.content)).active
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][:3], ("Asset Name", "Manager", "Working Hours"))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[1][-1], 25800)
+
+    def test_other_report_totals(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/pnm/other-report/", {"month": "2025-06"})
+
+        self.assertEqual(len(response.data), 4)
+        row = response.data[0]
+        self.assertEqual(row["no_of_shifts"], Decimal("2.00"))
+        self.assertEqual(row["amount"], Decimal("16000.00"))
+        self.assertEqual(row["diesel_amount"], Decimal("900.00"))
+        self.assertEqual(row["final_amount"], Decimal("16900.00"))
+
+
+class CompleteAssetMonthlyReportTests(ReportTestCase):
+    def test_running_and_revenue_follow_recorded_units(self):
+        tipper = make_asset(1)
+        add_trip(tipper, at(2025, 6, 2), rate=Decimal("100"), distance=Decimal("30"), net_weight=Decimal("10"))
+        add_diesel(tipper, at(2025, 6, 2), "40", "90")
+        Breakdown.objects.create(asset=tipper, site="Site", issue="Tyre", cost=500, manpower_cost=250)
+
+        excavator = make_asset(2, "Excavator")
+        add_trip(excavator, at(2025, 6, 2), rate=Decimal("1000"), hours=6)
+
+        bus = make_asset(3, "Bus")
+        add_trip(bus, at(2025, 6, 2), rate=Decimal("2000"), shift=2)
+
+        make_asset(4, "Crane")
+
+        with self.assertNumQueries(1):
+            response = self.client.get("/pnm/complete-report/", {"month": now().strftime("%Y-%m")})
+        self.assertEqual(len(response.data), 4)
+        self.assertEqual(response.data[0]["maintenance"], Decimal("750"))
+
+        response = self.client.get("/pnm/complete-report/", {"month": "2025-06"})
+        rows = {row["asset"]: row for row in response.data}
+
+        tipper_row = rows[f"{tipper.name} - {tipper.registration_no}"]
+        self.assertEqual(tipper_row["total_running"], "30.00 kms")
+        self.assertEqual(tipper_row["revenue_transport"], Decimal("1000"))
+        self.assertEqual(tipper_row["diesel_amount"], Decimal("3600"))
+        self.assertEqual(tipper_row["status"], "Active")
+
+        excavator_row = rows[f"{excavator.name} - {excavator.registration_no}"]
+        self.assertEqual(excavator_row["total_running"], "6.00 hrs")
+        self.assertEqual(excavator_row["revenue_transport"], Decimal("6000"))
+
+        bus_row = rows[f"{bus.name} - {bus.registration_no}"]
+        self.assertEqual(bus_row["total_running"], "2.00 shifts")
+        self.assertEqual(bus_row["revenue_transport"], Decimal("4000"))
+
+        crane_row = rows["Crane 4 - MH-0004"]
+        self.assertEqual(crane_row["total_running"], "0")
+        self.assertEqual(crane_row["revenue_transport"], Decimal("0"))
+        self.assertEqual(crane_row["status"], "Idle")
+
+        # The spreadsheet leaves out the assets that did not run
+        response = self.client.get("/pnm/complete-report-excel/", {"month": "2025-06"})
+        sheet = openpyxl.load_workbook(io.BytesIO(response.content)).active
+        self.assertEqual([row[0] for row in sheet.iter_rows(min_row=2, values_only=True)],
+                         [tipper_row["asset"], excavator_row["asset"], bus_row["asset"]])
+
+
+class TripDetailsReportExcelTests(ReportTestCase):
+    def test_streams_rows_for_the_month(self):
+        excavator = make_asset(1, "Excavator")
+        add_trip(excavator, at(2025, 6, 2), rate=Decimal("1000"), hours=6, shift=1)
+        add_trip(excavator, at(2025, 6, 3), rate=Decimal("1000"), hours=4, shift=1)
+        add_trip(excavator, at(2025, 7, 1), rate=Decimal("1000"), hours=4, shift=1)
+
+        response = self.client.get("/pnm/trip-report-excel/", {"month": "2025-06", "asset_type": "Excavator"})
+
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="trip_report_excavator_2025-06.xlsx"', response["Content-Disposition"])
+        sheet = openpyxl.load_workbook(io.BytesIO(b"".join(response.streaming_content))).active
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][-3:], ("End Time", "Shift", "Amount"))
+        self.assertEqual([row[-1] for row in rows[1:]], [6000, 4000])
+        self.assertGreater(sheet.column_dimensions["A"].width, len("Asset"))
+
+
+class StreamingReportFormatTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        tipper = make_asset(1)
+        add_trip(tipper, at(2025, 6, 2), material="Sand", rate=Decimal("100"),
+                 distance=Decimal("30"), net_weight=Decimal("10"))
+        add_trip(tipper, at(2025, 6, 3), material="Metal", rate=Decimal("200"),
+                 distance=Decimal("10"), net_weight=Decimal("5"))
+        add_diesel(tipper, at(2025, 6, 2), "40", "90")
+
+    def test_trip_report_as_csv(self):
+        response = self.client.get("/pnm/trip-report/", {"month": "2025-06", "asset_type": "Tipper", "format": "csv"})
+
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "Asset,Deal Type,Manager,Receiver,Operator,Date,Time,From,To,Material,Rate,Distance,Net Weight,Amount")
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].endswith(",Sand,100.0,30.0,10.0,1000.0"))
+
+    def test_trip_report_as_ndjson_matches_json(self):
+        expected = self.client.get("/pnm/trip-report/", {"month": "2025-06"}).json()
+
+        response = self.client.get("/pnm/trip-report/", {"month": "2025-06", "format": "ndjson"})
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(records, expected)
+
+    def test_streams_are_read_a_chunk_at_a_time_in_date_order(self):
+        tipper = Asset.objects.get()
+        # Same timestamp as a trip already there, so the chunks have to part on the id
+        add_trip(tipper, at(2025, 6, 2), material="Gravel", rate=Decimal("50"))
+        add_trip(tipper, at(2025, 6, 1), material="Soil", rate=Decimal("50"))
+
+        with mock.patch("pnm.views.TRIP_REPORT_CHUNK_SIZE", 1):
+            response = self.client.get("/pnm/trip-report/", {"month": "2025-06", "format": "ndjson"})
+            with CaptureQueriesContext(connection) as queries:
+                records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([record["material"] for record in records], ["Soil", "Sand", "Gravel", "Metal"])
+        # One query per chunk, and one more that finds the last one empty
+        self.assertEqual(len(queries), 5)
+
+        add_diesel(tipper, at(2025, 6, 5), "10", "90")
+        with mock.patch("pnm.views.DIESEL_REPORT_CHUNK_SIZE", 1):
+            response = self.client.get("/pnm/diesel-report/", {"format": "ndjson", "ordering": "-date"})
+            records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([record["quantity"] for record in records], [10.0, 40.0])
+
+        # Streams cannot take the id order the paginated report can
+        for ordering in ("id", "-id"):
+            response = self.client.get("/pnm/diesel-report/", {"format": "csv", "ordering": ordering})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get("/pnm/diesel-report/", {"ordering": "-id"}).status_code, 200)
+
+    def test_errors_use_the_requested_format(self):
+        response = self.client.get("/pnm/trip-report/", {"format": "csv"})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content.decode().splitlines()[0], "error")
+
+    def test_diesel_report_streams_unpaginated(self):
+        response = self.client.get("/pnm/diesel-report/", {"format": "ndjson"})
+        records = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["amount"], 3600.0)
+
+        response = self.client.get("/pnm/diesel-report/", {"format": "csv"})
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["ID", "Asset", "Date"])
+        self.assertEqual(len(lines), 2)
+
+
+class AssetMonthlyRollupTests(ReportTestCase):
+    def test_rollup_follows_writes(self):
+        roller = make_asset(1, "Roller")
+        trip = TripDetails.objects.create(asset=roller, from_location="Yard", rate=Decimal("100"),
+                                          deal_type="Shifting", shift=2)
+        DieselEntry.objects.create(asset=roller, quantity=Decimal("10"), rate=Decimal("90"),
+                                   previous_reading=Decimal("0"), reading=Decimal("0"), site="Site")
+        Breakdown.objects.create(asset=roller, site="Site", issue="Leak", cost=100, manpower_cost=50)
+
+        rollup = AssetMonthlyRollup.objects.get(asset=roller)
+        self.assertEqual(rollup.month, month_of(now()))
+        self.assertEqual((rollup.trip_count, rollup.shifts, rollup.revenue_by_shift), (1, 2, 200))
+        self.assertEqual((rollup.diesel_quantity, rollup.diesel_amount), (10, 900))
+        self.assertEqual(rollup.maintenance_cost, 150)
+        self.assertIsNone(rollup.distance)
+
+        trip.shift = 3
+        trip.save()
+        self.assertEqual(AssetMonthlyRollup.objects.get(asset=roller).shifts, 3)
+
+        # Moving a trip to another month refreshes both months
+        backdate(trip, at(2025, 6, 2))
+        self.assertEqual(AssetMonthlyRollup.objects.get(asset=roller, month=date(2025, 6, 1)).trip_count, 1)
+        self.assertEqual(AssetMonthlyRollup.objects.get(asset=roller, month=month_of(now())).trip_count, 0)
+
+        trip.delete()
+        self.assertFalse(AssetMonthlyRollup.objects.filter(asset=roller, month=date(2025, 6, 1)).exists())
+
+        roller.delete()
+        self.assertFalse(AssetMonthlyRollup.objects.exists())
+
+    def test_rebuild_matches_incremental_rollups(self):
+        for index in range(3):
+            excavator = make_asset(index, "Excavator")
+            add_trip(excavator, at(2025, 5, 31, 20), hours=5, shift=1, rate=Decimal("10"))
+            add_trip(excavator, at(2025, 6, 1, 1), hours=3, shift=2, rate=Decimal("10"))
+            add_diesel(excavator, at(2025, 6, 2), "20", "90")
+
+        fields = [field.name for field in AssetMonthlyRollup._meta.fields if field.name != "id"]
+        incremental = list(AssetMonthlyRollup.objects.order_by("asset_id", "month").values(*fields))
+
+        with zone_conversion_unavailable():
+            self.assertEqual(rebuild_monthly_rollups(), 6)
+        self.assertEqual(list(AssetMonthlyRollup.objects.order_by("asset_id", "month").values(*fields)), incremental)
+
+    def test_daily_rebuild_matches_incremental_rollups(self):
+        for index in range(3):
+            tipper = make_asset(index)
+            add_trip(tipper, at(2025, 6, 1, 1), material="Sand", rate=Decimal("100"),
+                     distance=Decimal("30"), net_weight=Decimal("10"))
+            add_trip(tipper, at(2025, 6, 1, 20), material="Sand", rate=Decimal("120"),
+                     distance=Decimal("10"), net_weight=Decimal("5"))
+            add_trip(tipper, at(2025, 6, 2), material="Metal", rate=Decimal("200"),
+                     distance=Decimal("10"), net_weight=Decimal("5"))
+            add_diesel(tipper, at(2025, 6, 1, 23), "20", "90")
+
+        snapshots = []
+        for model in (AssetDailyMaterialRollup, AssetDailyDieselRollup):
+            fields = [field.attname for field in model._meta.fields if field.name != "id"]
+            snapshots.append((model, fields, list(model.objects.order_by(*fields).values(*fields))))
+        self.assertEqual(AssetDailyMaterialRollup.objects.get(asset__name="Tipper 0", day=date(2025, 6, 1)).rate, 100)
+
+        with zone_conversion_unavailable():
+            self.assertEqual(rebuild_daily_rollups(date(2025, 6, 1)), 6)
+        for model, fields, incremental in snapshots:
+            self.assertEqual(list(model.objects.order_by(*fields).values(*fields)), incremental)
+
+
+class ConcurrentRollupTests(TransactionTestCase):
+    def test_parallel_writes_leave_the_right_totals(self):
+        tipper = make_asset(1)
+        errors = []
+
+        def write():
+            try:
+                with transaction.atomic():
+                    add_trip(tipper, now(), material="Sand", distance=Decimal("10"))
+                    add_diesel(tipper, now(), "5", "90")
+            except Exception as exc:  # surfaced in the main thread below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        rollup = AssetMonthlyRollup.objects.get(asset=tipper)
+        self.assertEqual((rollup.trip_count, rollup.distance, rollup.diesel_quantity), (10, 100, 50))
+        # One row for the day, not one per writer that deleted and inserted at the same time
+        material = AssetDailyMaterialRollup.objects.get(asset=tipper)
+        self.assertEqual((material.trip_count, material.distance), (10, 100))
+        self.assertEqual(AssetDailyDieselRollup.objects.get(asset=tipper).quantity, 50)
+
+
+class ReportCacheTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        self.excavator = make_asset(1, "Excavator")
+        self.trip = add_trip(self.excavator, at(2025, 6, 2), hours=5, shift=1)
+
+    def test_report_is_served_from_cache_until_its_month_changes(self):
+        self.client.get("/pnm/excavator-report/", {"month": "2025-06"})
+        with self.assertNumQueries(0):
+            response = self.client.get("/pnm/excavator-report/", {"month": "2025-06"})
+        self.assertEqual(response.data[0]["working_hours"], Decimal("5.00"))
+
+        # A write in another month leaves the cached report alone
+        with self.captureOnCommitCallbacks(execute=True):
+            add_trip(self.excavator, at(2025, 7, 2), hours=4)
+        with self.assertNumQueries(0):
+            self.client.get("/pnm/excavator-report/", {"month": "2025-06"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.trip.hours = 7
+            self.trip.save()
+            backdate(self.trip, at(2025, 6, 2))
+        response = self.client.get("/pnm/excavator-report/", {"month": "2025-06"})
+        self.assertEqual(response.data[0]["working_hours"], Decimal("7.00"))
+
+    def test_asset_changes_invalidate_every_month(self):
+        self.client.get("/pnm/excavator-report-excel/", {"month": "2025-06"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.excavator.name = "Renamed"
+            self.excavator.save()
+
+        response = self.client.get("/pnm/excavator-report-excel/", {"month": "2025-06"})
+        sheet = openpyxl.load_workbook(io.BytesIO(response.content)).active
+        self.assertTrue(sheet["A2"].value.startswith("Renamed"))
+
+    def test_manager_changes_invalidate_every_month(self):
+        manager = make_manager("ravi")
+        with self.captureOnCommitCallbacks(execute=True):
+            AssetManager.objects.create(asset=self.excavator, manager=manager, site="Site")
+            AssetManager.objects.filter(asset=self.excavator).update(date_assigned=at(2025, 6, 1))
+        self.client.get("/pnm/excavator-report/", {"month": "2025-06"})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            manager.name = "Ravi Kumar"
+            manager.save()
+
+        response = self.client.get("/pnm/excavator-report/", {"month": "2025-06"})
+        self.assertEqual(response.data[0]["manager"], "Ravi Kumar")
+
+    def test_trip_report_is_cached_per_asset_type(self):
+        b"".join(self.client.get("/pnm/trip-report-excel/", {"month": "2025-06"}).streaming_content)
+        self.client.get("/pnm/trip-report/", {"month": "2025-06", "asset_type": "Excavator"})
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/pnm/trip-report-excel/", {"month": "2025-06"})
+            self.client.get("/pnm/trip-report/", {"month": "2025-06", "asset_type": "Excavator"})
+        content = b"".join(response.streaming_content)
+        self.assertEqual(len(list(openpyxl.load_workbook(io.BytesIO(content)).active.values)), 2)
+
+        response = self.client.get("/pnm/trip-report/", {"month": "2025-06", "asset_type": "Roller"})
+        self.assertEqual(response.data, [])
+
+    def test_closed_months_never_expire(self):
+        self.assertIsNone(report_timeout(date(2025, 6, 1)))
+        self.assertEqual(report_timeout(month_of(now())), OPEN_MONTH_TIMEOUT)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReportJobTests(ReportTestCase):
+    def setUp(self):
+        super().setUp()
+        excavator = make_asset(1, "Excavator")
+        add_trip(excavator, at(2025, 6, 2), hours=5, shift=1)
+
+    def queue(self, **data):
+        # Celery runs the job inline when no broker is configured
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/pnm/report-jobs/", data)
+
+    def test_job_stores_the_report_for_download(self):
+        response = self.queue(report_type="excavator", month="2025-06", format="xlsx")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["status"], "pending")
+
+        job = self.client.get(f"/pnm/report-jobs/{response.data['id']}/").data
+        self.assertEqual((job["status"], job["month"]), ("completed", "2025-06"))
+
+        download = self.client.get(job["download_url"])
+        self.assertEqual(download["Content-Disposition"], 'attachment; filename="excavator_report_2025-06.xlsx"')
+        expected = self.client.get("/pnm/excavator-report-excel/", {"month": "2025-06"}).content
+        self.assertEqual(b"".join(download.streaming_content), expected)
+
+    def test_trip_report_job_as_json(self):
+        response = self.queue(report_type="trip", month="2025-06", format="json", asset_type="Excavator")
+
+        download = self.client.get(f"/pnm/report-jobs/{response.data['id']}/download/")
+        records = json.loads(b"".join(download.streaming_content))
+        self.assertEqual(records, self.client.get("/pnm/trip-report/", {"month": "2025-06"}).json())
+
+    def test_invalid_requests_are_rejected(self):
+        self.assertEqual(self.queue(report_type="excavator", month="06-2025", format="xlsx").status_code, 400)
+        self.assertEqual(self.queue(report_type="payroll", month="2025-06", format="xlsx").status_code, 400)
+
+    def test_failures_are_logged_but_not_shown(self):
+        with mock.patch("pnm.tasks.report_file", side_effect=RuntimeError('relation "pnm_asset" does not exist')), \
+                self.assertLogs("pnm.tasks", "ERROR"):
+            response = self.queue(report_type="excavator", month="2025-06", format="xlsx")
+
+        job = self.client.get(f"/pnm/report-jobs/{response.data['id']}/").data
+        self.assertEqual((job["status"], job["error"]), ("failed", "The report could not be generated."))
+
+    def test_old_jobs_are_pruned_with_their_files(self):
+        old = ReportJob.objects.get(pk=self.queue(report_type="excavator", month="2025-06", format="xlsx").data["id"])
+        recent = ReportJob.objects.get(pk=self.queue(report_type="excavator", month="2025-06", format="json").data["id"])
+        ReportJob.objects.filter(pk=old.pk).update(created_at=now() - timedelta(days=REPORT_JOB_RETENTION_DAYS + 1))
+
+        prune_report_jobs()
+
+        self.assertEqual(list(ReportJob.objects.values_list("pk", flat=True)), [recent.pk])
+        self.assertFalse(old.file.storage.exists(old.file.name))
+        self.assertTrue(recent.file.storage.exists(recent.file.name))
+
+    def test_unfinished_jobs_cannot_be_downloaded_or_seen_by_others(self):
+        job = ReportJob.objects.create(report_type="tipper", month=date(2025, 6, 1), format="json")
+        self.assertEqual(self.client.get(f"/pnm/report-jobs/{job.pk}/download/").status_code, 409)
+
+        manager = get_user_model().objects.create_user(username="ravi", password="pass", role="manager")
+        self.client.force_authenticate(manager)
+        self.assertEqual(self.client.get(f"/pnm/report-jobs/{job.pk}/").status_code, 404)
+
+
+class PregenerateMonthReportsTests(ReportTestCase):
+    def test_reports_of_the_month_are_served_from_cache(self):
+        tipper = make_asset(1)
+        add_trip(tipper, at(2025, 6, 2), material="Sand", rate=Decimal("100"),
+                 distance=Decimal("30"), net_weight=Decimal("10"))
+
+        pregenerate_month_reports("2025-06")
+
+        with self.assertNumQueries(0):
+            for url in ["tipper-report", "excavator-report", "other-report", "complete-report", "trip-report"]:
+                self.client.get(f"/pnm/{url}/", {"month": "2025-06"})
+                response = self.client.get(f"/pnm/{url}-excel/", {"month": "2025-06"})
+                if response.streaming:
+                    b"".join(response.streaming_content)
+
+    def test_defaults_to_the_month_that_just_ended(self):
+        pregenerate_month_reports()
+
+        last_month = (month_of(now()) - timedelta(days=1)).replace(day=1)
+        key = report_cache_key("complete", last_month, "json")
+        self.assertEqual(report_cache().get(key), [])
+
+
+def add_stock(challan_no, quantity):
+    return DieselStock.objects.create(
+        challan_no=challan_no, quantity=Decimal(quantity), rate=Decimal("90"), party_name="Depot"
+    )
+
+
+class DieselStockLedgerTests(ReportTestCase):
+    def test_writes_never_rewrite_other_entries(self):
+        first = add_stock(1, "100")
+        add_stock(2, "50")
+        entry = add_diesel(make_asset(1), now(), "30", "90")
+        self.assertEqual(list(DieselStock.objects.order_by("id").values_list("quantity", "stock")),
+                         [(100, 100), (50, 150)])
+        self.assertEqual(stock_balance(), 120)
+
+        first.quantity = Decimal("120")
+        # The quantity it had, the entry itself, the snapshots it makes wrong and the
+        # opening snapshot it moves, however long the ledger
+        with self.assertNumQueries(4):
+            first.save()
+        self.assertEqual(DieselStock.objects.get(challan_no=2).stock, 150)
+        self.assertEqual(stock_balance(), 140)
+
+        entry.delete()
+        self.assertEqual(stock_balance(), 170)
+
+    def test_balance_as_of_a_day_reads_from_the_latest_snapshot(self):
+        asset = make_asset(1)
+        add_stock(1, "100")
+        DieselStock.objects.update(date=date(2025, 6, 1))
+        add_diesel(asset, at(2025, 6, 2), "10", "90")
+        add_diesel(asset, at(2025, 6, 4), "20", "90")
+
+        snapshot_diesel_stock("2025-06-02")
+        self.assertEqual(DieselStockSnapshot.objects.get().balance, 90)
+
+        # Snapshot, receipts after it, issues after it
+        with self.assertNumQueries(3):
+            self.assertEqual(stock_balance(date(2025, 6, 3)), 90)
+        self.assertEqual(stock_balance(date(2025, 6, 4)), 70)
+        self.assertEqual(stock_balance(date(2025, 6, 1)), 100)
+
+        response = self.client.get("/pnm/diesel-stock/balance/", {"date": "2025-06-04"})
+        self.assertEqual(response.data, {"date": date(2025, 6, 4), "balance": 70, "snapshot_date": date(2025, 6, 2)})
+        self.assertEqual(self.client.get("/pnm/diesel-stock/balance/").data["balance"], 70)
+
+    def test_editing_an_old_slip_leaves_earlier_balances_alone(self):
+        asset = make_asset(1)
+        add_stock(1, "100")
+        DieselStock.objects.update(date=date(2025, 6, 1))
+        entry = add_diesel(asset, at(2025, 6, 2), "10", "90")
+        snapshot = take_snapshot(date(2025, 6, 3))
+
+        entry.site = "Quarry"
+        entry.reading = Decimal("120")
+        entry.save()
+
+        self.assertEqual(stock_balance(date(2025, 6, 1)), 100)
+        self.assertEqual(stock_balance(date(2025, 6, 2)), 90)
+        self.assertEqual(stock_balance(), 90)
+        self.assertEqual(list(DieselStockSnapshot.objects.all()), [snapshot])
+
+    def test_writes_dated_before_a_snapshot_drop_it(self):
+        asset = make_asset(1)
+        add_stock(1, "100")
+        DieselStock.objects.update(date=date(2025, 6, 1))
+        entry = add_diesel(asset, at(2025, 6, 2), "10", "90")
+        take_snapshot(date(2025, 6, 1))
+        take_snapshot(date(2025, 6, 3))
+
+        entry.delete()
+
+        self.assertEqual(list(DieselStockSnapshot.objects.values_list("date", flat=True)), [date(2025, 6, 1)])
+        self.assertEqual(stock_balance(date(2025, 6, 3)), 100)
+
+
+class OpeningDieselStockMigrationTests(TransactionTestCase):
+    before = [("pnm", "0007_access_path_indexes")]
+    after = [("pnm", "0008_opening_diesel_stock_snapshot")]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.old_apps = executor.loader.project_state(self.before).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_the_stock_kept_before_the_ledger_carries_over(self):
+        OldDieselStock = self.old_apps.get_model("pnm", "DieselStock")
+        OldDieselEntry = self.old_apps.get_model("pnm", "DieselEntry")
+        asset = make_asset(1)
+
+        def receipt(challan_no, quantity, stock, day):
+            row = OldDieselStock.objects.create(challan_no=challan_no, quantity=Decimal(quantity), rate=Decimal("90"),
+                                                amount=Decimal(quantity) * 90, party_name="Depot", stock=Decimal(stock))
+            OldDieselStock.objects.filter(pk=row.pk).update(date=day)
+
+        def issue(quantity, when):
+            row = OldDieselEntry.objects.create(asset_id=asset.pk, quantity=Decimal(quantity), rate=Decimal("90"),
+                                                previous_reading=0, reading=0, site="Site")
+            OldDieselEntry.objects.filter(pk=row.pk).update(date=when)
+
+        # 100 received, 30 issued and taken off it, 50 received, 20 issued today and taken off that
+        receipt(1, "70", "70", date(2025, 6, 1))
+        issue("30", at(2025, 6, 2))
+        receipt(2, "30", "100", date(2025, 6, 3))
+        issue("20", now())
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        # Read and written through the current models from here on
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+        self.assertEqual(stock_balance(), 100)
+        opening = DieselStockSnapshot.objects.get()
+        self.assertTrue(opening.opening)
+        self.assertEqual(opening.date, localdate() - timedelta(days=1))
+
+        add_diesel(asset, now(), "10", "90")
+        self.assertEqual(stock_balance(), 90)
+
+        # Writes to rows from before the opening snapshot move it instead of dropping it
+        DieselEntry.objects.get(quantity=30).delete()
+        self.assertEqual(stock_balance(), 120)
+        first = DieselStock.objects.get(challan_no=1)
+        first.quantity = Decimal("80")
+        first.save()
+        self.assertEqual(stock_balance(), 130)
+        self.assertEqual(DieselStockSnapshot.objects.get().pk, opening.pk)
+
+
+class ConcurrentDieselEntryTests(TransactionTestCase):
+    def test_parallel_entries_leave_the_right_stock(self):
+        add_stock(1, "500")
+        asset = make_asset(1)
+        errors = []
+
+        def post_entry():
+            try:
+                add_diesel(asset, now(), "5", "90")
+            except Exception as exc:  # surfaced in the main thread below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post_entry) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(stock_balance(), 400)
+        self.assertEqual(DieselEntry.objects.count(), 20)
+
+    def test_parallel_receipts_each_count_the_ones_before(self):
+        add_stock(1, "500")
+        errors = []
+
+        def post_receipt(challan_no):
+            try:
+                add_stock(challan_no, "10")
+            except Exception as exc:  # surfaced in the main thread below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post_receipt, args=(challan_no,)) for challan_no in range(2, 12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(stock_balance(), 600)
+        self.assertEqual(
+            list(DieselStock.objects.order_by("id").values_list("stock", flat=True)),
+            [Decimal(500 + 10 * index) for index in range(11)],
+        )
+
+
+class BulkDieselEntryTests(TestCase):
+    def setUp(self):
+        self.manager = make_manager("ravi")
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager.user)
+        self.assets = [make_asset(index) for index in range(3)]
+        add_stock(1, "1000")
+
+    def rows(self, count):
+        return [
+            {"asset": self.assets[index % 3].pk, "quantity": "10", "rate": "90",
+             "previous_reading": "0", "reading": "0", "site": "Site"}
+            for index in range(count)
+        ]
+
+    def post(self, rows):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/pnm/diesel-entry/bulk/", rows, format="json")
+        return response, len(queries)
+
+    def test_entries_are_created_together(self):
+        response, _ = self.post(self.rows(3))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {"ids": list(DieselEntry.objects.order_by("id").values_list("id", flat=True))})
+        self.assertEqual(DieselEntry.objects.filter(manager=self.manager).count(), 3)
+        self.assertEqual(stock_balance(), 970)
+        rollup = AssetMonthlyRollup.objects.get(asset=self.assets[0])
+        self.assertEqual((rollup.diesel_quantity, rollup.diesel_amount), (10, 900))
+
+        # Lookups and rollups are per batch and per asset, not per entry
+        _, small_batch_queries = self.post(self.rows(3))
+        _, large_batch_queries = self.post(self.rows(30))
+        self.assertEqual(large_batch_queries, small_batch_queries)
+        self.assertEqual(stock_balance(), 640)
+
+    def test_entries_belong_to_the_sender(self):
+        rows = self.rows(2)
+        rows[1]["manager"] = make_manager("sunil").pk
+
+        response, _ = self.post(rows)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            list(DieselEntry.objects.filter(pk__in=response.data["ids"]).values_list("manager", flat=True)),
+            [self.manager.pk] * 2,
+        )
+
+    def test_invalid_rows_are_reported_and_nothing_is_saved(self):
+        rows = self.rows(4)
+        rows[1]["asset"] = 9999
+        del rows[3]["quantity"]
+
+        response, _ = self.post(rows)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["index"] for error in response.data["errors"]], [1, 3])
+        self.assertIn("asset", response.data["errors"][0]["errors"])
+        self.assertIn("quantity", response.data["errors"][1]["errors"])
+        self.assertFalse(DieselEntry.objects.exists())
+
+        response, _ = self.post({"asset": self.assets[0].pk})
+        self.assertEqual(response.status_code, 400)
+
+
+class BatchTripTests(TestCase):
+    def setUp(self):
+        self.manager = make_manager("ravi")
+        self.receiver = make_manager("sunil")
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager.user)
+        self.assets = [make_asset(index) for index in range(3)]
+
+    def rows(self, count):
+        return [
+            {"asset": self.assets[index % 3].pk, "receiver": self.receiver.pk, "from_location": "Quarry",
+             "material": "Sand", "rate": "100", "distance": "30", "net_weight": "10", "deal_type": "Sale",
+             "client_key": str(uuid.uuid4())}
+            for index in range(count)
+        ]
+
+    def post(self, rows):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/pnm/trip-details/batch/", rows, format="json")
+        return response, len(queries)
+
+    def test_trips_are_created_with_a_result_per_row(self):
+        response, _ = self.post(self.rows(3))
+
+        self.assertEqual(response.status_code, 201)
+        trips = TripDetails.objects.order_by("id")
+        self.assertEqual(
+            response.data["results"],
+            [{"index": index, "status": "created", "id": trip.pk} for index, trip in enumerate(trips)],
+        )
+        self.assertEqual(set(trips.values_list("manager", flat=True)), {self.manager.pk})
+        self.assertEqual(AssetDailyMaterialRollup.objects.get(asset=self.assets[0]).trip_count, 1)
+
+        # Related ids are looked up once per batch, rollups once per asset
+        # (48 rows still fit the single INSERT SQLite allows them)
+        _, small_batch_queries = self.post(self.rows(3))
+        _, large_batch_queries = self.post(self.rows(48))
+        self.assertEqual(large_batch_queries, small_batch_queries)
+        self.assertEqual(AssetMonthlyRollup.objects.get(asset=self.assets[0]).trip_count, 18)
+
+    def test_valid_rows_are_kept_when_others_are_not(self):
+        rows = self.rows(3)
+        rows[1]["receiver"] = 9999
+
+        response, _ = self.post(rows)
+
+        self.assertEqual(response.status_code, 207)
+        results = response.data["results"]
+        self.assertEqual([result["status"] for result in results], ["created", "invalid", "created"])
+        self.assertIn("receiver", results[1]["errors"])
+        self.assertEqual(TripDetails.objects.count(), 2)
+
+        response, _ = self.post([rows[1]])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post({"asset": self.assets[0].pk})[0].status_code, 400)
+
+        del rows[0]["client_key"]
+        response, _ = self.post(rows[:1])
+        self.assertIn("client_key", response.data["results"][0]["errors"])
+
+    def test_a_mixed_batch_costs_what_its_valid_rows_do(self):
+        def mixed_batch():
+            rows = self.rows(3)
+            rows[1]["receiver"] = 9999
+            return rows
+
+        self.post(mixed_batch())  # creates the rollups the batches below update
+        _, mixed_batch_queries = self.post(mixed_batch())
+        valid_rows = self.rows(3)
+        del valid_rows[1]
+        # The valid rows are saved as validated, not looked up and validated again
+        self.assertEqual(self.post(valid_rows)[1], mixed_batch_queries)
+
+    def test_a_batch_sent_again_is_saved_once(self):
+        rows = self.rows(3)
+        # As on MySQL, which returns no ids from a bulk insert
+        with mock.patch.object(type(connection.features), "can_return_rows_from_bulk_insert",
+                               new_callable=mock.PropertyMock, return_value=False):
+            first, _ = self.post(rows)
+        self.assertEqual([result["id"] for result in first.data["results"]],
+                         list(TripDetails.objects.order_by("id").values_list("id", flat=True)))
+
+        again, _ = self.post(rows)
+
+        self.assertEqual(again.status_code, 201)
+        self.assertEqual(again.data, first.data)
+        self.assertEqual(AssetMonthlyRollup.objects.aggregate(trips=Sum("trip_count"))["trips"], 3)
+
+        # Only trips with new keys are added, once however often the batch repeats them
+        new_row = self.rows(1)[0]
+        response, _ = self.post(rows + [new_row, new_row])
+        ids = [result["id"] for result in response.data["results"]]
+        self.assertEqual(ids[:3], [result["id"] for result in first.data["results"]])
+        self.assertEqual(ids[3], ids[4])
+        self.assertEqual(TripDetails.objects.count(), 4)
+
+        # Keys are the sender's own: another manager's batch with the same keys is saved
+        self.client.force_authenticate(self.receiver.user)
+        self.assertEqual(self.post(rows)[0].status_code, 201)
+        self.assertEqual(TripDetails.objects.count(), 7)
+
+
+@mock.patch("pnm.sync.SYNC_SETTLE_SECONDS", 0)
+class SyncTests(TestCase):
+    def setUp(self):
+        self.receiver = make_manager("sunil")
+        self.client = APIClient()
+        self.client.force_authenticate(self.receiver.user)
+        asset = make_asset(1)
+        self.trips = [add_trip(asset, at(2025, 6, day), receiver=self.receiver) for day in (2, 3, 4)]
+        add_trip(asset, at(2025, 6, 5))  # received by no one
+
+    def sync(self, cursor=None, **params):
+        if cursor:
+            params["cursor"] = cursor
+        return self.client.get("/pnm/receivable-trips/sync/", params).data
+
+    def test_changes_are_paged_by_cursor(self):
+        page = self.sync(limit=2)
+        self.assertEqual([row["id"] for row in page["results"]], [trip.pk for trip in self.trips[:2]])
+        self.assertTrue(page["has_more"])
+
+        page = self.sync(page["cursor"], limit=2)
+        self.assertEqual([row["id"] for row in page["results"]], [self.trips[2].pk])
+        self.assertFalse(page["has_more"])
+
+        # Nothing changed since
+        with self.assertNumQueries(2):
+            page = self.sync(page["cursor"])
+        self.assertEqual((page["results"], page["deleted"]), ([], []))
+
+        self.trips[0].material = "Metal"
+        self.trips[0].save()
+        deleted_id = self.trips[1].pk
+        self.trips[1].delete()
+
+        page = self.sync(page["cursor"])
+        self.assertEqual([row["material"] for row in page["results"]], ["Metal"])
+        self.assertEqual(page["deleted"], [deleted_id])
+
+    def test_breakdowns_sync_every_status(self):
+        breakdown = Breakdown.objects.create(asset=make_asset(2), site="Site", issue="Leak", status="Completed")
+        backdate(breakdown, at(2025, 6, 2))
+
+        rows = self.client.get("/pnm/breakdown/sync/").data["results"]
+        self.assertEqual([(row["id"], row["status"]) for row in rows], [(breakdown.pk, "Completed")])
+
+    def test_only_the_rows_of_the_client_are_reported_deleted(self):
+        other = make_manager("ravi")
+        page = self.sync()
+        add_trip(make_asset(2), at(2025, 6, 6), receiver=other).delete()
+
+        self.assertEqual(self.sync(page["cursor"])["deleted"], [])
+
+    def test_a_trip_handed_to_another_receiver_is_reported_deleted(self):
+        other = make_manager("ravi")
+        page = self.sync()
+        trip = self.trips[0]
+        trip.receiver = other
+        trip.save()
+
+        page = self.sync(page["cursor"])
+        self.assertEqual((page["results"], page["deleted"]), ([], [trip.pk]))
+        self.client.force_authenticate(other.user)
+        self.assertEqual([row["id"] for row in self.sync()["results"]], [trip.pk])
+
+        # Handed back, it is synced again and no longer reported deleted
+        self.client.force_authenticate(self.receiver.user)
+        trip.receiver = self.receiver
+        trip.save()
+        page = self.sync()
+        self.assertIn(trip.pk, [row["id"] for row in page["results"]])
+        self.assertEqual(page["deleted"], [])
+
+    def test_bad_and_expired_cursors(self):
+        self.assertEqual(self.client.get("/pnm/receivable-trips/sync/", {"cursor": "nope"}).status_code, 400)
+        naive = encode_cursor((datetime(2025, 6, 2), 1), None)
+        self.assertEqual(self.client.get("/pnm/receivable-trips/sync/", {"cursor": naive}).status_code, 400)
+
+        expired = encode_cursor(None, (now() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS + 1), 0))
+        self.assertEqual(self.client.get("/pnm/receivable-trips/sync/", {"cursor": expired}).status_code, 410)
+
+
+class WritePathQueryTests(TestCase):
+    """
+    Saving one trip or diesel slip costs a fixed number of queries. An update reads
+    what it needs of the row as it was in one query, shared by every receiver.
+    """
+
+    def setUp(self):
+        self.asset = make_asset(1)
+        self.manager = make_manager("ravi")
+
+    def test_trip(self):
+        # Insert; monthly rollup created, locked and summed from the three tables (11);
+        # asset locked, material groups and first-trip rates read, day replaced (7)
+        with self.assertNumQueries(19):
+            trip = TripDetails.objects.create(
+                asset=self.asset, from_location="Quarry", rate=Decimal("1"), deal_type="Sale",
+                manager=self.manager, receiver=self.manager,
+            )
+        trip.rate = Decimal("2")
+        # The previous row, the update, then the same refreshes with the rollup already there
+        with self.assertNumQueries(17):
+            trip.save()
+
+    def test_diesel_entry(self):
+        add_stock(1, "100")
+        # Insert; monthly rollup created and refreshed (11), daily diesel rollup
+        # created and refreshed (9), snapshots after the day dropped and moved (2)
+        with self.assertNumQueries(23):
+            entry = DieselEntry.objects.create(
+                asset=self.asset, quantity=Decimal("5"), rate=Decimal("90"), previous_reading=0, reading=0,
+                site="Quarry", manager=self.manager,
+            )
+        entry.site = "Pit"
+        # The previous row, the update and both rollups refreshed; the ledger is untouched
+        with self.assertNumQueries(16):
+            entry.save()
+
+
+class QueryPlanTests(TestCase):
+    """The hot filters are answered from an index rather than a full table scan."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = make_manager("ramesh")
+        cls.asset = make_asset(1)
+        cls.month = (at(2025, 6, 1, 0), at(2025, 6, 30, 23))
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(index, plan, f"expected {index} in the plan of {queryset.query}:\n{plan}")
+        if connection.vendor == "sqlite":
+            table = queryset.model._meta.db_table
+            self.assertNotRegex(plan, rf"SCAN {table}(?! USING)", plan)
+
+    def test_month_of_an_asset(self):
+        for model, index in (
+            (TripDetails, "trip_asset_date_idx"),
+            (DieselEntry, "diesel_entry_asset_date_idx"),
+            (Breakdown, "breakdown_asset_date_idx"),
+        ):
+            with self.subTest(model=model.__name__):
+                self.assertUsesIndex(model.objects.filter(asset=self.asset, date__range=self.month), index)
+
+    def test_latest_rows_of_a_manager(self):
+        self.assertUsesIndex(
+            TripDetails.objects.filter(manager=self.manager).order_by('-date')[:5], "trip_manager_date_idx"
+        )
+        self.assertUsesIndex(
+            TripDetails.objects.filter(receiver=self.manager).order_by('-date')[:5], "trip_receiver_date_idx"
+        )
+        self.assertUsesIndex(
+            DieselEntry.objects.filter(manager=self.manager).order_by('-date')[:5], "diesel_entry_manager_date_idx"
+        )
+
+    def test_open_breakdowns(self):
+        self.assertUsesIndex(
+            Breakdown.objects.filter(status__in=['Pending', 'Partially Completed']), "breakdown_status_idx"
+        )
+
+    def test_unread_notifications(self):
+        self.assertUsesIndex(
+            Notification.objects.filter(recipient=self.manager.user, is_read=False).order_by('-created_at'),
+            "notification_unread_idx",
+        )
+
+
+class PnmQueryBudgetTests(QueryBudgetTestCase):
+    routes = [
+        ("/pnm/assets/", 4),
+        ("/pnm/assets/{asset}/", 3),
+        ("/pnm/unassigned-assets/", 1),
+        ("/pnm/assign-assets/", 1),
+        ("/pnm/managers/", 2),
+        ("/pnm/managers/{manager}/", 1),
+        ("/pnm/mechanics/", 2),
+        ("/pnm/operators/", 2),
+        ("/pnm/monthly-rent/", 2),
+        ("/pnm/revoke-assets/", 2),
+        ("/pnm/trip-details/", 2),
+        ("/pnm/trip-details/{trip}/", 2),
+        ("/pnm/receivable-trips/", 3),
+        ("/pnm/receivable-trips/sync/", 3),
+        ("/pnm/diesel-entry/", 2),
+        ("/pnm/diesel-entry/{diesel}/", 1),
+        ("/pnm/diesel-entry/sync/", 3),
+        ("/pnm/breakdown/", 1),
+        ("/pnm/breakdown/{breakdown}/", 1),
+        ("/pnm/breakdown/sync/", 2),
+        ("/pnm/breakdown-report/", 4),
+        ("/pnm/diesel-report/", 2),
+        ("/pnm/diesel-report/?format=csv", 1),
+        ("/pnm/diesel-stock/", 2),
+        ("/pnm/diesel-stock/balance/", 3),
+        ("/pnm/report-jobs/", 2),
+        ("/pnm/report-jobs/{job}/", 1),
+        ("/pnm/logged-in-manager/", 1),
+        ("/pnm/logged-in-mechanic/", 1),
+        ("/pnm/tipper-report/?month=2025-06", 3),
+        ("/pnm/tipper-report-excel/?month=2025-06", 3),
+        ("/pnm/excavator-report/?month=2025-06", 1),
+        ("/pnm/excavator-report-excel/?month=2025-06", 1),
+        ("/pnm/other-report/?month=2025-06", 1),
+        ("/pnm/other-report-excel/?month=2025-06", 1),
+        ("/pnm/complete-report/?month=2025-06", 1),
+        ("/pnm/complete-report-excel/?month=2025-06", 1),
+        ("/pnm/trip-report/?month=2025-06", 1),
+        ("/pnm/trip-report/?month=2025-06&format=csv", 1),
+        ("/pnm/trip-report-excel/?month=2025-06", 1),
+    ]
+
+
+class GenerateFleetTests(TestCase):
+    def generate(self, seed):
+        with transaction.atomic():
+            counts = generate_fleet(assets=len(ASSET_TYPE_CHOICES), months=2, end_month=date(2025, 6, 1), trips_per_day=2, seed=seed)
+            trips = list(TripDetails.objects.order_by("id").values_list("asset__asset_id", "date", "rate", "material"))
+            types = set(Asset.objects.values_list("type", flat=True))
+            balance = stock_balance()
+            receipts = list(DieselStock.objects.order_by("id").values_list("date", "quantity", "stock"))
+            issued = DieselEntry.objects.aggregate(total=Sum("quantity"))["total"]
+            rollup_trips = AssetMonthlyRollup.objects.aggregate(total=Sum("trip_count"))["total"]
+            transaction.set_rollback(True)
+        return counts, trips, types, balance, receipts, issued, rollup_trips
+
+    def test_fleet_is_consistent_and_repeatable(self):
+        counts, trips, types, balance, receipts, issued, rollup_trips = self.generate(seed=7)
+
+        self.assertEqual(counts["TripDetails"], len(trips))
+        self.assertEqual(types, {choice for choice, _ in ASSET_TYPE_CHOICES})
+        self.assertEqual({trip[1].date().replace(day=1) for trip in trips}, {date(2025, 5, 1), date(2025, 6, 1)})
+        self.assertEqual(rollup_trips, len(trips))
+        # The stock recorded on each receipt agrees with the ledger
+        self.assertEqual(balance, sum(quantity for _, quantity, _ in receipts) - issued)
+        self.assertGreaterEqual(balance, 0)
+
+        self.assertEqual(self.generate(seed=7)[1], trips)
+        self.assertNotEqual(self.generate(seed=8)[1], trips)
+
+    def test_receipts_carry_on_from_the_stock_already_held(self):
+        receipt = add_stock(1, "5000")
+        DieselStock.objects.filter(pk=receipt.pk).update(date=date(2025, 4, 1))
+        take_snapshot(date(2025, 5, 15))
+
+        generate_fleet(assets=len(ASSET_TYPE_CHOICES), months=2, end_month=date(2025, 6, 1), trips_per_day=2)
+
+        receipts = DieselStock.objects.exclude(pk=receipt.pk)
+        for generated in (receipts.earliest("id"), receipts.latest("id")):
+            self.assertEqual(generated.stock, stock_balance(generated.date - timedelta(days=1)) + generated.quantity)
+        self.assertEqual(stock_balance(), DieselStock.objects.aggregate(total=Sum("quantity"))["total"]
+                         - DieselEntry.objects.aggregate(total=Sum("quantity"))["total"])
+
+
+class BenchmarkReportsCommandTests(TransactionTestCase):
+    def test_every_report_is_measured_on_a_scratch_database(self):
+        test_database = connection.settings_dict["NAME"]
+        # The scratch copy goes where a test database would, which is the one in use here
+        scratch = {"NAME": f"{test_database}_scratch"}
+        with tempfile.TemporaryDirectory() as directory, mock.patch.dict(connection.settings_dict["TEST"], scratch):
+            output = os.path.join(directory, "benchmark.json")
+            call_command("benchmark_reports", sizes="3", months=1, repeat=1, output=output, stdout=io.StringIO())
+            with open(output) as results_file:
+                results = json.load(results_file)
+
+        [fleet] = results["fleets"]
+        self.assertEqual(fleet["assets"], 3)
+        self.assertGreater(fleet["rows"]["TripDetails"], 0)
+        self.assertEqual(
+            [benchmark["name"] for benchmark in fleet["benchmarks"]],
+            [path.strip("/").split("/")[-1] for path in REPORT_PATHS]
+            + [serializer_class.__name__ for serializer_class, _ in SERIALIZER_QUERYSETS],
+        )
+        for benchmark in fleet["benchmarks"]:
+            self.assertGreater(benchmark["queries"], 0, benchmark["name"])
+
+        # The fleet went into the scratch copy, which is gone again
+        self.assertEqual(connection.settings_dict["NAME"], test_database)
+        self.assertFalse(Asset.objects.exists())
+
+
+class LoadTestCommandTests(TestCase):
+    def test_summary_has_percentiles_and_errors_per_endpoint(self):
+        results = [("GET diesel-entry", millis / 1000, True) for millis in range(1, 101)]
+        results += [("POST trip-details", 0.2, False), ("POST trip-details", 0.2, True)]
+        results += [("GET tipper-report", 0.5, True)]
+        stdout = io.StringIO()
+
+        summary = LoadTestCommand(stdout=stdout).summarize(results, duration=10)
+
+        self.assertEqual((summary["requests"], summary["errors"]), (103, 1))
+        listing = summary["endpoints"]["GET diesel-entry"]
+        self.assertEqual((listing["requests"], listing["errors"]), (100, 0))
+        # Interpolated between the samples on either side of each cut
+        self.assertAlmostEqual(listing["p50_ms"], 50.5)
+        self.assertAlmostEqual(listing["p95_ms"], 95.05)
+        self.assertAlmostEqual(listing["p99_ms"], 99.01)
+        self.assertEqual(summary["endpoints"]["POST trip-details"]["errors"], 1)
+        # A single sample is every percentile
+        report = summary["endpoints"]["GET tipper-report"]
+        self.assertEqual((report["p50_ms"], report["p99_ms"]), (500, 500))
+        self.assertIn("103 requests in 10s (10.3/s), 1 errors", stdout.getvalue())
+
+    @mock.patch("pnm.management.commands.load_test.subprocess.Popen")
+    def test_bad_runs_are_refused_before_the_server_starts(self, popen):
+        for option in ("managers", "duration", "workers", "threads"):
+            with self.subTest(option=option), self.assertRaisesMessage(CommandError, "must be positive"):
+                call_command("load_test", **{option: 0})
+
+        with mock.patch.object(connection, "vendor", "mysql"), \
+                mock.patch.dict(connection.settings_dict, HOST="db.example.com"), \
+                self.assertRaisesMessage(CommandError, "local database"):
+            call_command("load_test")
+
+        with self.assertRaisesMessage(CommandError, "generate_fleet first"):
+            call_command("load_test")
+        popen.assert_not_called()
@@ -19,6 +19,7 @@ router.register('breakdown', views.BreakdownViewSet, basename='breakdowns')
 router.register('breakdown-report', views.BreakdownReportViewSet, basename='breakdown-report')
 router.register('diesel-report', views.DieselReportViewSet, basename='diesel-report')
 router.register('diesel-stock', views.DieselStockViewSet, basename='diesel-stock')
+router.register('report-jobs', views.ReportJobViewSet, basename='report-job')
 
 urlpatterns = [
     path('', include(router.urls)),
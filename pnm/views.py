@@ -2,11 +2,20 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework import status, viewsets, generics
 from rest_framework.viewsets import ModelViewSet
-from .models import Asset, AssetManager, Manager, TripDetails, DieselEntry, Breakdown, Mechanic, DieselStock, Operator, MonthlyRent
-from .serializers import AssetSerializer, AssetManagerSerializer, ManagerSerializer, MechanicSerializer, SimpleAssetSerializer, ManagerWithAssetsSerializer, TripDetailsSerializer, ViewTripDetailsSerializer, DieselEntrySerializer, BreakdownSerializer, BreakdownReportSerializer, DieselReportSerializer, DieselStockSerializer, OperatorSerializer, MonthlyRentSerializer, TipperMonthlyReportSerializer, ExcavatorMonthlyReportSerializer, OtherMonthlyReportSerializer
+from .models import Asset, AssetManager, Manager, TripDetails, DieselEntry, Breakdown, Mechanic, DieselStock, Operator, MonthlyRent, ReportJob
+from .serializers import AssetSerializer, AssetManagerSerializer, ManagerSerializer, MechanicSerializer, SimpleAssetSerializer, ManagerWithAssetsSerializer, TripDetailsSerializer, ViewTripDetailsSerializer, DieselEntrySerializer, BreakdownSerializer, BreakdownReportSerializer, DieselReportSerializer, DieselStockSerializer, OperatorSerializer, MonthlyRentSerializer, ReportJobSerializer, BulkDieselEntrySerializer, BulkTripDetailsSerializer
+from .bulk import BULK_MAX_ROWS, row_errors
+from .sync import SyncMixin
+from .tasks import generate_report_job
+from .diesel_ledger import balance_details
 from rest_framework.permissions import IsAuthenticated
 from .permissions import IsManager
 from .pagination import DefaultPagination
+from .reports import COMPLETE_REPORT, DIESEL_REPORT_CHUNK_SIZE, DIESEL_REPORT_HEADERS, EXCAVATOR_REPORT, OTHER_REPORT, TIPPER_REPORT, TRIP_REPORT, TRIP_REPORT_CHUNK_SIZE, diesel_report_values, in_date_order, month_range, trip_report_headers, trip_report_queryset, trip_report_row, trip_report_values
+from .exports import streaming_csv_response, streaming_ndjson_response, xlsx_file_response, xlsx_response
+from .report_outputs import JSON, XLSX, monthly_report_content, report_filename, trip_month_range, trip_report_content, trip_report_xlsx
+from .renderers import STREAMING_FORMATS, CSVRenderer, NDJSONRenderer
+from rest_framework.settings import api_settings
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.views import APIView
 from rest_framework.exceptions import PermissionDenied
@@ -15,7 +24,7 @@ from decimal import Decimal, ROUND_HALF_UP
 from django.db.models import F
 from rest_framework import status
 from datetime import datetime, timedelta, time
-from django.db.models import Sum, F, Value, DecimalField
+from django.db.models import Sum, F, Value, DecimalField, Prefetch
 from django.db.models.functions import Coalesce
 from django.http import HttpResponse
 from openpyxl import Workbook
@@ -26,6 +35,10 @@ from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font
 from django.http import HttpResponse
 from collections import defaultdict
+import os
+from django.db import transaction
+from django.http import FileResponse
+from rest_framework.decorators import action
 
 
 
@@ -122,7 +135,9 @@ class UnassignedAssetsListView(ModelViewSet):
 
 
 class RevokeAssetsViewSet(ModelViewSet):
-    queryset = Manager.objects.all()
+    queryset = Manager.objects.prefetch_related(
+        Prefetch('assetmanager_set', queryset=AssetManager.objects.select_related('asset'))
+    )
     serializer_class = ManagerWithAssetsSerializer
     permission_classes = [IsAuthenticated]
 
@@ -141,7 +156,7 @@ class TripDetailViewSet(ModelViewSet):
         return TripDetailsSerializer
     
     def get_queryset(self):
-        queryset = TripDetails.objects.filter(manager=self.request.user.manager)
+        queryset = TripDetails.objects.filter(manager=self.request.user.manager).select_related('asset')
         return queryset.order_by('-date')[:5]
     
     def retrieve(self, request, *args, **kwargs):
@@ -179,16 +194,59 @@ class TripDetailViewSet(ModelViewSet):
         except TripDetails.DoesNotExist:
             return Response({"error": "Trip not found."}, status=status.HTTP_404_NOT_FOUND)
         
-class ReceivableTripViewSet(ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Record a list of trips, such as those collected offline on a site tablet.
+        Valid trips are saved even when others are not; the response has a result
+        per trip, in order. Each trip carries a client_key of the device's choosing:
+        a trip whose key was already saved is not saved again, so a batch can be
+        sent again safely and answers with the same ids.
+        """
+        if not isinstance(request.data, list) or not request.data:
+            return Response({"error": "Expected a non-empty list of trips."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(request.data) > BULK_MAX_ROWS:
+            return Response({"error": f"At most {BULK_MAX_ROWS} trips can be sent at once."}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = BulkTripDetailsSerializer(data=request.data, many=True)
+        errors = [None] * len(request.data)
+        if serializer.is_valid():
+            saved = serializer.save(manager=request.user.manager)
+        else:
+            for invalid in row_errors(serializer.errors):
+                errors[invalid["index"]] = invalid["errors"]
+            # The valid rows are then saved on their own
+            saved = serializer.save_valid_rows(manager=request.user.manager)
+        trips = iter(saved)
+        rows = [
+            {"index": index, "status": "invalid", "errors": row_error} if row_error is not None
+            else {"index": index, "status": "created", "id": next(trips).pk}
+            for index, row_error in enumerate(errors)
+        ]
+        if not saved:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(saved) < len(errors):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({"results": rows}, status=response_status)
+        
+class ReceivableTripViewSet(SyncMixin, ModelViewSet):
     queryset = TripDetails.objects.all()
     serializer_class = ViewTripDetailsSerializer
     pagination_class = DefaultPagination
     permission_classes = [IsManager]
 
     def get_queryset(self):
-        queryset = TripDetails.objects.filter(receiver=self.request.user.manager)
+        queryset = TripDetails.objects.filter(receiver=self.request.user.manager).select_related('asset')
         return queryset.order_by('-date')[:5]
 
+    def get_sync_queryset(self):
+        return TripDetails.objects.filter(receiver=self.request.user.manager).select_related('asset')
+
+    def get_sync_owner(self):
+        return self.request.user.manager
+
 class LoggedInManagerView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -219,7 +277,7 @@ class LoggedInMechanicView(APIView):
         else:
             return Response({'detail': 'You are not authorized as a mechanic.'}, status=403)
         
-class DieselEntryViewSet(ModelViewSet):
+class DieselEntryViewSet(SyncMixin, ModelViewSet):
     queryset = DieselEntry.objects.all()
     serializer_class = DieselEntrySerializer
     permission_classes = [IsManager]
@@ -227,6 +285,12 @@ class DieselEntryViewSet(ModelViewSet):
     def get_queryset(self):
         queryset = DieselEntry.objects.filter(manager=self.request.user.manager)
         return queryset.order_by('-date')[:5]
+
+    def get_sync_queryset(self):
+        return DieselEntry.objects.filter(manager=self.request.user.manager)
+
+    def get_sync_owner(self):
+        return self.request.user.manager
     
     def destroy(self, request, *args, **kwargs):
         pk = kwargs.get('pk')
@@ -266,11 +330,29 @@ class DieselEntryViewSet(ModelViewSet):
         except DieselEntry.DoesNotExist:
             return Response({"error": "Diesel Entry not found."}, status=status.HTTP_404_NOT_FOUND)
         
-class BreakdownViewSet(ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Record a list of diesel entries at once, all as the manager sending them. The
+        whole list is validated first and nothing is saved unless every entry is valid;
+        the response has the ids of the new entries, in order.
+        """
+        serializer = BulkDieselEntrySerializer(data=request.data, many=True, allow_empty=False, max_length=BULK_MAX_ROWS)
+        if not serializer.is_valid():
+            return Response({"errors": row_errors(serializer.errors)}, status=status.HTTP_400_BAD_REQUEST)
+
+        entries = serializer.save(manager=request.user.manager)
+        return Response({"ids": [entry.pk for entry in entries]}, status=status.HTTP_201_CREATED)
+
+class BreakdownViewSet(SyncMixin, ModelViewSet):
     queryset = Breakdown.objects.filter(status__in=['Pending', 'Partially Completed'])
     serializer_class = BreakdownSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_sync_queryset(self):
+        # Every status, so clients learn when a breakdown they list is completed
+        return Breakdown.objects.all()
+
 class BreakdownReportViewSet(ModelViewSet):
     http_method_names = ['get']
     serializer_class = BreakdownReportSerializer
@@ -281,28 +363,51 @@ class BreakdownReportViewSet(ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
+        breakdowns = Breakdown.objects.select_related('asset', 'manager', 'mechanic')
 
         if user.is_superuser:
-            return Breakdown.objects.all()
+            return breakdowns
 
         if hasattr(user, 'manager'):
-            return Breakdown.objects.filter(manager=user.manager)
+            return breakdowns.filter(manager=user.manager)
         
         if hasattr(user, 'mechanic'):
-            return Breakdown.objects.filter(mechanic=user.mechanic)
+            return breakdowns.filter(mechanic=user.mechanic)
 
         return Breakdown.objects.none()
         
 class DieselReportViewSet(ModelViewSet):
     http_method_names = ['get']
-    queryset = DieselEntry.objects.all()
+    queryset = DieselEntry.objects.select_related('asset', 'manager')
     permission_classes = [IsAuthenticated]
     serializer_class = DieselReportSerializer
     pagination_class = DefaultPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [CSVRenderer, NDJSONRenderer]
     search_fields = ['asset__registration_no',]
     ordering_fields = ['id']
 
+    def list(self, request, *args, **kwargs):
+        response_format = request.accepted_renderer.format
+        if response_format not in STREAMING_FORMATS:
+            return super().list(request, *args, **kwargs)
+
+        # Streamed unpaginated, in constant memory, which takes (date, id) order:
+        # oldest first, or newest first with ?ordering=-date
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM, 'date')
+        if ordering not in ('date', '-date'):
+            return Response(
+                {"error": "Streamed reports can only be ordered by date or -date."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        entries = in_date_order(
+            self.filter_queryset(self.get_queryset()), DIESEL_REPORT_CHUNK_SIZE, descending=ordering == '-date'
+        )
+        if response_format == 'csv':
+            return streaming_csv_response(
+                DIESEL_REPORT_HEADERS, (diesel_report_values(entry) for entry in entries), "diesel_report.csv"
+            )
+        return streaming_ndjson_response(DieselReportSerializer(entry).data for entry in entries)
+
 class DieselStockViewSet(ModelViewSet):
     queryset = DieselStock.objects.all()
     serializer_class = DieselStockSerializer
@@ -311,680 +416,101 @@ class DieselStockViewSet(ModelViewSet):
     pagination_class = DefaultPagination
     search_fields = ['challan_no']
 
-def round_decimal(value):
-    return round(value, 2)
-
-
-class TipperMonthlyReportView(APIView):
+    @action(detail=False, methods=['get'])
+    def balance(self, request):
+        """Diesel in stock now, or at the end of ?date=YYYY-MM-DD."""
+        day = request.query_params.get('date')
+        if day:
+            try:
+                day = datetime.strptime(day, "%Y-%m-%d").date()
+            except ValueError:
+                return Response({"error": "Invalid date format. Use YYYY-MM-DD."}, status=status.HTTP_400_BAD_REQUEST)
+
+        balance, snapshot = balance_details(day or None)
+        return Response({
+            "date": day or None,
+            "balance": balance,
+            "snapshot_date": snapshot.date if snapshot else None,
+        })
+
+class MonthlyReportView(APIView):
+    """
+    Base for the monthly report endpoints.
+
+    Renders `report` for the requested month in `format` through the report cache,
+    so a month is only rebuilt after data it covers has changed, and hands the
+    content to content_response, which the JSON and spreadsheet endpoints implement.
+    """
     permission_classes = [IsAuthenticated]
+    report = None
+    format = None
+
     def get(self, request):
         month = request.query_params.get("month")  # expect "YYYY-MM"
         if not month:
             return Response({"error": "Month is required (format YYYY-MM)."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            start_date = datetime.strptime(month + "-01", "%Y-%m-%d").date()
-            next_month = (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
-            end_date = next_month - timedelta(days=1)
-            start_datetime = make_aware(datetime.combine(start_date, time.min))
-            end_datetime = make_aware(datetime.combine(end_date, time.max))
+            start_datetime, end_datetime = month_range(month)
         except ValueError:
             return Response({"error": "Invalid month format. Use YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
 
-        tipper_assets = Asset.objects.filter(type__iexact="Tipper")
-        report_rows = []
+        content = monthly_report_content(self.report, start_datetime, end_datetime, self.format)
+        return self.content_response(content, month)
 
-        for asset in tipper_assets:
-            # Get manager
-            latest_assign = (
-                AssetManager.objects.filter(asset=asset, date_assigned__lte=end_datetime)
-                .select_related("manager")
-                .order_by("-date_assigned")
-                .first()
-            )
-            manager_name = str(latest_assign.manager) if latest_assign else "Unassigned"
-
-            # Get trips and diesel entries
-            trips = TripDetails.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
-            diesel_entries = DieselEntry.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
-
-            # Group trips by date → then by material
-            trips_by_day_material = defaultdict(lambda: defaultdict(list))
-            for trip in trips:
-                trip_date = trip.date.date()
-                trips_by_day_material[trip_date][trip.material].append(trip)
-
-            # Diesel data grouped by day
-            diesel_by_day = defaultdict(list)
-            for de in diesel_entries:
-                diesel_by_day[de.date.date()].append(de)
-
-            # Aggregate per material
-            material_summary = defaultdict(lambda: {
-                "material_quantity": Decimal("0"),
-                "rate": Decimal("0"),
-                "diesel_consumed": Decimal("0"),
-                "diesel_cost": Decimal("0"),
-                "distance": Decimal("0"),
-            })
-
-            for trip_date, material_dict in trips_by_day_material.items():
-                total_distance_day = 0
-                distance_by_material = {}
-
-                for material, trips_list in material_dict.items():
-                    dist = sum(Decimal(trip.distance or 0) for trip in trips_list)
-                    distance_by_material[material] = dist
-                    total_distance_day += dist
-
-                diesel_liters = sum((d.quantity or 0) for d in diesel_by_day.get(trip_date, []))
-                diesel_cost = sum((d.quantity * d.rate) for d in diesel_by_day.get(trip_date, []))
-
-                only_one_material = len(material_dict) == 1
-
-                for material, trips_list in material_dict.items():
-                    qty = sum((trip.net_weight or 0) for trip in trips_list)
-                    rate = trips_list[0].rate or Decimal("0")
-                    dist = distance_by_material[material]
-
-                    if only_one_material:
-                        mat_diesel = diesel_liters
-                        mat_diesel_cost = diesel_cost
-                    elif total_distance_day > 0:
-                        proportion = dist / total_distance_day
-                        mat_diesel = diesel_liters * proportion
-                        mat_diesel_cost = diesel_cost * proportion
-                    else:
-                        mat_diesel = Decimal("0")
-                        mat_diesel_cost = Decimal("0")
-
-                    summary = material_summary[material]
-                    summary["material_quantity"] += qty
-                    summary["rate"] = rate  # Assume latest or first rate
-                    summary["diesel_consumed"] += mat_diesel
-                    summary["diesel_cost"] += mat_diesel_cost
-                    summary["distance"] += dist
-
-            # Append all rows
-            for material, data in material_summary.items():
-                amount = data["material_quantity"] * data["rate"]
-                final_amount = amount + data["diesel_cost"]
-
-                report_rows.append({
-                    "asset_name": f"{asset.name} - {asset.registration_no}",
-                    "manager": manager_name,
-                    "material": material,
-                    "material_quantity": data["material_quantity"],
-                    "rate": data["rate"],
-                    "diesel_consumed": round_decimal(data["diesel_consumed"]),
-                    "diesel_cost": round_decimal(data["diesel_cost"]),
-                    "distance": data["distance"],
-                    "amount": round_decimal(amount),
-                    "final_amount": round_decimal(final_amount),
-                    "status": "Active" if trips else "Idle",
-                })
-
-        serializer = TipperMonthlyReportSerializer(data=report_rows, many=True)
-        serializer.is_valid(raise_exception=True)
-        return Response(serializer.data)
+    def content_response(self, content, month):
+        raise NotImplementedError
 
 
-class TipperMonthlyReportExportView(APIView):
-    permission_classes = [IsAuthenticated]
-    def get(self, request):
-        # Get the processed report data from the main view
-        data_response = TipperMonthlyReportView().get(request)
-        data = data_response.data
-
-        # Create a new Excel workbook and sheet
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Tipper Monthly Report"
-
-        # Define headers (without breakdowns)
-        headers = [
-            "Asset Name", "Manager", "Material", "Material Quantity", "Rate",
-            "Diesel Consumed", "Diesel Cost", "Distance", "Amount", "Final Amount", "Status"
-        ]
-        ws.append(headers)
-
-        # Add rows to sheet
-        for row in data:
-            ws.append([
-                row["asset_name"],
-                row["manager"],
-                row["material"],
-                float(row["material_quantity"]),
-                float(row["rate"]),
-                float(row["diesel_consumed"]),
-                float(row["diesel_cost"]),
-                float(row["distance"]),
-                float(row["amount"]),
-                float(row["final_amount"]),
-                row["status"],
-            ])
-
-        # Auto-adjust column width
-        for col in ws.columns:
-            max_length = 0
-            column = get_column_letter(col[0].column)
-            for cell in col:
-                try:
-                    if cell.value:
-                        max_length = max(max_length, len(str(cell.value)))
-                except:
-                    pass
-            ws.column_dimensions[column].width = max_length + 2
-
-        # Prepare file response
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        month = request.query_params.get("month", "report")
-        response["Content-Disposition"] = f'attachment; filename="tipper_report_{month}.xlsx"'
-        wb.save(response)
+class MonthlyReportJSONView(MonthlyReportView):
+    format = JSON
 
-        return response
-    
-class ExcavatorMonthlyReportView(APIView):
-    permission_classes = [IsAuthenticated]
-    def get(self, request):
-        month = request.query_params.get("month")  # Expected "YYYY-MM"
-        if not month:
-            return Response(
-                {"error": "Month is required (format YYYY-MM)."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+    def content_response(self, content, month):
+        return Response(content)
 
-        try:
-            start_date = datetime.strptime(month + "-01", "%Y-%m-%d").date()
-            next_month = (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
-            end_date = next_month - timedelta(days=1)
-            start_datetime = make_aware(datetime.combine(start_date, time.min))
-            end_datetime = make_aware(datetime.combine(end_date, time.max))
-        except ValueError:
-            return Response(
-                {"error": "Invalid month format. Use YYYY-MM."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
 
-        excavator_assets = Asset.objects.filter(type__iexact="Excavator")
-        report_rows = []
+class MonthlyReportExcelView(MonthlyReportView):
+    format = XLSX
 
-        for asset in excavator_assets:
-            latest_assign = (
-                AssetManager.objects.filter(asset=asset, date_assigned__lte=end_datetime)
-                .select_related("manager")
-                .order_by("-date_assigned")
-                .first()
-            )
-            manager_name = str(latest_assign.manager) if latest_assign else "Unassigned"
+    def content_response(self, content, month):
+        return xlsx_response(content, report_filename(self.report.name, month, XLSX))
 
-            trips_qs = TripDetails.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
-            
-            if not trips_qs.exists():
-                continue  # 🔁 Skip this asset if no trips in month
 
-            diesel_qs = DieselEntry.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
+class TipperMonthlyReportView(MonthlyReportJSONView):
+    report = TIPPER_REPORT
 
-            total_hours = (
-                trips_qs.aggregate(
-                    hours=Sum("hours", output_field=DecimalField())
-                )["hours"] or Decimal("0")
-            )
-            total_shifts = (
-                trips_qs.aggregate(
-                    shifts=Sum("shift", output_field=DecimalField())
-                )["shifts"] or Decimal("0")
-            )
 
-            diesel_qty = (
-                diesel_qs.aggregate(
-                    total=Sum("quantity", output_field=DecimalField())
-                )["total"] or Decimal("0")
-            )
-            diesel_amt = (
-                diesel_qs.aggregate(
-                    cost=Sum(
-                        ExpressionWrapper(F("quantity") * F("rate"), output_field=DecimalField())
-                    )
-                )["cost"] or Decimal("0")
-            )
+class TipperMonthlyReportExportView(MonthlyReportExcelView):
+    report = TIPPER_REPORT
 
-            monthly_charge = asset.rate_per_month or Decimal("0")
-            shift_charge = asset.rate_per_shift or Decimal("0")
-
-            amount = total_shifts * shift_charge
-            final_amount = amount + diesel_amt
-
-            report_rows.append({
-                "asset_name": f"{asset.name} - {asset.registration_no}",
-                "manager": manager_name,
-                "working_hours": round_decimal(total_hours),
-                "monthly_charge": round_decimal(monthly_charge),
-                "shift_charge": round_decimal(shift_charge),
-                "no_of_shifts": round_decimal(total_shifts),
-                "amount": round_decimal(amount),
-                "diesel_quantity": round_decimal(diesel_qty),
-                "diesel_amount": round_decimal(diesel_amt),
-                "final_amount": round_decimal(final_amount),
-            })
-
-        serializer = ExcavatorMonthlyReportSerializer(data=report_rows, many=True)
-        serializer.is_valid(raise_exception=True)
-        return Response(serializer.data)
-    
-class ExcavatorMonthlyReportExportView(APIView):
-    permission_classes = [IsAuthenticated]
-    def get(self, request):
-        data_response = ExcavatorMonthlyReportView().get(request)
-        data = data_response.data
 
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Excavator Monthly Report"
+class ExcavatorMonthlyReportView(MonthlyReportJSONView):
+    report = EXCAVATOR_REPORT
 
-        # Column headers
-        headers = [
-            "Asset Name", "Manager", "Working Hours", "Monthly Charge", "Shift Charge",
-            "No. of Shifts", "Amount", "Diesel Quantity", "Diesel Amount", "Final Amount"
-        ]
-        ws.append(headers)
-
-        # Fill rows
-        for row in data:
-            ws.append([
-                row["asset_name"],
-                row["manager"],
-                float(row["working_hours"]),
-                float(row["monthly_charge"]),
-                float(row["shift_charge"]),
-                float(row["no_of_shifts"]),
-                float(row["amount"]),
-                float(row["diesel_quantity"]),
-                float(row["diesel_amount"]),
-                float(row["final_amount"]),
-            ])
-
-        # Auto-adjust column widths
-        for col in ws.columns:
-            max_length = 0
-            column = get_column_letter(col[0].column)
-            for cell in col:
-                try:
-                    max_length = max(max_length, len(str(cell.value)))
-                except:
-                    pass
-            ws.column_dimensions[column].width = max_length + 2
-
-        # Prepare response
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        month = request.query_params.get("month", "report")
-        response["Content-Disposition"] = f'attachment; filename="excavator_report_{month}.xlsx"'
-        wb.save(response)
 
-        return response
-    
-class OtherAssetsMonthlyReportView(APIView):
-    permission_classes = [IsAuthenticated]
-    def get(self, request):
-        month = request.query_params.get("month")  # Expected "YYYY-MM"
-        if not month:
-            return Response(
-                {"error": "Month is required (format YYYY-MM)."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+class ExcavatorMonthlyReportExportView(MonthlyReportExcelView):
+    report = EXCAVATOR_REPORT
 
-        try:
-            start_date = datetime.strptime(month + "-01", "%Y-%m-%d").date()
-            next_month = (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
-            end_date = next_month - timedelta(days=1)
-            start_datetime = make_aware(datetime.combine(start_date, time.min))
-            end_datetime = make_aware(datetime.combine(end_date, time.max))
-        except ValueError:
-            return Response(
-                {"error": "Invalid month format. Use YYYY-MM."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        other_assets = Asset.objects.exclude(type__iexact="Excavator").exclude(type__iexact="Tipper")
-        report_rows = []
-
-        for asset in other_assets:
-            latest_assign = (
-                AssetManager.objects.filter(asset=asset, date_assigned__lte=end_datetime)
-                .select_related("manager")
-                .order_by("-date_assigned")
-                .first()
-            )
-            manager_name = str(latest_assign.manager) if latest_assign else "Unassigned"
-
-            trips_qs = TripDetails.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
-
-            if not trips_qs.exists():
-                continue  # ⛔ Skip asset if no trips in this month
-
-            diesel_qs = DieselEntry.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
-
-            total_shifts = trips_qs.aggregate(
-                shifts=Sum("shift", output_field=DecimalField())
-            )["shifts"] or Decimal("0")
-
-            diesel_qty = diesel_qs.aggregate(
-                total=Sum("quantity", output_field=DecimalField())
-            )["total"] or Decimal("0")
-
-            diesel_amt = diesel_qs.aggregate(
-                cost=Sum(
-                    ExpressionWrapper(F("quantity") * F("rate"), output_field=DecimalField())
-                )
-            )["cost"] or Decimal("0")
-
-            monthly_charge = asset.rate_per_month or Decimal("0")
-            shift_charge = asset.rate_per_shift or Decimal("0")
-
-            amount = total_shifts * shift_charge
-            final_amount = amount + diesel_amt
-
-            report_rows.append({
-                "asset_name": f"{asset.name} - {asset.registration_no}",
-                "manager": manager_name,
-                "monthly_charge": round_decimal(monthly_charge),
-                "shift_charge": round_decimal(shift_charge),
-                "no_of_shifts": round_decimal(total_shifts),
-                "amount": round_decimal(amount),
-                "diesel_quantity": round_decimal(diesel_qty),
-                "diesel_amount": round_decimal(diesel_amt),
-                "final_amount": round_decimal(final_amount),
-            })
-
-        serializer = OtherMonthlyReportSerializer(data=report_rows, many=True)
-        serializer.is_valid(raise_exception=True)
-        return Response(serializer.data)
-
-class OtherAssetsMonthlyReportExportView(APIView):
-    permission_classes = [IsAuthenticated]
-    def get(self, request):
-        data_response = OtherAssetsMonthlyReportView().get(request)
-        data = data_response.data
-
-        # Create workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Other Assets Monthly Report"
-
-        # Define column headers
-        headers = [
-            "Asset Name", "Manager", "Monthly Charge", "Shift Charge",
-            "No. of Shifts", "Amount", "Diesel Quantity",
-            "Diesel Amount", "Final Amount"
-        ]
-        ws.append(headers)
-
-        # Fill rows with data
-        for row in data:
-            ws.append([
-                row["asset_name"],
-                row["manager"],
-                float(row["monthly_charge"]),
-                float(row["shift_charge"]),
-                float(row["no_of_shifts"]),
-                float(row["amount"]),
-                float(row["diesel_quantity"]),
-                float(row["diesel_amount"]),
-                float(row["final_amount"]),
-            ])
-
-        # Auto-adjust column width
-        for col in ws.columns:
-            max_length = 0
-            column = get_column_letter(col[0].column)
-            for cell in col:
-                try:
-                    max_length = max(max_length, len(str(cell.value)))
-                except:
-                    pass
-            ws.column_dimensions[column].width = max_length + 2
-
-        # Prepare response
-        response = HttpResponse(
-            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
-        month = request.query_params.get("month", "report")
-        response["Content-Disposition"] = f'attachment; filename="other_assets_report_{month}.xlsx"'
-        wb.save(response)
-
-        return response
-    
-class CompleteAssetMonthlyReportView(APIView):
-    permission_classes = [IsAuthenticated]
-    def get(self, request):
-        month = request.query_params.get("month")  # Expected "YYYY-MM"
-        if not month:
-            return Response({"error": "Month is required (format YYYY-MM)."}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            start_date = datetime.strptime(month + "-01", "%Y-%m-%d").date()
-            next_month = (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
-            end_date = next_month - timedelta(days=1)
-            start_datetime = make_aware(datetime.combine(start_date, time.min))
-            end_datetime = make_aware(datetime.combine(end_date, time.max))
-        except ValueError:
-            return Response({"error": "Invalid month format. Use YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
 
-        report = []
-
-        for asset in Asset.objects.all():
-            trips = TripDetails.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
-            diesel_entries = DieselEntry.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
-            breakdowns = asset.breakdown_occurred.filter(date__range=(start_datetime, end_datetime))
-
-            # Check asset usage
-            status_str = "Active" if trips.exists() else "Idle"
-
-            # Total running
-            if trips.filter(distance__isnull=False).exists():
-                running_value = trips.aggregate(total=Sum("distance", output_field=DecimalField()))["total"] or Decimal("0")
-                running_str = f"{round_decimal(running_value)} kms"
-            elif trips.filter(hours__isnull=False).exists():
-                running_value = trips.aggregate(total=Sum("hours", output_field=DecimalField()))["total"] or Decimal("0")
-                running_str = f"{round_decimal(running_value)} hrs"
-            elif trips.filter(shift__isnull=False).exists():
-                running_value = trips.aggregate(total=Sum("shift", output_field=DecimalField()))["total"] or Decimal("0")
-                running_str = f"{round_decimal(running_value)} shifts"
-            else:
-                running_str = "0"
-
-            # Fixed revenue
-            fixed_revenue = asset.rate_per_month or Decimal("0")
-
-            # Transport revenue
-            if trips.filter(net_weight__isnull=False).exists():
-                transport_revenue = trips.aggregate(
-                    total=Sum(ExpressionWrapper(F("rate") * F("net_weight"), output_field=DecimalField()))
-                )["total"] or Decimal("0"
-                )
-            elif trips.filter(hours__isnull=False).exists():
-                transport_revenue = trips.aggregate(
-                    total=Sum(ExpressionWrapper(F("rate") * F("hours"), output_field=DecimalField()))
-                )["total"] or Decimal("0"
-                )
-            else:
-                transport_revenue = trips.aggregate(
-                    total=Sum(ExpressionWrapper(F("rate") * F("shift"), output_field=DecimalField()))
-                )["total"] or Decimal("0"
-                )
+class OtherAssetsMonthlyReportView(MonthlyReportJSONView):
+    report = OTHER_REPORT
 
-            # Diesel quantity & amount
-            diesel_quantity = diesel_entries.aggregate(total=Sum("quantity", output_field=DecimalField()))["total"] or Decimal("0")
-            diesel_amount = diesel_entries.aggregate(
-                total=Sum(ExpressionWrapper(F("quantity") * F("rate"), output_field=DecimalField()))
-            )["total"] or Decimal("0")
-
-            # Maintenance = cost + manpower_cost
-            maintenance_cost = breakdowns.aggregate(
-                total=Sum(ExpressionWrapper(
-                    (F("cost") + F("manpower_cost")),
-                    output_field=DecimalField()
-                ))
-            )["total"] or Decimal("0")
-
-            report.append({
-                "asset": f"{asset.name} - {asset.registration_no}",
-                "total_running": running_str,
-                "fixed_revenue": round_decimal(fixed_revenue),
-                "revenue_transport": round_decimal(transport_revenue),
-                "diesel_quantity": round_decimal(diesel_quantity),
-                "diesel_amount": round_decimal(diesel_amount),
-                "maintenance": round_decimal(maintenance_cost),
-                "insurance": round_decimal(asset.insurance_amount),
-                "tax": round_decimal(asset.road_tax_amount),
-                "fitness": round_decimal(asset.fitness_amount),
-                "permit": round_decimal(asset.permit_amount),
-                "emi": round_decimal(asset.emi_amount),
-                "status": status_str,
-            })
-
-        return Response(report)
-
-class CompleteAssetMonthlyReportExcelView(APIView):
-    permission_classes = [IsAuthenticated]
-    def get(self, request):
-        month = request.query_params.get("month")  # e.g., "2025-06"
-        if not month:
-            return Response({"error": "Month is required in YYYY-MM format."}, status=400)
 
-        try:
-            start_date = datetime.strptime(month + "-01", "%Y-%m-%d").date()
-            next_month = (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
-            end_date = next_month - timedelta(days=1)
-            start_datetime = make_aware(datetime.combine(start_date, time.min))
-            end_datetime = make_aware(datetime.combine(end_date, time.max))
-        except ValueError:
-            return Response({"error": "Invalid month format. Use YYYY-MM."}, status=400)
+class OtherAssetsMonthlyReportExportView(MonthlyReportExcelView):
+    report = OTHER_REPORT
 
-        from .models import Asset, TripDetails, DieselEntry, Breakdown  # adjust as per your structure
 
-        assets = Asset.objects.all()
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-        sheet.title = "Asset Monthly Report"
+class CompleteAssetMonthlyReportView(MonthlyReportJSONView):
+    report = COMPLETE_REPORT
 
-        headers = [
-            "Asset", "Total Running", "Fixed Revenue", "Revenue Transport",
-            "Diesel Quantity", "Diesel Amount", "Maintenance", "Insurance",
-            "Tax", "Fitness", "Permit", "EMI", "Status"
-        ]
 
-        # Add bold headers
-        for col_num, header in enumerate(headers, 1):
-            cell = sheet.cell(row=1, column=col_num, value=header)
-            cell.font = Font(bold=True)
-
-        row_num = 2
-
-        for asset in assets:
-            trips = TripDetails.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
-            diesel = DieselEntry.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
-            breakdowns = Breakdown.objects.filter(asset=asset, date__range=(start_datetime, end_datetime))
-
-            # Total running
-            total_distance = trips.aggregate(d=Sum("distance", output_field=DecimalField()))["d"]
-            total_hours = trips.aggregate(h=Sum("hours", output_field=DecimalField()))["h"]
-            total_shifts = trips.aggregate(s=Sum("shift", output_field=DecimalField()))["s"]
-            if total_distance:
-                running_value = f"{round(total_distance)} kms"
-            elif total_hours:
-                running_value = f"{round(total_hours)} hrs"
-            elif total_shifts:
-                running_value = f"{round(total_shifts)} shifts"
-            else:
-                continue  # Skip if no trips
-
-            # Fixed Revenue
-            fixed_revenue = asset.rate_per_month or Decimal("0")
-
-            # Revenue Transport
-            if total_distance:
-                revenue = trips.aggregate(
-                    revenue=Sum(ExpressionWrapper(F("rate") * F("net_weight"), output_field=DecimalField()))
-                )["revenue"] or Decimal("0")
-            elif total_hours:
-                revenue = trips.aggregate(
-                    revenue=Sum(ExpressionWrapper(F("rate") * F("hours"), output_field=DecimalField()))
-                )["revenue"] or Decimal("0")
-            elif total_shifts:
-                revenue = trips.aggregate(
-                    revenue=Sum(ExpressionWrapper(F("rate") * F("shift"), output_field=DecimalField()))
-                )["revenue"] or Decimal("0")
-            else:
-                revenue = Decimal("0")
-
-            # Diesel
-            diesel_qty = diesel.aggregate(q=Sum("quantity", output_field=DecimalField()))["q"] or Decimal("0")
-            diesel_amt = diesel.aggregate(
-                a=Sum(ExpressionWrapper(F("quantity") * F("rate"), output_field=DecimalField()))
-            )["a"] or Decimal("0")
-
-            # Maintenance
-            breakdown_cost = breakdowns.aggregate(
-                total=Sum(
-                    ExpressionWrapper(
-                        Coalesce(F("cost"), 0) + Coalesce(F("manpower_cost"), 0),
-                        output_field=DecimalField()
-                    )
-                )
-            )["total"] or Decimal("0")
-
-            # Additional Charges
-            insurance = asset.insurance_amount or Decimal("0")
-            tax = asset.road_tax_amount or Decimal("0")
-            fitness = asset.fitness_amount or Decimal("0")
-            permit = asset.permit_amount or Decimal("0")
-            emi = asset.emi_amount or Decimal("0")
-
-            # Status
-            status = "Active" if trips.exists() else "Idle"
-
-            values = [
-                f"{asset.name} - {asset.registration_no}",
-                running_value,
-                float(fixed_revenue),
-                float(revenue),
-                float(diesel_qty),
-                float(diesel_amt),
-                float(breakdown_cost),
-                float(insurance),
-                float(tax),
-                float(fitness),
-                float(permit),
-                float(emi),
-                status
-            ]
-
-            for col, val in enumerate(values, 1):
-                sheet.cell(row=row_num, column=col).value = val
-
-            row_num += 1
-
-        # Auto-adjust column widths
-        for col in sheet.columns:
-            max_length = max(len(str(cell.value)) if cell.value else 0 for cell in col)
-            sheet.column_dimensions[get_column_letter(col[0].column)].width = max_length + 2
-
-        # Prepare response
-        response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        filename = f"asset_monthly_report_{month}.xlsx"
-        response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        workbook.save(response)
-        return response
+class CompleteAssetMonthlyReportExcelView(MonthlyReportExcelView):
+    report = COMPLETE_REPORT
     
-from django.utils.timezone import localtime
-
 class TripDetailsReportView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES + [CSVRenderer, NDJSONRenderer]
+
     def get(self, request):
         month_param = request.query_params.get('month')
         asset_type = request.query_params.get('asset_type')  # Optional
@@ -993,83 +519,22 @@ class TripDetailsReportView(APIView):
             return Response({"error": "Month parameter is required in YYYY-MM format."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            start_date = datetime.strptime(month_param, "%Y-%m")
-            # Compute the end of the month
-            if start_date.month == 12:
-                end_date = datetime(start_date.year + 1, 1, 1)
-            else:
-                end_date = datetime(start_date.year, start_date.month + 1, 1)
-
-            start_date = make_aware(start_date)
-            end_date = make_aware(end_date)
-
+            start_date, end_date = trip_month_range(month_param)
         except ValueError:
             return Response({"error": "Invalid month format. Use YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = TripDetails.objects.filter(
-            date__gte=start_date,
-            date__lt=end_date
-        ).select_related('asset', 'manager', 'receiver', 'operator')
-
-        if asset_type:
-            queryset = queryset.filter(asset__type=asset_type)
-
-        tipper_types = ["Tipper", "Trailor"]
-        excavator_types = ["Excavator", "Paver", "Dozer", "Loader", "Grader", "Roller", "Backhoe Loader", "Farana"]
-        transporter_types = ["B-Tempo", "Bus", "Camper", "Service Van", "Transit Mixer", "Water Tanker"]
-
-        data = []
-
-        for trip in queryset:
-            a_type = trip.asset.type
-            trip_time = localtime(trip.date)  # ✅ Convert UTC to IST
-
-            base = {
-                "asset": f"{trip.asset.name} - {trip.asset.registration_no}",
-                "deal_type": trip.deal_type,
-                "manager": trip.manager.name if trip.manager else None,
-                "receiver": trip.receiver.name if trip.receiver else None,
-                "operator": trip.operator.name if trip.operator else None,
-                "date": trip_time.strftime("%d-%m-%Y"),
-                "time": trip_time.strftime("%I:%M %p"),
-            }
-
-            if a_type in tipper_types:
-                amount = float(trip.rate or 0) * float(trip.net_weight or 0)
-                base.update({
-                    "from_location": trip.from_location,
-                    "to_location": trip.to_location,
-                    "material": trip.material,
-                    "rate": f"{trip.rate} per ton",
-                    "distance": f"{trip.distance} kms" if trip.distance else None,
-                    "net_weight": f"{trip.net_weight} ton" if trip.net_weight else None,
-                    "amount": round(amount, 2),
-                })
-
-            elif a_type in excavator_types:
-                amount = float(trip.rate or 0) * float(trip.hours or 0)
-                base.update({
-                    "from_location": trip.from_location,
-                    "rate": trip.rate,
-                    "hours": trip.hours,
-                    "start_time": trip.start_time.strftime("%I:%M %p") if trip.start_time else None,
-                    "end_time": trip.end_time.strftime("%I:%M %p") if trip.end_time else None,
-                    "shift": trip.shift,
-                    "amount": round(amount, 2),
-                })
-
-            elif a_type in transporter_types:
-                amount = float(trip.rate or 0) * float(trip.shift or 0)
-                base.update({
-                    "from_location": trip.from_location,
-                    "to_location": trip.to_location,
-                    "rate": trip.rate,
-                    "shift": trip.shift,
-                    "amount": round(amount, 2),
-                })
-
-            data.append(base)
+        response_format = request.accepted_renderer.format
+        if response_format in STREAMING_FORMATS:
+            trips = in_date_order(trip_report_queryset(start_date, end_date, asset_type), TRIP_REPORT_CHUNK_SIZE)
+            if response_format == 'csv':
+                return streaming_csv_response(
+                    trip_report_headers(asset_type),
+                    (trip_report_values(trip) for trip in trips),
+                    report_filename(TRIP_REPORT, month_param, 'csv', asset_type),
+                )
+            return streaming_ndjson_response(trip_report_row(trip) for trip in trips)
 
+        data = trip_report_content(start_date, end_date, asset_type)
         return Response(data, status=status.HTTP_200_OK)
 
     
@@ -1083,113 +548,41 @@ class TripDetailsReportExcelView(APIView):
             return Response({"error": "Month parameter is required in YYYY-MM format."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            start_date = datetime.strptime(month_param, "%Y-%m")
-            end_date = (start_date.replace(day=28) + timedelta(days=4)).replace(day=1)
-            start_date = make_aware(start_date)
-            end_date = make_aware(end_date)
+            start_date, end_date = trip_month_range(month_param)
         except ValueError:
             return Response({"error": "Invalid month format. Use YYYY-MM."}, status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = TripDetails.objects.filter(
-            date__gte=start_date,
-            date__lt=end_date
-        ).select_related('asset', 'manager', 'receiver', 'operator')
-
-        if asset_type:
-            queryset = queryset.filter(asset__type=asset_type)
+        output = trip_report_xlsx(start_date, end_date, asset_type)
+        return xlsx_file_response(output, report_filename(TRIP_REPORT, month_param, XLSX, asset_type))
 
-        workbook = Workbook()
-        sheet = workbook.active
-        sheet.title = "Trip Report"
 
-        tipper_types = ["Tipper", "Trailor"]
-        excavator_types = ["Excavator", "Paver", "Dozer", "Loader", "Grader", "Roller", "Backhoe Loader", "Farana"]
-        transporter_types = ["B-Tempo", "Bus", "Camper", "Service Van", "Transit Mixer", "Water Tanker"]
+class ReportJobViewSet(ModelViewSet):
+    """
+    Reports generated in the background: POST queues a job and answers with its id,
+    GET polls its status and `download/` sends the stored file once it is completed.
+    """
+    http_method_names = ['get', 'post']
+    serializer_class = ReportJobSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = DefaultPagination
 
-        headers = [
-            "Asset", "Deal Type", "Manager", "Receiver", "Operator", "Date", "Time"
-        ]
+    def get_queryset(self):
+        user = self.request.user
+        queryset = ReportJob.objects.order_by('-id')
+        if user.is_superuser:
+            return queryset
+        return queryset.filter(created_by=user)
 
-        if asset_type in tipper_types:
-            headers += ["From", "To", "Material", "Rate", "Distance", "Net Weight", "Amount"]
-        elif asset_type in excavator_types:
-            headers += ["From", "Rate", "Hours", "Start Time", "End Time", "Shift", "Amount"]
-        elif asset_type in transporter_types:
-            headers += ["From", "To", "Rate", "Shift", "Amount"]
-        else:
-            headers += ["From", "To", "Rate", "Amount"]
-
-        for col_num, header in enumerate(headers, 1):
-            cell = sheet.cell(row=1, column=col_num, value=header)
-            cell.font = Font(bold=True)
-
-        row_num = 2
-        for trip in queryset:
-            a_type = trip.asset.type
-            ist_date = localtime(trip.date)  # ✅ IST conversion here
-
-            base = [
-                f"{trip.asset.name} - {trip.asset.registration_no}",
-                trip.deal_type,
-                trip.manager.name if trip.manager else "",
-                trip.receiver.name if trip.receiver else "",
-                trip.operator.name if trip.operator else "",
-                ist_date.strftime("%d-%m-%Y"),    # ✅ IST Date
-                ist_date.strftime("%I:%M %p"),     # ✅ IST Time
-            ]
-
-            if a_type in tipper_types:
-                amount = float(trip.rate or 0) * float(trip.net_weight or 0)
-                base += [
-                    trip.from_location,
-                    trip.to_location,
-                    trip.material,
-                    float(trip.rate) if trip.rate else None,
-                    float(trip.distance) if trip.distance else None,
-                    float(trip.net_weight) if trip.net_weight else None,
-                    round(amount, 2)
-                ]
-
-            elif a_type in excavator_types:
-                amount = float(trip.rate or 0) * float(trip.hours or 0)
-                base += [
-                    trip.from_location,
-                    float(trip.rate) if trip.rate else None,
-                    trip.hours,
-                    trip.start_time.strftime("%I:%M %p") if trip.start_time else "",
-                    trip.end_time.strftime("%I:%M %p") if trip.end_time else "",
-                    trip.shift,
-                    round(amount, 2)
-                ]
-
-            elif a_type in transporter_types:
-                amount = float(trip.rate or 0) * float(trip.shift or 0)
-                base += [
-                    trip.from_location,
-                    trip.to_location,
-                    float(trip.rate) if trip.rate else None,
-                    trip.shift,
-                    round(amount, 2)
-                ]
-            else:
-                amount = float(trip.rate or 0)
-                base += [
-                    trip.from_location,
-                    trip.to_location,
-                    float(trip.rate) if trip.rate else None,
-                    round(amount, 2)
-                ]
-
-            for col_num, value in enumerate(base, 1):
-                sheet.cell(row=row_num, column=col_num).value = value
-            row_num += 1
-
-        for col in sheet.columns:
-            max_length = max(len(str(cell.value)) if cell.value else 0 for cell in col)
-            sheet.column_dimensions[get_column_letter(col[0].column)].width = max_length + 2
-
-        type_str = asset_type.lower().replace(" ", "_") if asset_type else "all"
-        response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-        response['Content-Disposition'] = f'attachment; filename=trip_report_{type_str}_{month_param}.xlsx'
-        workbook.save(response)
-        return response
\ No newline at end of file
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = serializer.save(created_by=request.user)
+        transaction.on_commit(lambda: generate_report_job.delay(job.pk))
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'completed':
+            return Response({"error": f"Report is {job.status}."}, status=status.HTTP_409_CONFLICT)
+        return FileResponse(job.file.open('rb'), as_attachment=True, filename=os.path.basename(job.file.name))
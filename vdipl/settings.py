@@ -15,6 +15,7 @@ from datetime import timedelta
 import os
 from dotenv import load_dotenv
 import dj_database_url
+from celery.schedules import crontab
 load_dotenv()
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,16 +42,19 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'debug_toolbar',
     'corsheaders',
     'rest_framework',
     'django_filters',
     'djoser',
+    'django_celery_beat',
     'pnm',
     'core'
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestProfilingMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,10 +62,29 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
     'corsheaders.middleware.CorsMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
+# Share of requests profiled by core.middleware.RequestProfilingMiddleware, 0 to 1
+REQUEST_PROFILE_SAMPLE_RATE = float(os.getenv("REQUEST_PROFILE_SAMPLE_RATE", "0"))
+
+# Request, report and diesel ledger metrics, scraped from /core/metrics/ (see core.metrics).
+# With several worker processes set METRICS_MULTIPROC_DIR to a directory they share,
+# emptied before the server starts.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True") == "True"
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+# Token the scraper sends as "Authorization: Bearer <token>"; without one only superusers can read the metrics
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# SQL statements slower than this are kept with their plan for /core/slow-queries/
+# (see core.slow_queries), the latest SLOW_QUERY_BUFFER_SIZE of them; 0 turns it off
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "500"))
+SLOW_QUERY_BUFFER_SIZE = int(os.getenv("SLOW_QUERY_BUFFER_SIZE", "100"))
+
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
@@ -94,6 +117,75 @@ DATABASES = {
     'default': dj_database_url.parse(os.getenv("DATABASE_URL"))
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # SQLite has no row locks, so take its write lock when a transaction begins:
+    # concurrent writers, such as diesel entries posted at the same time, then wait
+    # their turn instead of failing with "database is locked" halfway through.
+    DATABASES['default'].setdefault('OPTIONS', {}).update({'transaction_mode': 'IMMEDIATE', 'timeout': 20})
+    # The in-memory test database shares one cache between connections, which fails
+    # on lock contention instead of waiting, so tests run against a file
+    DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_db.sqlite3'}
+
+# Sync holds back rows written this recently, as a transaction still open may yet
+# commit a row stamped before them. Those transactions end at the latest when a
+# lock they wait for times out: the timeout set above on SQLite, MySQL's default
+# innodb_lock_wait_timeout of 50 seconds otherwise. The margin covers their work.
+SYNC_SETTLE_SECONDS = int(os.getenv(
+    "SYNC_SETTLE_SECONDS", DATABASES['default'].get('OPTIONS', {}).get('timeout', 50) + 10
+))
+
+
+# Cache
+# Rendered reports are kept in the "reports" cache. Set REDIS_URL in production,
+# the local-memory fallback is private to each process and only suits a single one.
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'vdipl',
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reports',
+    },
+}
+
+
+# Celery
+# Without a broker, tasks run inline in the process that queues them.
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", REDIS_URL)
+CELERY_TASK_ALWAYS_EAGER = not CELERY_BROKER_URL
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_TIMEZONE = 'Asia/Kolkata'
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+
+CELERY_BEAT_SCHEDULE = {
+    # Everyone opens last month's reports on the 1st, so have them cached by then
+    'pregenerate-closed-month-reports': {
+        'task': 'pnm.tasks.pregenerate_month_reports',
+        'schedule': crontab(minute=5, hour=0, day_of_month=1),
+    },
+    # Keeps the diesel stock balance a bounded sum over the last day of entries
+    'snapshot-diesel-stock': {
+        'task': 'pnm.tasks.snapshot_diesel_stock',
+        'schedule': crontab(minute=15, hour=0),
+    },
+    'prune-sync-tombstones': {
+        'task': 'pnm.tasks.prune_sync_tombstones',
+        'schedule': crontab(minute=30, hour=0),
+    },
+    'prune-report-jobs': {
+        'task': 'pnm.tasks.prune_report_jobs',
+        'schedule': crontab(minute=45, hour=0),
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -131,6 +223,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded and generated files, such as background report jobs
+MEDIA_URL = 'media/'
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", BASE_DIR / 'media')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -159,6 +255,18 @@ DJOSER = {
 
 AUTH_USER_MODEL = 'core.User'
 
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # One JSON line per profiled request
+        'core.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 CORS_ALLOW_ALL_ORIGINS = True
 
 CORS_ALLOWED_ORIGINS = [
@@ -14,17 +14,21 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-import debug_toolbar
 import pnm
 
 
 urlpatterns = [
     path(r'admin/', admin.site.urls),
-    path(r'__debug__/', include(debug_toolbar.urls)),
     path(r'pnm/',include('pnm.urls')),
     path('auth/',include('djoser.urls')),
     path('auth/',include('djoser.urls.jwt')),
     path('core/', include('core.urls')),
 ]
+
+if settings.DEBUG:
+    import debug_toolbar
+
+    urlpatterns.append(path(r'__debug__/', include(debug_toolbar.urls)))